@@ -0,0 +1,73 @@
+"""
+Time of the attribute checks against the number of fields in NXdata
+
+Writes synthetic files with increasing numbers of scanned fields, and reports the time of the 'attributes' phase of
+check_file, and the time to read the spec attributes of every NXdata field with plan.read_attributes and with
+h5py's AttributeManager, testing each attribute with 'in' and reading it separately.
+
+    $ python benchmarks/attributes.py --fields 100 1000 5000
+"""
+
+import os
+import time
+import argparse
+import tempfile
+
+import h5py
+
+from check_nexus.check import check_file
+from check_nexus.metadata import DATASET_ATTRIBUTES
+from check_nexus.plan import read_attributes
+from check_nexus.profiling import profiling
+from check_nexus.synthetic import write_synthetic_nexus
+
+
+def read_attrs(objects: list, names: list[str]):
+    for obj in objects:
+        attrs = obj.attrs
+        {name: attrs[name] for name in names if name in attrs}
+
+
+def read_low_level(objects: list, names: list[str]):
+    for obj in objects:
+        read_attributes(obj, names)
+
+
+def best_time(fun, *args, repeat: int = 5) -> float:
+    """Return shortest time in s of fun(*args)"""
+    times = []
+    for n in range(repeat):
+        t0 = time.perf_counter()
+        fun(*args)
+        times.append(time.perf_counter() - t0)
+    return min(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--fields', type=int, nargs='+', default=[100, 1000, 5000],
+                        help='numbers of scanned fields in NXdata /entry/measurement')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    names = list(DATASET_ATTRIBUTES) + ['units', 'NX_class']
+    print(f"{'Fields':>8} {'attributes phase s':>19} {'attrs s':>9} {'read_attributes s':>18} {'speed-up':>9}")
+    with tempfile.TemporaryDirectory() as folder:
+        for n_fields in args.fields:
+            filename = os.path.join(folder, f"{n_fields}.nxs")
+            write_synthetic_nexus(filename, n_fields=n_fields, n_detectors=1, scan_points=3, detector_shape=(2, 2))
+            phase = []
+            for n in range(args.repeat):
+                with profiling() as profiler:
+                    check_file(filename, reuse_layout=False)
+                phase.append(profiler.phases['attributes'][0])
+            with h5py.File(filename, 'r') as nxs:
+                measurement = nxs['/entry/measurement']
+                objects = [measurement[name] for name in measurement]
+                attrs_s = best_time(read_attrs, objects, names, repeat=args.repeat)
+                low_level_s = best_time(read_low_level, objects, names, repeat=args.repeat)
+            print(f"{n_fields:8} {min(phase):19.4f} {attrs_s:9.4f} {low_level_s:18.4f} {attrs_s / low_level_s:9.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,54 @@
+"""
+Memory of a NexusChecker over many checks, from one or several threads
+
+Writes synthetic files with a few different layouts, then checks them over and over with a single NexusChecker, as a
+long-running service would, and reports the traced Python memory, measured with tracemalloc, after each round.
+Memory should stay flat once every layout has been seen.
+
+    $ python benchmarks/checker_memory.py --rounds 10 --checks 1000 --threads 4
+"""
+
+import os
+import time
+import argparse
+import tempfile
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+from check_nexus.check import NexusChecker
+from check_nexus.synthetic import write_synthetic_nexus
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--rounds', type=int, default=10)
+    parser.add_argument('--checks', type=int, default=1000, help='checks in each round')
+    parser.add_argument('--layouts', type=int, default=4, help='number of different file layouts')
+    parser.add_argument('--threads', type=int, default=1)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as folder:
+        files = []
+        for n in range(args.layouts):
+            filename = os.path.join(folder, f"{n}.nxs")
+            write_synthetic_nexus(filename, n_fields=10 + n, n_detectors=1, scan_points=3, detector_shape=(2, 2))
+            files.append(filename)
+        checker = NexusChecker()
+        print(checker)
+        print(f"{'Round':>6} {'checks':>8} {'s':>7} {'checks/s':>9} {'current MB':>11} {'peak MB':>8} {'layouts':>8}")
+        tracemalloc.start()
+        with ThreadPoolExecutor(args.threads) as executor:
+            for n_round in range(args.rounds):
+                t0 = time.perf_counter()
+                batch = [files[n % len(files)] for n in range(args.checks)]
+                for results in executor.map(checker.check, batch):
+                    pass
+                duration = time.perf_counter() - t0
+                current, peak = tracemalloc.get_traced_memory()
+                print(f"{n_round + 1:6} {args.checks:8} {duration:7.2f} {args.checks / duration:9.0f} "
+                      f"{current / 2 ** 20:11.2f} {peak / 2 ** 20:8.2f} {len(checker.layouts):8}")
+        tracemalloc.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+"""
+Benchmark read_dat_file against the previous implementation (readlines, eval and np.genfromtxt)
+
+Writes synthetic SRS .dat files with many columns to a temporary directory, checks both parsers
+return the same values and prints the time taken by each.
+
+    $ python benchmarks/dat_parser.py
+    $ python benchmarks/dat_parser.py --rows 1000 10000 50000 --columns 150
+"""
+
+import os
+import time
+import argparse
+import tempfile
+
+import numpy as np
+
+from check_nexus.dat_file_comparison import read_dat_file, Dict2Obj
+from check_nexus.synthetic import write_synthetic_dat
+
+
+def read_dat_file_legacy(filename):
+    """Previous implementation of read_dat_file, for comparison"""
+    with open(filename, 'r') as f:
+        lines = f.readlines()
+
+    meta = {}
+    lineno = 0
+    for ln in lines:
+        lineno += 1
+        if '&END' in ln: break
+        ln = ln.strip(' ,\n')
+        neq = ln.count('=')
+        if neq == 1:
+            inlines = [ln]
+        elif neq > 1 and '{' not in ln:
+            inlines = ln.split(',')
+        else:
+            continue
+
+        for inln in inlines:
+            vals = inln.split('=')
+            if len(vals) != 2: continue
+            try:
+                meta[vals[0]] = eval(vals[1])
+            except:
+                meta[vals[0]] = vals[1]
+
+    names = lines[lineno].split()
+    vals = np.genfromtxt(lines[lineno + 1:], ndmin=2)
+    main = {name: value for name, value in zip(names, vals.T)}
+    obj = Dict2Obj(main)
+    obj.metadata = Dict2Obj(meta)
+    return obj
+
+
+def time_function(fun, filename: str, repeat: int) -> float:
+    """Return best time in s of fun(filename)"""
+    times = []
+    for n in range(repeat):
+        t0 = time.perf_counter()
+        fun(filename)
+        times.append(time.perf_counter() - t0)
+    return min(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, nargs='+', default=[100, 1000, 10000, 30000])
+    parser.add_argument('--columns', type=int, default=120)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'rows':>8} {'columns':>8} {'size MB':>8} {'legacy s':>9} {'new s':>9} {'speed-up':>8}")
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for rows in args.rows:
+            filename = os.path.join(tmpdir, f"{rows}.dat")
+            write_synthetic_dat(filename, rows, args.columns)
+            size = os.path.getsize(filename) / 1e6
+
+            old, new = read_dat_file_legacy(filename), read_dat_file(filename)
+            assert list(old) == list(new), 'different columns'
+            assert all(np.allclose(old[name], new[name], equal_nan=True) for name in old), 'different data'
+            assert old.metadata == new.metadata, 'different metadata'
+
+            t_old = time_function(read_dat_file_legacy, filename, args.repeat)
+            t_new = time_function(read_dat_file, filename, args.repeat)
+            print(f"{rows:8} {args.columns:8} {size:8.1f} {t_old:9.4f} {t_new:9.4f} {t_old / t_new:8.1f}")
+
+
+if __name__ == '__main__':
+    main()
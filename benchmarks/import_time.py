@@ -0,0 +1,90 @@
+"""
+Benchmark start-up time of the check_nexus entry point
+
+Times the import of check_nexus.cli, then the whole command as a user runs it: `check_nexus --help` and a
+check of one small synthetic file, each in a fresh interpreter.
+Fails (exit code 1) if a median time is over budget, or if any of them imports packages that are only needed
+for validation or dat file comparison.
+
+    $ python benchmarks/import_time.py
+    $ python benchmarks/import_time.py --budget 0.3 --repeat 20
+"""
+
+import os
+import sys
+import time
+import argparse
+import subprocess
+import statistics
+import tempfile
+
+ENTRY_POINT = 'import check_nexus.cli'
+BUDGET_S = 0.5  # h5py (and hence numpy) is required for checking, punx and nexus2srs are not
+CHECK_BUDGET_S = 1.0  # start-up, reading the spec, checking and printing the score table of one file
+FORBIDDEN_MODULES = ['punx', 'nexus2srs', 'check_nexus.validate', 'check_nexus.dat_file_comparison']
+
+
+def time_import(statement: str = ENTRY_POINT, repeat: int = 10) -> list[float]:
+    """Return wall time in seconds of a fresh interpreter running statement, repeated"""
+    times = []
+    for n in range(repeat):
+        t0 = time.perf_counter()
+        subprocess.run([sys.executable, '-c', statement], check=True, stdout=subprocess.DEVNULL)
+        times.append(time.perf_counter() - t0)
+    return times
+
+
+def command_statement(args: list[str]) -> str:
+    """Return statement running check_nexus with args, without the daemon, as time_command does"""
+    argv = ['check_nexus', *args, '--no-daemon']
+    return f"import sys; sys.argv = {argv!r}; from check_nexus.cli import cli_check_nexus; cli_check_nexus()"
+
+
+def imported_modules(statement: str = ENTRY_POINT) -> list[str]:
+    """Return forbidden modules imported by statement in a fresh interpreter"""
+    check = (f"{statement}\nimport sys\n"
+             f"print('imported:', *(m for m in {FORBIDDEN_MODULES!r} if m in sys.modules))")
+    output = subprocess.run([sys.executable, '-c', check], check=True, capture_output=True, text=True)
+    return output.stdout.rsplit('imported:', 1)[-1].split()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--budget', type=float, default=BUDGET_S, help='maximum median start-up time in s')
+    parser.add_argument('--check-budget', type=float, default=CHECK_BUDGET_S,
+                        help='maximum median time of checking one file in s')
+    parser.add_argument('--repeat', type=int, default=10, help='number of interpreter launches')
+    args = parser.parse_args()
+
+    from check_nexus.synthetic import write_synthetic_nexus
+
+    baseline = statistics.median(time_import('pass', args.repeat))
+    print(f"interpreter start-up: {baseline:.3f} s")
+    failed = False
+    with tempfile.TemporaryDirectory() as folder:
+        filename = os.path.join(folder, '1.nxs')
+        write_synthetic_nexus(filename)
+        commands = [
+            (f"'{ENTRY_POINT}'", ENTRY_POINT, args.budget),
+            ("'check_nexus --help'", command_statement(['--help']), args.budget),
+            ("'check_nexus 1.nxs'", command_statement([filename]), args.check_budget),
+        ]
+        for name, statement, budget in commands:
+            times = time_import(statement, args.repeat)
+            median = statistics.median(times)
+            print(f"{name}: median {median:.3f} s, min {min(times):.3f} s, max {max(times):.3f} s, "
+                  f"budget {budget:.3f} s")
+            if median > budget:
+                print(f"FAIL: {name} took {median:.3f} s, over budget")
+                failed = True
+            modules = imported_modules(statement)
+            if modules:
+                print(f"FAIL: {name} imported unnecessary modules: {', '.join(modules)}")
+                failed = True
+    if failed:
+        sys.exit(1)
+    print('OK')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+"""
+Time of build_nxclass_index against the three find_nxclass walks of the original check_metadata
+
+The original check_metadata walked the file once for each of NXentry, NXdata and NXdetector, opening every link
+with hdf_file.get. build_nxclass_index lists every object once and resolves the links through the index. Writes a
+synthetic file of each preset size (see check_nexus.synthetic.SIZES) and reports the best time of each, and of
+the whole check_metadata without layout reuse.
+
+    $ python benchmarks/nxclass_index.py --sizes small medium large
+"""
+
+import time
+import argparse
+import tempfile
+
+import h5py
+
+from check_nexus.check import build_nxclass_index, check_file
+from check_nexus.synthetic import SIZES, write_corpus
+
+
+def walk_nxclass(hdf_file: h5py.File, nxclass: str) -> list[str]:
+    """find_nxclass of the original check_i16_nexus.py"""
+    paths = []
+
+    def visit_links(name):
+        h5py_obj = hdf_file.get(name)
+        if isinstance(h5py_obj, h5py.Group) and h5py_obj.attrs.get('NX_class') == nxclass.encode():
+            paths.append(name)
+
+    hdf_file.visit_links(visit_links)
+    return paths
+
+
+def walk_three(filename: str):
+    with h5py.File(filename, 'r') as nxs:
+        for nxclass in ('NXentry', 'NXdata', 'NXdetector'):
+            walk_nxclass(nxs, nxclass)
+
+
+def index(filename: str):
+    with h5py.File(filename, 'r') as nxs:
+        build_nxclass_index(nxs)
+
+
+def best_time(fun, *args, repeat: int = 5) -> float:
+    """Return shortest time in s of fun(*args)"""
+    times = []
+    for n in range(repeat):
+        t0 = time.perf_counter()
+        fun(*args)
+        times.append(time.perf_counter() - t0)
+    return min(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--sizes', nargs='+', default=list(SIZES), choices=list(SIZES))
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'Size':>8} {'links':>7} {'3 walks s':>10} {'index s':>9} {'speed-up':>9} {'check s':>9}")
+    with tempfile.TemporaryDirectory() as folder:
+        for size in args.sizes:
+            filename, = write_corpus(f"{folder}/{size}", size)
+            with h5py.File(filename, 'r') as nxs:
+                n_links = len(build_nxclass_index(nxs))
+            walk_s = best_time(walk_three, filename, repeat=args.repeat)
+            index_s = best_time(index, filename, repeat=args.repeat)
+            check_s = best_time(check_file, filename, False, repeat=args.repeat)
+            print(f"{size:>8} {n_links:7} {walk_s:10.4f} {index_s:9.4f} {walk_s / index_s:9.1f} {check_s:9.4f}")
+
+
+if __name__ == '__main__':
+    main()
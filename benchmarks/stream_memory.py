@@ -0,0 +1,60 @@
+"""
+Peak memory of check_file and the streaming check, against the number of objects in the file
+
+Writes synthetic files with increasing numbers of scanned fields and detectors, so the NXdata groups and the
+number of NXdetector groups grow, and reports the peak Python memory of each check, measured with tracemalloc.
+check_streaming keeps the findings that aren't OK, iter_file_findings only counts them.
+
+    $ python benchmarks/stream_memory.py --fields 1000 5000 20000 --detectors 2
+"""
+
+import os
+import time
+import argparse
+import tempfile
+import tracemalloc
+
+from check_nexus.check import check_file
+from check_nexus.stream import check_streaming, iter_file_findings
+from check_nexus.synthetic import write_synthetic_nexus
+
+
+def peak_memory(fun, *args, **kwargs) -> tuple[float, float]:
+    """Return peak traced memory in MB and time in s of fun(*args, **kwargs)"""
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    fun(*args, **kwargs)
+    duration = time.perf_counter() - t0
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak / 2 ** 20, duration
+
+
+def count_findings(filename: str) -> int:
+    return sum(1 for finding in iter_file_findings(filename))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--fields', type=int, nargs='+', default=[1000, 5000],
+                        help='numbers of scanned fields in NXdata /entry/measurement')
+    parser.add_argument('--detectors', type=int, default=0, help='detectors per 1000 fields')
+    args = parser.parse_args()
+
+    print(f"{'Fields':>8} {'Detectors':>10} {'check_file MB':>14} {'s':>7} {'check_streaming MB':>19} {'s':>7} "
+          f"{'iter_file_findings MB':>22} {'s':>7}")
+    with tempfile.TemporaryDirectory() as folder:
+        for n_fields in args.fields:
+            filename = os.path.join(folder, f"{n_fields}.nxs")
+            n_detectors = max(1, args.detectors * n_fields // 1000)
+            write_synthetic_nexus(filename, n_fields=n_fields, n_detectors=n_detectors, scan_points=3,
+                                  detector_shape=(2, 2))
+            full_mb, full_s = peak_memory(check_file, filename, reuse_layout=False)
+            stream_mb, stream_s = peak_memory(check_streaming, filename)
+            iter_mb, iter_s = peak_memory(count_findings, filename)
+            print(f"{n_fields:8} {n_detectors:10} {full_mb:14.1f} {full_s:7.2f} {stream_mb:19.1f} {stream_s:7.2f} "
+                  f"{iter_mb:22.1f} {iter_s:7.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,133 @@
+"""
+Benchmark suite for check_nexus
+
+Writes a corpus of synthetic I16-style NeXus files of each preset size (see check_nexus.synthetic.SIZES),
+times each function on every size and writes the results as JSON, so results from different versions can
+be compared.
+
+    $ python benchmarks/suite.py -o results_0.2.0.json
+    $ python benchmarks/suite.py --sizes small medium --compare results_0.2.0.json
+"""
+
+import os
+import sys
+import json
+import time
+import functools
+import argparse
+import platform
+import tempfile
+import statistics
+
+import h5py
+
+import check_nexus
+from check_nexus.check import find_nxclass, check_file
+from check_nexus.synthetic import SIZES, write_corpus, write_synthetic_dat
+
+
+def time_calls(fun, args: list, repeat: int = 3) -> dict:
+    """Return timing statistics in s of fun(arg) for each arg, repeated"""
+    times = []
+    for n in range(repeat):
+        for arg in args:
+            t0 = time.perf_counter()
+            fun(arg)
+            times.append(time.perf_counter() - t0)
+    return {
+        'calls': len(times),
+        'min': min(times),
+        'median': statistics.median(times),
+        'mean': statistics.mean(times),
+        'max': max(times),
+    }
+
+
+def bench_find_nxclass(filename: str):
+    with h5py.File(filename, 'r') as nxs:
+        find_nxclass(nxs, 'NXdata')
+
+
+def benchmarks(files: list[str], dat_files: list[str], repeat: int, validate: bool = True) -> dict:
+    """Return {benchmark: timing} for a list of files of the same size"""
+    results = {
+        'find_nxclass': time_calls(bench_find_nxclass, files, repeat),
+        'check_metadata': time_calls(functools.partial(check_file, reuse_layout=False), files, repeat),
+        'check_metadata_same_layout': time_calls(check_file, files, repeat),
+    }
+    if validate:
+        try:
+            from check_nexus.validate import get_validator, validate_file
+            get_validator()  # time validation with a warm validator
+            results['validate_nexus'] = time_calls(validate_file, files, repeat)
+        except ImportError as ex:
+            print(f"validate_nexus skipped: {ex}")
+    if dat_files:
+        try:
+            from check_nexus.dat_file_comparison import read_dat_file
+            results['read_dat_file'] = time_calls(read_dat_file, dat_files, repeat)
+        except ImportError as ex:
+            print(f"read_dat_file skipped: {ex}")
+    return results
+
+
+def compare(results: dict, previous: dict) -> str:
+    """Return table comparing median times with previous results"""
+    out = f"{'size':8} {'benchmark':16} {'previous s':>11} {'current s':>11} {'ratio':>7}\n"
+    for size, benches in results['sizes'].items():
+        for name, timing in benches.items():
+            old = previous.get('sizes', {}).get(size, {}).get(name)
+            if old is None:
+                continue
+            ratio = timing['median'] / old['median']
+            flag = '  SLOWER' if ratio > 1.2 else ''
+            out += f"{size:8} {name:16} {old['median']:11.5f} {timing['median']:11.5f} {ratio:7.2f}{flag}\n"
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', nargs='+', default=list(SIZES), choices=list(SIZES))
+    parser.add_argument('--files', type=int, default=3, help='number of files of each size')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--no-validate', action='store_true', help='skip punx validation')
+    parser.add_argument('--directory', help='folder to write corpus, default a temporary folder')
+    parser.add_argument('-o', '--output', help='write results to JSON file')
+    parser.add_argument('--compare', help='JSON results file from a previous run')
+    args = parser.parse_args()
+
+    results = {
+        'version': check_nexus.__version__,
+        'date': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': sys.version.split()[0],
+        'h5py': h5py.__version__,
+        'hdf5': h5py.version.hdf5_version,
+        'platform': platform.platform(),
+        'files': args.files,
+        'repeat': args.repeat,
+        'sizes': {},
+    }
+    with tempfile.TemporaryDirectory() as tmpdir:
+        directory = args.directory or tmpdir
+        for size in args.sizes:
+            files = write_corpus(os.path.join(directory, size), size, args.files)
+            scan_points = SIZES[size]['scan_points']
+            dat_file = os.path.join(directory, size, 'scan.dat')
+            write_synthetic_dat(dat_file, rows=scan_points, columns=SIZES[size]['n_fields'])
+            results['sizes'][size] = benchmarks(files, [dat_file], args.repeat, not args.no_validate)
+            for name, timing in results['sizes'][size].items():
+                print(f"{size:8} {name:16} median {timing['median']:.5f} s, min {timing['min']:.5f} s")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.output}")
+    if args.compare:
+        with open(args.compare) as f:
+            previous = json.load(f)
+        print(f"\nComparison with version {previous.get('version')} ({previous.get('date')}):")
+        print(compare(results, previous))
+
+
+if __name__ == '__main__':
+    main()
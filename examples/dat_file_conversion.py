@@ -1,11 +1,15 @@
 """
 Test nexus2srs and compare dat files
+
+    $ python dat_file_conversion.py 12345.dat
+The NeXus file '12345.nxs' must be in the same folder as the dat file.
 """
 
+import sys
+
 from check_nexus import convert_and_compare_dat
 
 
-f = r"C:\Users\grp66007\OneDrive - Diamond Light Source Ltd\DataAnalysis\Nexus\i16_nexus_test_19Nov24\1070249.dat"
+f = sys.argv[1] if len(sys.argv) > 1 else '1070249.dat'
 
 convert_and_compare_dat(f)
-
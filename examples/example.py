@@ -1,10 +1,22 @@
 """
 Check and validate a nexus file
+
+    $ python example.py 12345.nxs
+If no file is given, a synthetic I16-style file is written to a temporary folder.
 """
 
+import os
+import sys
+import tempfile
+
 from check_nexus import check_metadata, validate_nexus, set_logging_level
+from check_nexus.synthetic import write_synthetic_nexus
 
-f = r"C:\Users\grp66007\OneDrive - Diamond Light Source Ltd\DataAnalysis\Nexus\i16_nexus_test_31Oct24\1068436.nxs"
+if len(sys.argv) > 1:
+    f = sys.argv[1]
+else:
+    f = os.path.join(tempfile.mkdtemp(), '1000.nxs')
+    write_synthetic_nexus(f)
 
 print('\nValidation:')
 validate_nexus(f)
@@ -2,11 +2,36 @@
 check_i16_nexus files against Diamond NeXus specification
 """
 
-from .check import check_metadata, set_logging_level
-from .validate import validate_nexus
-from .dat_file_comparison import convert_and_compare_dat
+import importlib
 
 __version__ = '0.2.0'
 __date__ = '2024/12/11'
 
-__all__ = ['check_metadata', 'validate_nexus', 'set_logging_level', 'convert_and_compare_dat']
+__all__ = ['check_metadata', 'check_file', 'check_profiles', 'NexusChecker', 'load_profiles', 'validate_nexus',
+           'set_logging_level', 'convert_and_compare_dat', 'compare_dat_batch']
+
+# exports are imported on first use, so checking metadata doesn't import punx or nexus2srs
+_LAZY_IMPORTS = {
+    'check_metadata': '.check',
+    'check_file': '.check',
+    'check_profiles': '.check',
+    'NexusChecker': '.check',
+    'load_profiles': '.profiles',
+    'set_logging_level': '.check',
+    'validate_nexus': '.validate',
+    'convert_and_compare_dat': '.dat_file_comparison',
+    'compare_dat_batch': '.dat_file_comparison',
+}
+
+
+def __getattr__(name):
+    if name in _LAZY_IMPORTS:
+        module = importlib.import_module(_LAZY_IMPORTS[name], __name__)
+        value = getattr(module, name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
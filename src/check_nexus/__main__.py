@@ -2,6 +2,5 @@
 launch command line interface
 """
 if __name__ == '__main__':
-    from .cli import cli_checknexus
-    cli_checknexus()
-
+    from .cli import cli_check_nexus
+    cli_check_nexus()
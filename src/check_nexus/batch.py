@@ -0,0 +1,212 @@
+"""
+Batch checking of many NeXus files
+"""
+
+import os
+import sys
+import glob
+import typing
+import logging
+import contextlib
+from concurrent.futures import Executor, ProcessPoolExecutor
+
+from .check import check_profiles, set_logging_level
+from .results import CheckResult
+from .cache import ResultCache
+from .profiling import Profiler, profiling
+from .links import FOLLOW
+from .profiles import SpecProfile, DEFAULT_PROFILE
+from .prefetch import Prefetcher
+from .stream import StreamLimits, check_streaming
+
+logger = logging.getLogger(__name__)
+
+NEXUS_EXTENSIONS = ('.nxs',)
+
+
+def is_nexus_file(filename: str) -> bool:
+    """Return True if filename has a NeXus file extension"""
+    return filename.endswith(NEXUS_EXTENSIONS)
+
+
+def read_file_list(file_list: str) -> list[str]:
+    """
+    Read a list of filenames, one per line, from a text file or stdin
+    :param file_list: filename of text file, or '-' for stdin
+    :return: [filename, ]
+    """
+    if file_list == '-':
+        lines = sys.stdin.read().splitlines()
+    else:
+        with open(file_list, 'r') as f:
+            lines = f.read().splitlines()
+    return [ln.strip() for ln in lines if ln.strip() and not ln.strip().startswith('#')]
+
+
+def find_nexus_files(*args: str) -> list[str]:
+    """
+    Expand arguments into a sorted list of unique NeXus files
+    Arguments may be:
+        '12345.nxs'         - a single file
+        '/dls/i16/data/'    - a directory, searched recursively for .nxs files
+        '/dls/i16/*/*.nxs'  - a glob pattern
+        '@files.txt'        - a text file containing a list of any of the above, one per line
+        '-'                 - read the list from stdin
+    :param args: str file, directory, glob, @file_list or '-'
+    :return: [filename, ]
+    """
+    files = set()
+    for arg in args:
+        if arg == '-' or arg.startswith('@'):
+            files.update(find_nexus_files(*read_file_list(arg.lstrip('@') or '-')))
+        elif os.path.isdir(arg):
+            for root, dirs, filenames in os.walk(arg):
+                files.update(os.path.join(root, name) for name in filenames if is_nexus_file(name))
+        elif glob.has_magic(arg):
+            files.update(path for path in glob.glob(arg, recursive=True) if is_nexus_file(path))
+        elif is_nexus_file(arg):
+            files.add(arg)
+    return sorted(files)
+
+
+def _check_file(file: str, profile: bool = False, link_policy: str = FOLLOW,
+                profiles: list[SpecProfile] | None = None, limits: StreamLimits | None = None) -> list[CheckResult]:
+    """
+    Run check_profiles, or check_streaming if limits are given, catching errors
+    If profile is True, profile metrics are collected in the first result.
+    """
+    profiles = profiles or [DEFAULT_PROFILE]
+    with profiling() if profile else contextlib.nullcontext() as profiler:
+        try:
+            if limits is not None:
+                results = check_streaming(file, profiles, link_policy, limits)
+            else:
+                results = check_profiles(file, profiles, link_policy=link_policy)
+        except Exception as ex:
+            logger.warning(f"{file} failed with error: {ex}")
+            results = [CheckResult(file, error=f"{type(ex).__name__}: {ex}", spec=p.name) for p in profiles]
+    if profile:
+        results[0].profile = profiler.as_dict()
+    return results
+
+
+def iter_check_batch(files: list[str], workers: int = 1, cache: ResultCache | None = None,
+                     profiler: Profiler | None = None, link_policy: str = FOLLOW,
+                     profiles: list[SpecProfile] | None = None, executor: Executor | None = None,
+                     prefetch: int = 0, limits: StreamLimits | None = None) -> typing.Iterator[CheckResult]:
+    """
+    Run check_file on many files, optionally in parallel, yielding each result as soon as it is available
+    Results are yielded in the order of files, independent of the number of workers.
+    With several spec profiles, each file is read once and one result is yielded per profile, in profile order.
+    Files that fail to open are given a score of -1 and an error message.
+    :param files: list of NeXus filenames
+    :param workers: number of worker processes, if <= 1 files are checked in this process
+    :param cache: ResultCache, if given unchanged files are read from the cache and new results are stored
+    :param profiler: Profiler, if given metrics from every worker are collected in it
+    :param link_policy: how external files are checked, 'follow', 'verify' or 'none', see links.py
+    :param profiles: [SpecProfile, ] from profiles.load_profiles, default is the Diamond spec
+    :param executor: existing process pool to use, e.g. the daemon's warm workers, instead of starting one
+    :param prefetch: when checking in this process, read up to this many files ahead in background threads,
+        see prefetch.py. Worker processes already overlap their reads.
+    :param limits: if given, files are checked with the streaming check, with bounded memory, see stream.py,
+        the cache isn't used
+    :return: generator of CheckResult
+    """
+    profile = profiler is not None
+    profiles = profiles or [DEFAULT_PROFILE]
+    specs = {p.name: p.spec_hash(link_policy) for p in profiles}
+    if limits is not None and cache is not None:
+        # streaming results have no OK findings and may be cut short by the limits, unlike the full check
+        logger.warning('The result cache is not used by the streaming check')
+        cache = None
+    cached = {}
+    if cache is not None:
+        for file in files:
+            results = [cache.get(file, spec) for spec in specs.values()]
+            if all(result is not None for result in results):
+                for name, result in zip(specs, results):
+                    result.spec = name
+                cached[file] = results
+        logger.info(f"{len(cached)} of {len(files)} files found in cache")
+        if profile:
+            profiler.count('cache_hits', len(cached))
+    to_check = [file for file in files if file not in cached]
+
+    with contextlib.ExitStack() as stack:
+        if executor is None and (workers <= 1 or len(to_check) <= 1):
+            prefetched = Prefetcher(to_check, prefetch, profiler=profiler) if prefetch > 0 else to_check
+            checked = map(_check_file, prefetched, [profile] * len(to_check), [link_policy] * len(to_check),
+                          [profiles] * len(to_check), [limits] * len(to_check))
+        else:
+            chunksize = max(1, len(to_check) // (4 * max(1, workers)))
+            if executor is None:
+                level = logging.getLogger('check_nexus.check').level
+                executor = stack.enter_context(
+                    ProcessPoolExecutor(max_workers=workers, initializer=set_logging_level, initargs=(level,))
+                )
+            checked = executor.map(_check_file, to_check, [profile] * len(to_check), [link_policy] * len(to_check),
+                                   [profiles] * len(to_check), [limits] * len(to_check), chunksize=chunksize)
+
+        for file in files:
+            if file in cached:
+                yield from cached.pop(file)
+                continue
+            results = next(checked)
+            if profile and results[0].profile:
+                profiler.merge(results[0].profile)
+            for result in results:
+                if cache is not None:
+                    cache.put(result, specs[result.spec])
+                yield result
+
+
+def check_batch(files: list[str], workers: int = 1, cache: ResultCache | None = None,
+                profiler: Profiler | None = None, link_policy: str = FOLLOW,
+                profiles: list[SpecProfile] | None = None, prefetch: int = 0,
+                limits: StreamLimits | None = None) -> list[CheckResult]:
+    """
+    Run check_file on many files, optionally in parallel
+    Results are returned in the order of files, independent of the number of workers.
+    Files that fail to open are given a score of -1 and an error message.
+    :param files: list of NeXus filenames
+    :param workers: number of worker processes, if <= 1 files are checked in this process
+    :param cache: ResultCache, if given unchanged files are read from the cache and new results are stored
+    :param profiler: Profiler, if given metrics from every worker are collected in it
+    :param link_policy: how external files are checked, 'follow', 'verify' or 'none', see links.py
+    :param profiles: [SpecProfile, ] from profiles.load_profiles, default is the Diamond spec
+    :param prefetch: when checking in this process, read up to this many files ahead in background threads
+    :param limits: if given, files are checked with the streaming check, with bounded memory, see stream.py,
+        the cache isn't used
+    :return: [CheckResult, ] one per file and profile
+    """
+    return list(iter_check_batch(files, workers, cache, profiler, link_policy, profiles, prefetch=prefetch,
+                                 limits=limits))
+
+
+def score_table(results: list[CheckResult]) -> str:
+    """
+    Generate table of scores from check_batch
+    With results from several spec profiles, a spec column and the scores of each profile are added.
+    :param results: list of CheckResult from check_batch
+    :return: str
+    """
+    specs = list(dict.fromkeys(result.spec for result in results))
+    width = max((len(result.file) for result in results), default=4)
+    spec_width = max(len(spec) for spec in specs) if len(specs) > 1 else 0
+    out = f"{'File':{width}}  " + (f"{'Spec':{spec_width}}  " if spec_width else '')
+    out += f"{'Score':>7}  {'Missing':>7}  {'Attrs':>7}\n"
+    for result in results:
+        out += f"{result.file:{width}}  " + (f"{result.spec:{spec_width}}  " if spec_width else '')
+        if result.error:
+            out += f"{'ERROR':>7}  {result.error}\n"
+        else:
+            out += f"{result.score:7}  {result.n_missing:7}  {result.n_missing_attributes:7}\n"
+    for spec in specs:
+        spec_results = [result for result in results if result.spec == spec]
+        scores = [result.score for result in spec_results if not result.error]
+        failed = len(spec_results) - len(scores)
+        out += f"\n{spec}: " if spec_width else '\n'
+        out += f"Files: {len(spec_results)}, failed: {failed}"
+        if scores:
+            out += f", mean score: {sum(scores) / len(scores):.1f}, worst: {max(scores)}"
+    return out
@@ -0,0 +1,183 @@
+"""
+Persistent on-disk cache of check_metadata results
+
+Results are stored in a SQLite database, keyed by the file path, size and modification time
+and a hash of the metadata specification, so files are only re-checked if they have changed
+or if the specification has changed. Every finding is stored, so cached results are the same as a new check.
+"""
+
+import os
+import time
+import pickle
+import sqlite3
+
+from .profiles import SpecProfile, DEFAULT_PROFILE
+from .results import CheckResult
+from .links import FOLLOW
+
+CACHE_ENV = 'CHECK_NEXUS_CACHE'
+DEFAULT_CACHE_FILE = os.path.join(os.path.expanduser('~'), '.cache', 'check_nexus', 'results.sqlite')
+MAX_AGE_DAYS = 90
+MAX_ENTRIES = 1_000_000
+VERSION = 1  # PRAGMA user_version, results of earlier versions only held the findings that weren't OK
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS check_results (
+    path TEXT NOT NULL,
+    spec TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    score INTEGER NOT NULL,
+    duration REAL NOT NULL,
+    findings BLOB NOT NULL,
+    last_used REAL NOT NULL,
+    PRIMARY KEY (path, spec)
+)
+"""
+
+
+def spec_hash(link_policy: str = FOLLOW, profile: SpecProfile = DEFAULT_PROFILE) -> str:
+    """
+    Return hash of the metadata specification, changes whenever the spec in metadata.py changes
+    :param link_policy: link policy used by check_file, results differ between policies
+    :param profile: SpecProfile, default is the spec in metadata.py
+    """
+    return profile.spec_hash(link_policy)
+
+
+def default_cache_file() -> str:
+    """Return cache filename, from environment variable CHECK_NEXUS_CACHE if set"""
+    return os.environ.get(CACHE_ENV, DEFAULT_CACHE_FILE)
+
+
+def file_identity(file: str) -> tuple[str, int, int]:
+    """Return absolute path, size and modification time in ns of file"""
+    stat = os.stat(file)
+    return os.path.abspath(file), stat.st_size, stat.st_mtime_ns
+
+
+class ResultCache:
+    """
+    SQLite cache of check_metadata results
+
+        with ResultCache() as cache:
+            result = cache.get('12345.nxs')  # None if file has changed or not in cache
+            if result is None:
+                result = check_file('12345.nxs')
+                cache.put(result)
+
+    :param filename: SQLite database file, default from default_cache_file()
+    :param spec: specification hash, default from spec_hash()
+    :param max_age_days: entries not used for this many days are evicted when the cache is opened
+    :param max_entries: least recently used entries above this number are evicted when the cache is opened
+    """
+
+    def __init__(self, filename: str | None = None, spec: str | None = None,
+                 max_age_days: float = MAX_AGE_DAYS, max_entries: int = MAX_ENTRIES):
+        self.filename = filename or default_cache_file()
+        self.spec = spec or spec_hash()
+        if self.filename != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(self.filename)), exist_ok=True)
+        self.db = sqlite3.connect(self.filename, check_same_thread=False)  # the daemon serialises access
+        self.db.execute(SCHEMA)
+        if self.db.execute('PRAGMA user_version').fetchone()[0] < VERSION:
+            self.db.execute('DELETE FROM check_results')
+            self.db.execute(f'PRAGMA user_version={VERSION}')
+            self.db.commit()
+        self.evict(max_age_days, max_entries)
+
+    def __repr__(self):
+        return f"ResultCache('{self.filename}', spec='{self.spec}')"
+
+    def __len__(self):
+        return self.db.execute('SELECT COUNT(*) FROM check_results').fetchone()[0]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def commit(self):
+        """Write stored results to the database file"""
+        self.db.commit()
+
+    def close(self):
+        """Commit changes and close database"""
+        self.db.commit()
+        self.db.close()
+
+    def get(self, file: str, spec: str | None = None) -> CheckResult | None:
+        """
+        Return cached result for file, or None if not cached or the file has changed
+        :param file: NeXus .nxs filename
+        :param spec: specification hash, if different from the cache spec, e.g. for another spec profile
+        :return: CheckResult, or None
+        """
+        spec = spec or self.spec
+        try:
+            path, size, mtime_ns = file_identity(file)
+        except OSError:
+            return None
+        row = self.db.execute(
+            'SELECT duration, findings FROM check_results '
+            'WHERE path=? AND spec=? AND size=? AND mtime_ns=?',
+            (path, spec, size, mtime_ns)
+        ).fetchone()
+        if row is None:
+            return None
+        self.db.execute('UPDATE check_results SET last_used=? WHERE path=? AND spec=?', (time.time(), path, spec))
+        duration, findings = row
+        return CheckResult(file, pickle.loads(findings), duration=duration)
+
+    def put(self, result: CheckResult, spec: str | None = None):
+        """
+        Store result of check_file
+        :param result: CheckResult, results with errors are not stored
+        :param spec: specification hash, if different from the cache spec, e.g. for another spec profile
+        """
+        if result.error:
+            return
+        path, size, mtime_ns = file_identity(result.file)
+        self.db.execute(
+            'INSERT OR REPLACE INTO check_results VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+            (path, spec or self.spec, size, mtime_ns, result.score, result.duration,
+             pickle.dumps(result.findings), time.time())
+        )
+
+    def invalidate(self, *files: str) -> int:
+        """
+        Remove cached results for files, for every spec version
+        :param files: NeXus filenames, or a directory to remove all files below it. If none, clear the cache.
+        :return: number of entries removed
+        """
+        if not files:
+            removed = self.db.execute('DELETE FROM check_results').rowcount
+        else:
+            removed = 0
+            for file in files:
+                path = os.path.abspath(file)
+                folder = path.rstrip(os.sep) + os.sep
+                removed += self.db.execute(
+                    'DELETE FROM check_results WHERE path=? OR substr(path, 1, ?)=?',
+                    (path, len(folder), folder)
+                ).rowcount
+        self.db.commit()
+        return removed
+
+    def evict(self, max_age_days: float = MAX_AGE_DAYS, max_entries: int = MAX_ENTRIES) -> int:
+        """
+        Remove old entries from the cache
+        :param max_age_days: remove entries not used for this many days
+        :param max_entries: remove least recently used entries above this number
+        :return: number of entries removed
+        """
+        removed = self.db.execute(
+            'DELETE FROM check_results WHERE last_used < ?', (time.time() - max_age_days * 86400,)
+        ).rowcount
+        removed += self.db.execute(
+            'DELETE FROM check_results WHERE rowid IN '
+            '(SELECT rowid FROM check_results ORDER BY last_used DESC LIMIT -1 OFFSET ?)', (max_entries,)
+        ).rowcount
+        self.db.commit()
+        return removed
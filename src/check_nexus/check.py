@@ -2,13 +2,81 @@
 Check metadata
 """
 
-import h5py
+import time
+import typing
 import logging
+import threading
+
+import h5py
+from h5py import h5g, h5l, h5o
 
-from .metadata import METADATA, ATTRIBUTES, NXENTRY_ATTRIBUTES, NXDATA_ATTRIBUTES, NXDETECTOR_DATA, DATASET_ATTRIBUTES
+from .plan import PlanNode, EXTERNAL, compile_plan, merge_plans, run_plan, read_nx_class
+from .profiles import SpecProfile, DEFAULT_PROFILE
+from .links import MAX_SOFTLINK_DEPTH, FOLLOW, LINK_POLICIES, ExternalLinks, external_aliases, dangling_soft_links
+from .fingerprint import structure_fingerprint
+from .consistency import check_consistency
+from .results import CheckResult, Finding, OK, WRONG, MISSING
+from .profiling import get_profiler
 
 logger = logging.getLogger(__name__)
 
+MAX_LAYOUTS = 256  # number of file layouts kept by check_file in each process, and by each NexusChecker
+
+
+class Layout(typing.NamedTuple):
+    """
+    Structural results shared by every file with the same structure_fingerprint and spec profiles
+        metadata: {profile name: {path: expected value}} - spec of the file, the profile and the additions of file_spec
+        results: {(profile name, path): (kind, nx_class, {attr: (expected, found, matches)})} - from the first file
+        value_plan: PlanNode - plan of the attribute checks and paths in external files, re-run on every file
+        aliases: {path: path of external link} - paths that resolve to an external link
+        dangling: {path: (target, error)} - dangling soft links
+        virtual: (path, ) - virtual datasets in this file, whose sources are checked again in every file
+    """
+    metadata: dict
+    results: dict
+    value_plan: PlanNode
+    aliases: dict
+    dangling: dict
+    virtual: tuple
+
+
+class LayoutCache:
+    """
+    Bounded cache of file layouts, safe to share between threads
+    Once max_layouts are held the oldest is dropped, so memory doesn't grow with the number of files checked.
+    :param max_layouts: number of layouts kept
+    """
+
+    def __init__(self, max_layouts: int = MAX_LAYOUTS):
+        self.max_layouts = max_layouts
+        self._layouts: dict[tuple[str, tuple[str, ...]], Layout] = {}
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return f"LayoutCache(max_layouts={self.max_layouts}, layouts={len(self)})"
+
+    def __len__(self):
+        return len(self._layouts)
+
+    def get(self, key: tuple[str, tuple[str, ...]]) -> Layout | None:
+        """Return layout of (structure_fingerprint, spec hashes), or None"""
+        return self._layouts.get(key)
+
+    def put(self, key: tuple[str, tuple[str, ...]], layout: Layout):
+        """Add layout, dropping the oldest layout if the cache is full"""
+        with self._lock:
+            if key not in self._layouts and len(self._layouts) >= self.max_layouts:
+                del self._layouts[next(iter(self._layouts))]
+            self._layouts[key] = layout
+
+    def clear(self):
+        with self._lock:
+            self._layouts.clear()
+
+
+_LAYOUTS = LayoutCache()
+
 
 def set_logging_level(level: str | int):
     """
@@ -27,109 +95,404 @@ def set_logging_level(level: str | int):
         level = level.upper()
         # level = logging.getLevelNamesMapping()[level]  # Python >3.11
         level = logging._nameToLevel[level]
+    if not logging.getLogger().handlers:
+        logging.basicConfig()  # previously configured as a side effect of importing punx or nexus2srs
     logger.setLevel(int(level))
     logger.info(f"Logging level set to {level}")
 
 
-def find_nxclass(hdf_file: h5py.File, nxclass: str) -> list[str]:
-    """Return NXdata instances"""
+def _resolve_link(hdf_file: h5py.File, name: str) -> tuple[str, str]:
+    """Return (kind, NX_class) of the object at the end of the link at name, following soft links from the root"""
+    def get_link(path: str) -> h5py.SoftLink | h5py.ExternalLink | h5py.HardLink | None:
+        return hdf_file.get(path, getlink=True) if path.strip('/') else h5py.HardLink()  # the root has no link
+
+    link = get_link(name)
+    target = name
+    for _ in range(MAX_SOFTLINK_DEPTH):
+        if not isinstance(link, h5py.SoftLink):
+            break
+        target = link.path
+        link = get_link(target)
+    if link is None or isinstance(link, h5py.SoftLink):
+        return 'dangling', ''
+    if isinstance(link, h5py.ExternalLink):
+        return 'external', ''
+    obj_class = hdf_file.get(target, getclass=True)
+    if obj_class is h5py.Group:
+        return 'group', read_nx_class(hdf_file[target])
+    if obj_class is h5py.Dataset:
+        return 'dataset', ''
+    return 'datatype', ''
+
+
+def build_nxclass_index(hdf_file: h5py.File) -> dict[str, tuple[str, str]]:
+    """
+    Return index of every link in the file
+    Every object is visited once, reading only the NX_class attributes of groups; datasets are never opened and
+    external links are not followed. Links are then listed in a single pass, hard links looked up by the address of
+    their object and soft links resolved through the index.
+        {path: (kind, NX_class)}
+    kind is one of 'group', 'dataset', 'datatype', 'external' or 'dangling'
+    NX_class is '' for anything other than a group
+    :param hdf_file: open h5py.File
+    :return: {path: (kind, nx_class)}
+    """
+    fid = hdf_file.id
+    objects = {}  # {address: (kind, nx_class)}
+
+    def visit_object(name: bytes, info: h5o.ObjInfo):
+        if info.type == h5o.TYPE_GROUP:
+            objects[info.addr] = ('group', read_nx_class(h5py.Group(h5g.open(fid, name))))
+        elif info.type == h5o.TYPE_DATASET:
+            objects[info.addr] = ('dataset', '')
+        else:
+            objects[info.addr] = ('datatype', '')
+
+    h5o.visit(fid, visit_object, info=True)
+
+    index = {}
+    soft = {}  # {path: target path}
+
+    def visit_link(name: bytes, info: h5l.LinkInfo):
+        path = name.decode()
+        if info.type == h5l.TYPE_HARD:
+            index[path] = objects[info.u]
+        elif info.type == h5l.TYPE_SOFT:
+            index[path] = None  # resolved once every link is listed, keeping the order of the links
+            soft[path] = fid.links.get_val(name).decode()
+        elif info.type == h5l.TYPE_EXTERNAL:
+            index[path] = ('external', '')
+        else:
+            index[path] = ('dangling', '')
+
+    fid.links.visit(visit_link, info=True)
+
+    for path, target in soft.items():
+        for _ in range(MAX_SOFTLINK_DEPTH):
+            if not target.startswith('/'):
+                target = None  # relative soft links are resolved from the root by _resolve_link
+                break
+            target = '/'.join(name for name in target.split('/') if name not in ('', '.'))
+            if target not in soft:
+                break
+            target = soft[target]
+        if target is None or target in soft:
+            index[path] = _resolve_link(hdf_file, path) if target is None else ('dangling', '')
+        else:
+            # targets that aren't links in the index, e.g. paths through soft linked groups, are resolved by HDF5
+            index[path] = index.get(target) or _resolve_link(hdf_file, path)
+    return index
+
+
+def find_nxclass(hdf_file: h5py.File, nxclass: str, index: dict[str, tuple[str, str]] | None = None) -> list[str]:
+    """
+    Return paths of groups with NX_class == nxclass
+    :param hdf_file: open h5py.File
+    :param nxclass: str NX_class name, e.g. 'NXdata'
+    :param index: index from build_nxclass_index, if None the file will be traversed
+    :return: [path, ]
+    """
+    if index is None:
+        index = build_nxclass_index(hdf_file)
+    return [path for path, (kind, nx_class) in index.items() if kind == 'group' and nx_class == nxclass]
+
+
+def file_spec(nxs: h5py.File, index: dict[str, tuple[str, str]],
+              profile: SpecProfile = DEFAULT_PROFILE) -> tuple[dict, dict]:
+    """
+    Return additions to the metadata spec for this file, from the NXentry, NXdata and NXdetector groups
+    :param nxs: open h5py.File
+    :param index: index from build_nxclass_index
+    :param profile: SpecProfile giving the expected contents of each group
+    :return: {path: expected value}, {path: {attr: expected value}}
+    """
+    metadata = {}
+    attributes = {}
+    # Find NXentry
+    nxentry_paths = find_nxclass(nxs, 'NXentry', index)
+    for path in nxentry_paths:
+        metadata[path] = 'NXentry'
+        attributes[path] = profile.nxentry_attributes
+        nxentry = nxs[path]
+        default = nxentry.attrs.get('default', None)
+        if default:
+            metadata[f"{path}/{default.decode()}"] = 'NXdata'
 
-    paths = []
+    # Find NXdata
+    nxdata_paths = find_nxclass(nxs, 'NXdata', index)
+    for path in nxdata_paths:
+        metadata[path] = 'NXdata'
+        attributes[path] = profile.nxdata_attributes
 
-    def visit_links(name):
-        h5py_obj = hdf_file.get(name)
-        if isinstance(h5py_obj, h5py.Group) and h5py_obj.attrs.get('NX_class') == nxclass.encode():
-            paths.append(name)
+        # external links in NXdata are detector datasets, avoid opening the external file
+        dataset_paths = [
+            f"{path}/{name}" for name in nxs[path].keys()
+            if index.get(f"{path}/{name}", ('',))[0] in ('dataset', 'external')
+        ]
+        for d_path in dataset_paths:
+            metadata[d_path] = 'nd array'
+            attributes[d_path] = profile.dataset_attributes
 
-    hdf_file.visit_links(visit_links)
-    return paths
+        # Default plotting
+        nxdata = nxs[path]
+        default_signal = nxdata.attrs.get('signal')
+        if default_signal:
+            metadata[f"{path}/{default_signal.decode()}"] = '@signal, nd array'
+
+        default_axes = nxdata.attrs.get('axes', None)
+        if default_axes is not None:
+            for axes in default_axes:
+                metadata[f"{path}/{axes.decode()}"] = '@axes, nd array'
+
+    # Find detectors
+    detector_paths = find_nxclass(nxs, 'NXdetector', index)
+    for path in detector_paths:
+        metadata[path] = 'NXdetector'
+        for name, example in profile.nxdetector_data.items():
+            metadata[f"{path}/{name}"] = example
+    return metadata, attributes
+
+
+def _is_external(path: str, aliases: dict[str, str]) -> bool:
+    """Return True if path, or any group above it, resolves to an external link"""
+    names = path.strip('/').split('/')
+    return any('/'.join(names[:n]) in aliases for n in range(1, len(names) + 1))
+
+
+def analyse_layout(nxs: h5py.File, index: dict[str, tuple[str, str]], links: ExternalLinks,
+                   profiles: list[SpecProfile] = (DEFAULT_PROFILE,)) -> Layout:
+    """
+    Run the full check of the structure of an open file against every profile, in a single pass over the file
+    :param nxs: open h5py.File
+    :param index: index from build_nxclass_index
+    :param links: ExternalLinks of the file
+    :param profiles: [SpecProfile, ], with unique names
+    :return: Layout
+    """
+    profiler = get_profiler()
+    # --- Update Metadata Spec ---
+    with profiler.phase('spec'):
+        specs = {profile.name: file_spec(nxs, index, profile) for profile in profiles}
+
+    # --- Find missing metadata ---
+    with profiler.phase('resolve'):
+        plans = []
+        for profile in profiles:
+            metadata, attributes = specs[profile.name]
+            plans.extend([profile.plan, compile_plan(metadata, attributes, tag=profile.name)])
+        results = run_plan(nxs, merge_plans(*plans), links)
+
+    # attribute values aren't part of the layout, and external files may be missing,
+    # so these are checked again in every file
+    value_plans = []
+    for profile in profiles:
+        metadata, attributes = specs[profile.name]
+        all_attributes = {**profile.attributes, **attributes}
+        value_paths = {
+            path: value for path, value in {**profile.metadata, **metadata}.items()
+            if _is_external(path, links.aliases)
+            or results[profile.name, path][0] != 'missing' and all_attributes.get(path)
+        }
+        value_plans.append(compile_plan(value_paths, all_attributes, tag=profile.name))
+    metadata = {profile.name: {**profile.metadata, **specs[profile.name][0]} for profile in profiles}
+    # sources of virtual datasets in external files are checked by the value plan
+    virtual = tuple(path for path in links.virtual if not _is_external(path, links.aliases))
+    return Layout(metadata, results, merge_plans(*value_plans), links.aliases, dangling_soft_links(nxs, index),
+                  virtual)
+
+
+def path_findings(path: str, value, result: tuple[str, str, dict]) -> list[Finding]:
+    """
+    Return findings of a path in the spec and its attributes
+    :param path: path in the spec
+    :param value: expected value in the spec
+    :param result: (kind, nx_class, {attr: (expected, found, matches)}) from run_plan
+    :return: [Finding, ]
+    """
+    kind, nx_class, found_attrs = result
+    if kind == 'group':
+        findings = [Finding(path, '', kind, value, nx_class, OK if nx_class == value else WRONG)]
+    elif kind in ('dataset', EXTERNAL):
+        findings = [Finding(path, '', kind, value, kind, OK)]
+    else:
+        findings = [Finding(path, '', '', value, None, MISSING)]
+    for attr, (attr_value, obj_attr, matches) in found_attrs.items():
+        severity = MISSING if obj_attr is None else OK if matches else WRONG
+        findings.append(Finding(path, attr, 'attribute', attr_value, obj_attr, severity))
+    return findings
+
+
+def check_open_file(nxs: h5py.File, profiles: list[SpecProfile] = (DEFAULT_PROFILE,),
+                    layouts: LayoutCache | None = _LAYOUTS, link_policy: str = FOLLOW,
+                    file: str | None = None) -> list[CheckResult]:
+    """
+    Check metadata of an open file against several spec profiles, in a single pass over the file, see check_profiles
+    :param nxs: open h5py.File
+    :param profiles: [SpecProfile, ] with unique names
+    :param layouts: LayoutCache of the layouts to reuse and add to, None to always check the full structure
+    :param link_policy: how external files are checked, 'follow', 'verify' or 'none', see links.py
+    :param file: filename of the results, default is nxs.filename
+    :return: [CheckResult, ] one per profile, with CheckResult.spec set to the profile name
+    """
+    t0 = time.perf_counter()
+    profiler = get_profiler()
+    if layouts is not None:
+        with profiler.phase('fingerprint'):
+            key = (structure_fingerprint(nxs), tuple(profile.spec_hash(link_policy) for profile in profiles))
+        layout = layouts.get(key)
+    else:
+        key = layout = None
+
+    if layout is None:
+        with profiler.phase('index'):
+            index = build_nxclass_index(nxs)
+            aliases = external_aliases(nxs, index)
+    else:
+        aliases = layout.aliases
+
+    with ExternalLinks(nxs, aliases, link_policy) as links:
+        if layout is None:
+            layout = analyse_layout(nxs, index, links, profiles)
+            results = layout.results
+            if key is not None:
+                layouts.put(key, layout)
+        else:
+            profiler.count('layouts_reused')
+            with profiler.phase('values'):
+                results = {**layout.results, **run_plan(nxs, layout.value_plan, links)}
+                for path in layout.virtual:
+                    links.check_virtual(path, nxs[path])
+        specs = layout.metadata
+        # NXdata and NXdetector groups are found in the file, so are the same for every profile
+        name = profiles[0].name
+        consistency = check_consistency(
+            nxs, specs[name], {path: results[name, path] for path in specs[name]}, links
+        )
+        dangling = {**layout.dangling, **links.dangling}
+
+    with profiler.phase('findings'):
+        check_results = []
+        for profile in profiles:
+            findings = []
+            for path, value in specs[profile.name].items():
+                findings.extend(path_findings(path, value, results[profile.name, path]))
+            findings.extend(consistency)
+            for path, (target, error) in dangling.items():
+                findings.append(Finding(path, '', 'link', target, error, WRONG))
+            check_results.append(CheckResult(file or nxs.filename, findings, spec=profile.name))
+    duration = time.perf_counter() - t0
+    for result in check_results:
+        result.duration = duration
+    return check_results
+
+
+def check_profiles(file: str, profiles: list[SpecProfile] | None = None, reuse_layout: bool = True,
+                   link_policy: str = FOLLOW) -> list[CheckResult]:
+    """
+    Check metadata of file against several spec profiles, in a single pass over the file
+    Files with the same layout as a file already checked in this process, determined by
+    structure_fingerprint, reuse its structural results and only the attribute values are checked.
+    Shape, value and dangling link findings don't depend on the spec and are included in every result.
+    :param file: NeXus .nxs filename
+    :param profiles: [SpecProfile, ] with unique names, from profiles.load_profiles, default is the Diamond spec
+    :param reuse_layout: if False, always check the full structure of the file
+    :param link_policy: how external files are checked, 'follow', 'verify' or 'none', see links.py
+    :return: [CheckResult, ] one per profile, with CheckResult.spec set to the profile name
+    """
+    t0 = time.perf_counter()
+    profiles = list(profiles or [DEFAULT_PROFILE])
+    with get_profiler().phase('open'):
+        nxs = h5py.File(file, 'r')
+    with nxs:
+        check_results = check_open_file(nxs, profiles, _LAYOUTS if reuse_layout else None, link_policy, file)
+    duration = time.perf_counter() - t0
+    for result in check_results:
+        result.duration = duration
+    return check_results
+
+
+def check_file(file: str, reuse_layout: bool = True, link_policy: str = FOLLOW,
+               profile: SpecProfile | None = None) -> CheckResult:
+    """
+    Check metadata of file against expectation, returning structured result
+    Files with the same layout as a file already checked in this process, determined by
+    structure_fingerprint, reuse its structural results and only the attribute values are checked.
+    :param file: NeXus .nxs filename
+    :param reuse_layout: if False, always check the full structure of the file
+    :param link_policy: how external files are checked, 'follow', 'verify' or 'none', see links.py
+    :param profile: SpecProfile to check against, default is the Diamond spec in metadata.py
+    :return: CheckResult
+    """
+    return check_profiles(file, [profile or DEFAULT_PROFILE], reuse_layout, link_policy)[0]
 
 
 def check_metadata(file: str) -> tuple[int, list[str], list[str]]:
     """
     Check metadata of file against expectation
+    The report is logged at level INFO, use set_logging_level('info') to print it
     :param file: NeXus .nxs filename
     :return: score, [missing paths], [missing attributes]
     """
+    result = check_file(file)
+    if logger.isEnabledFor(logging.INFO):
+        for line in result.report_lines():
+            logger.info(line)
+    return result.score, result.missing, result.missing_attributes
+
+
+class NexusChecker:
+    """
+    Reusable check of many files against the same spec profiles and options, e.g. inside a long-running service
+    The spec is compiled when the checker is created, so checking a file builds no spec state. Layouts of the files
+    checked are kept in the checker's own LayoutCache, which holds at most max_layouts, so memory stays flat however
+    many files are checked. A checker can be shared between threads; h5py only runs one HDF5 call at a time, so
+    threads help when waiting on slow storage rather than with the cost of the checks.
+        checker = NexusChecker(load_profiles('diamond', 'i16.yaml'), link_policy='verify')
+        for file in files:
+            results = checker.check(file)
+    :param profiles: [SpecProfile, ] with unique names, from profiles.load_profiles, default is the Diamond spec
+    :param link_policy: how external files are checked, 'follow', 'verify' or 'none', see links.py
+    :param reuse_layout: if False, always check the full structure of each file
+    :param max_layouts: number of file layouts kept
+    """
+
+    def __init__(self, profiles: list[SpecProfile] | None = None, link_policy: str = FOLLOW,
+                 reuse_layout: bool = True, max_layouts: int = MAX_LAYOUTS):
+        if link_policy not in LINK_POLICIES:
+            raise ValueError(f"Unknown link policy '{link_policy}', use one of {LINK_POLICIES}")
+        self.profiles = tuple(profiles or [DEFAULT_PROFILE])
+        names = [profile.name for profile in self.profiles]
+        duplicates = {name for name in names if names.count(name) > 1}
+        if duplicates:
+            raise ValueError(f"Spec profile names must be unique: {', '.join(sorted(duplicates))}")
+        self.link_policy = link_policy
+        self.layouts = LayoutCache(max_layouts) if reuse_layout else None
+        for profile in self.profiles:
+            profile.plan  # compile now rather than in the first check
+            profile.spec_hash(link_policy)
+
+    def __repr__(self):
+        names = ', '.join(profile.name for profile in self.profiles)
+        return f"NexusChecker([{names}], link_policy='{self.link_policy}', layouts={self.layouts!r})"
+
+    def check(self, file: str | h5py.File) -> list[CheckResult]:
+        """
+        Check metadata of a file against every profile
+        :param file: NeXus .nxs filename or open h5py.File, which is left open
+        :return: [CheckResult, ] one per profile, with CheckResult.spec set to the profile name
+        """
+        if isinstance(file, h5py.File):
+            return check_open_file(file, self.profiles, self.layouts, self.link_policy)
+        t0 = time.perf_counter()
+        with get_profiler().phase('open'):
+            nxs = h5py.File(file, 'r')
+        with nxs:
+            check_results = check_open_file(nxs, self.profiles, self.layouts, self.link_policy, file)
+        duration = time.perf_counter() - t0
+        for result in check_results:
+            result.duration = duration
+        return check_results
 
-    metadata = METADATA.copy()
-    attributes = ATTRIBUTES.copy()
-
-    missing = []
-    missing_attributes = []
-    logger.info(f"\nFile: {file}")
-    with h5py.File(file, 'r') as nxs:
-
-        # --- Update Metadata Spec ---
-        # Find NXentry
-        nxentry_paths = find_nxclass(nxs, 'NXentry')
-        for path in nxentry_paths:
-            metadata[path] = 'NXentry'
-            attributes[path] = NXENTRY_ATTRIBUTES
-            nxentry = nxs[path]
-            default = nxentry.attrs.get('default', None)
-            if default:
-                metadata[f"{path}/{default.decode()}"] = 'NXdata'
-
-        # Find NXdata
-        nxdata_paths = find_nxclass(nxs, 'NXdata')
-        for path in nxdata_paths:
-            metadata[path] = 'NXdata'
-            attributes[path] = NXDATA_ATTRIBUTES
-
-            dataset_paths = [
-                f"{path}/{name}" for name, dataset in nxs[path].items() if isinstance(dataset, h5py.Dataset)
-            ]
-            for d_path in dataset_paths:
-                metadata[d_path] = 'nd array'
-                attributes[d_path] = DATASET_ATTRIBUTES
-
-            # Default plotting
-            nxdata = nxs[path]
-            default_signal = nxdata.attrs.get('signal')
-            if default_signal:
-                metadata[f"{path}/{default_signal.decode()}"] = '@signal, nd array'
-
-            default_axes = nxdata.attrs.get('axes', None)
-            if default_axes is not None:
-                for axes in default_axes:
-                    metadata[f"{path}/{axes.decode()}"] = '@axes, nd array'
-
-        # Find detectors
-        detector_paths = find_nxclass(nxs, 'NXdetector')
-        for path in detector_paths:
-            metadata[path] = 'NXdetector'
-            for name, example in NXDETECTOR_DATA.items():
-                metadata[f"{path}/{name}"] = example
-
-        # --- Find missing metadata ---
-        for path, value in metadata.items():
-            obj = nxs.get(path)
-            if isinstance(obj, h5py.Group):
-                nx_class = obj.attrs.get('NX_class', b'none').decode()
-                isgood = '' if nx_class == value else f"!Should be {value}!"
-                logger.info(f"{path}: NX_class = {nx_class} {isgood}")
-            elif isinstance(obj, h5py.Dataset):
-                logger.info(f"{path} = {value}")
-            else:
-                missing.append(f"{path} = {value}")
-            if obj and path in attributes:
-                for attr, attr_value in attributes[path].items():
-                    if attr in obj.attrs:
-                        obj_attr = obj.attrs[attr]
-                        try:
-                            isgood = '' if obj_attr == attr_value else f"(Should be {attr_value})"
-                        except ValueError:
-                            isgood = f"(Should be {attr_value})"
-                        logger.info(f"  @{attr} = {obj_attr} {isgood}")
-                    else:
-                        logger.info(f"  @{attr} Missing, Should be {attr_value}")
-                        missing_attributes.append(f"{path}@{attr} = {attr_value}")
-
-    logger.info('\nMissing fields:')
-    logger.info('\n'.join(missing))
-    logger.info('\nMissing attributes:')
-    logger.info('\n'.join(missing_attributes))
-
-    score = 100 * len(missing) + len(missing_attributes)
-    return score, missing, missing_attributes
+    def check_file(self, file: str | h5py.File) -> CheckResult:
+        """Return CheckResult of the first profile, see check"""
+        return self.check(file)[0]
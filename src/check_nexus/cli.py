@@ -2,58 +2,534 @@
 Command line interface
 """
 
+import os
 import sys
-from . import check_metadata, validate_nexus, set_logging_level
+import contextlib
+from .check import set_logging_level
+
+# options that are followed by a value
+VALUE_OPTIONS = ('-j', '--workers', '--cache-file', '-o', '--output', '--format', '--ref', '--profile-output',
+                 '--interval', '--links', '--spec', '--prefetch', '--summary', '--query', '--missing', '--trend',
+                 '--visit', '--atol', '--rtol', '--top', '--max-depth', '--max-objects')
+
+
+def get_option(args: tuple[str, ...], *names: str, default: str | None = None) -> str | None:
+    """Return value of option given as '--name value' or '--name=value'"""
+    for n, arg in enumerate(args):
+        for name in names:
+            if arg == name and n + 1 < len(args):
+                return args[n + 1]
+            if arg.startswith(name + '='):
+                return arg[len(name) + 1:]
+    return default
+
+
+class OptionError(ValueError):
+    """Option value can't be used, reported by the command line entry points without a traceback"""
+
+
+def get_number(args: tuple[str, ...], *names: str, default: str, kind: type = int) -> int | float:
+    """
+    Return value of a numeric option, see get_option
+    :raises OptionError: if the value isn't a number of this kind
+    """
+    value = get_option(args, *names, default=default)
+    try:
+        return kind(value)
+    except ValueError:
+        raise OptionError(f"{'/'.join(names)} must be {'an integer' if kind is int else 'a number'}, not '{value}'")
+
+
+def get_all_options(args: tuple[str, ...], *names: str) -> list[str]:
+    """Return values of an option that can be given more than once"""
+    values = []
+    for n, arg in enumerate(args):
+        for name in names:
+            if arg == name and n + 1 < len(args):
+                values.append(args[n + 1])
+            elif arg.startswith(name + '='):
+                values.append(arg[len(name) + 1:])
+    return values
+
+
+def get_profiler_option(args: tuple[str, ...]):
+    """Return Profiler if --profile or --profile-output is in args, otherwise None"""
+    if '--profile' in args or get_option(args, '--profile-output'):
+        from .profiling import Profiler
+        return Profiler()
+    return None
+
+
+def write_profile(args: tuple[str, ...], profiler):
+    """Print profile report and write profile metrics to file, if requested"""
+    if profiler is None:
+        return
+    print('\nProfile:')
+    print(profiler.report())
+    filename = get_option(args, '--profile-output')
+    if filename:
+        profiler.write(filename)
+        print(f"Profile metrics written to {filename}")
+
+
+def get_paths(args: tuple[str, ...]) -> list[str]:
+    """Return arguments that aren't options or option values"""
+    return [
+        arg for n, arg in enumerate(args)
+        if arg == '-' or not arg.startswith('-') and (n == 0 or args[n - 1] not in VALUE_OPTIONS)
+    ]
+
+
+def print_help(runner):
+    """
+    Print description of the package and the usage of a command, from the docstring of its runner
+    help(check_nexus) would import every lazy export of the package, including punx and nexus2srs.
+    """
+    import textwrap
+    import check_nexus
+    print(f"check_nexus {check_nexus.__version__} ({check_nexus.__date__}): {check_nexus.__doc__.strip()}\n")
+    usage = textwrap.dedent(runner.__doc__).strip().split('\n', 1)[-1]  # without the 'argument runner' line
+    print(f"usage:\n{usage}")
 
 
 def run_check(*args):
-    """argument runner for check_nexus"""
+    """
+    argument runner for check_nexus
+        check_nexus 12345.nxs 12346.nxs     - check files
+        check_nexus /dls/i16/data/2024/mm12345-1/ -j 8  - check all files in directory using 8 workers
+        check_nexus '/dls/i16/data/2024/*/1234*.nxs'   - check files matching glob pattern
+        check_nexus @files.txt              - check files listed in text file
+        find . -name '*.nxs' | check_nexus -  - check files listed on stdin
+        check_nexus --watch /dls/i16/data/2024/mm12345-1/ -j 4 -o report.jsonl  - check new scans as they are written
+    options:
+        --info, --debug     - print full report for each file
+        -j N, --workers N   - number of worker processes
+        --cache             - only check files that have changed since the last cached run
+        --cache-file FILE   - use a cache database other than the default (~/.cache/check_nexus/results.sqlite)
+        --invalidate        - remove the given files or directories from the cache (or all if none given)
+        -o FILE, --output FILE  - write results to file, as JSON Lines (.jsonl), CSV (.csv) or JUnit XML (.xml)
+        --format FMT        - format of output file: 'text', 'jsonl', 'csv' or 'junit'
+        --failures          - only write findings that aren't OK to the output file
+        --profile           - print time spent in each phase of the checks
+        --profile-output FILE   - write profile metrics as JSON, or Prometheus text format if FILE ends .prom
+        --watch             - keep watching the directories, checking each new file once it has been written,
+                              results are cached and appended to the output file
+        --poll              - with --watch, poll the directories instead of using inotify (e.g. on GPFS or NFS)
+        --interval S        - with --watch, seconds between checks for new files, with --swmr between passes
+        --swmr              - check a single scan while it is being written, re-checking the structure as it grows
+                              and running the full check once the scan has finished
+        --links POLICY      - external links and virtual datasets: 'follow' (default) opens the external files,
+                              'verify' only checks the files exist, 'none' ignores them
+        --spec NAME|FILE    - check against a spec profile: built-in name ('diamond', default) or JSON/YAML file,
+                              repeat to check several profiles in a single pass over each file
+        --summary FILE      - add results to a summary store (.h5) of spec path x file, for fast queries
+        --query FILE        - query a summary store: count files missing each path, or with
+            --missing PATH      - list files missing PATH (or PATH@attribute), spec paths keep their leading '/',
+                                  NXdata paths found in the file are stored without it, e.g. entry/measurement/x
+            --trend PATH        - count files missing PATH in each visit
+            --visit NAME, --spec NAME, --wrong  - only files in a visit or of a spec, wrong rather than missing
+        --prefetch N        - without workers, read up to N files ahead in background threads (e.g. on GPFS or NFS)
+        --stream            - walk each file checking groups as they are found, with memory that doesn't grow with
+                              the number of objects, for files with huge NXdata groups or many detectors,
+                              results are only reported, not cached
+            --max-depth N, --max-objects N  - with --stream, don't enter groups below depth N, stop after N links
+        --daemon            - run a daemon with N warm workers, used by later check_nexus and validate_nexus calls
+        --daemon-stop       - stop the running daemon
+        --no-daemon         - check in this process, even if a daemon is running
+    """
+    from .batch import find_nexus_files, is_nexus_file, iter_check_batch, score_table
+    from .cache import ResultCache, spec_hash
+    from .results import TextEmitter, open_emitter, output_format, WRONG, MISSING, SEVERITIES
+    from .links import FOLLOW, LINK_POLICIES
+    from .profiles import load_profiles
+    from .prefetch import Throughput
+    from .stream import StreamLimits, MAX_DEPTH, MAX_OBJECTS
+
     tot = 0
-    if '--info' in args:
-        set_logging_level('info')
     if '--debug' in args:
         set_logging_level('debug')
+    if get_option(args, '--query'):
+        run_query(args)
+        return
+    workers = get_number(args, '-j', '--workers', default='1')
+    prefetch = get_number(args, '--prefetch', default='0')
+    cache_file = get_option(args, '--cache-file')
+    use_cache = '--cache' in args or cache_file is not None
+    output = get_option(args, '-o', '--output')
+    fmt = get_option(args, '--format')
+    severities = (WRONG, MISSING) if '--failures' in args else SEVERITIES
+    profiler = get_profiler_option(args)
+    link_policy = get_option(args, '--links', default=FOLLOW)
+    if link_policy not in LINK_POLICIES:
+        print(f"--links must be one of {', '.join(LINK_POLICIES)}")
+        return
+    if output:
+        try:
+            output_format(output, fmt, append='--watch' in args)
+        except ValueError as ex:
+            print(f"-o: {ex}")
+            return
+    limits = None
+    if '--stream' in args:
+        limits = StreamLimits(get_number(args, '--max-depth', default=str(MAX_DEPTH)),
+                              get_number(args, '--max-objects', default=str(MAX_OBJECTS)))
+        if use_cache:
+            print('--cache is ignored with --stream, streaming results are not cached')
+            use_cache = False
+    try:
+        profiles = load_profiles(*get_all_options(args, '--spec'))
+    except (OSError, ValueError, ImportError) as ex:
+        print(f"--spec: {ex}")
+        return
 
-    for n, arg in enumerate(args):
+    for arg in args:
         if arg == '-h' or arg.lower() == '--help' or arg == 'man':
             tot += 1
-            import check_nexus
-            help(check_nexus)
-        if arg.endswith('.nxs'):
-            tot += 1
-            check_metadata(arg)
+            print_help(run_check)
+    paths = get_paths(args)
+
+    if '--invalidate' in args:
+        targets = [path for path in paths if os.path.isdir(path) or is_nexus_file(path) and os.path.exists(path)]
+        for path in paths:
+            if not os.path.exists(path):
+                print(f"--invalidate: '{path}' doesn't exist, skipped")
+            elif path not in targets:
+                print(f"--invalidate: '{path}' isn't a NeXus file or directory, skipped")
+        if paths and not targets:
+            print('Nothing removed from the cache')  # with no paths at all, the whole cache is cleared
+            return
+        with ResultCache(cache_file) as cache:
+            removed = cache.invalidate(*targets)
+            print(f"Removed {removed} results from {cache.filename}")
+        return
+
+    if '--watch' in args:
+        run_watch(paths, args, workers, cache_file, output, fmt, severities, link_policy, profiles)
+        return
+
+    if '--swmr' in args:
+        run_incremental(paths, args, output, fmt, severities, link_policy, profiles)
+        return
+
+    if '--daemon' in args or '--daemon-stop' in args:
+        run_daemon_command(args, workers if get_option(args, '-j', '--workers') else None)
+        return
+
+    files = find_nexus_files(*paths)
+    if files:
+        tot += len(files)
+        results = []
+        throughput = Throughput()
+        client = None if '--no-daemon' in args or limits is not None else connect_daemon()
+        summary_file = get_option(args, '--summary')
+        with contextlib.ExitStack() as stack:
+            if summary_file:
+                from .summary import SummaryStore
+                store = stack.enter_context(SummaryStore(summary_file))
+            if client is not None:
+                checked = iter_check_daemon(client, files, get_all_options(args, '--spec'), profiles, link_policy,
+                                            use_cache, cache_file, profiler)
+            else:
+                cache = stack.enter_context(ResultCache(cache_file, spec_hash(link_policy))) if use_cache else None
+                checked = iter_check_batch(files, workers=workers, cache=cache, profiler=profiler,
+                                           link_policy=link_policy, profiles=profiles, prefetch=prefetch,
+                                           limits=limits)
+            emitters = [stack.enter_context(open_emitter(output, fmt, severities))] if output else []
+            if '--info' in args or '--debug' in args:
+                emitters.append(stack.enter_context(TextEmitter(sys.stdout)))
+            for result in checked:
+                for emitter in emitters:
+                    emitter.emit(result)
+                results.append(result.summary())
+                if summary_file:
+                    store.add(result)
+                if result.spec == profiles[0].name:
+                    throughput.add()
+        print(score_table(results))
+        print(throughput)
+        write_profile(args, profiler)
 
     if tot > 0:
         print('\nCompleted')
     else:
-        import check_nexus
-        help(check_nexus)
+        print_help(run_check)
+
+
+def run_query(args: tuple[str, ...]):
+    """Print result of a query of the summary store"""
+    try:
+        _print_query(args)
+        sys.stdout.flush()
+    except BrokenPipeError:
+        # the reader has gone, e.g. check_nexus --query store.h5 | head, stop without flushing to the closed pipe
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        sys.exit(1)
+
+
+def _print_query(args: tuple[str, ...]):
+    """Print result of a query of the summary store, see run_query"""
+    import time
+    from .summary import SummaryStore, summary_table
+    from .results import WRONG, MISSING
+
+    t0 = time.perf_counter()
+    store = SummaryStore(get_option(args, '--query'))
+    severity = WRONG if '--wrong' in args else MISSING
+    spec = get_option(args, '--spec')
+    visit = get_option(args, '--visit')
+    missing = get_option(args, '--missing')
+    trend = get_option(args, '--trend')
+    if missing:
+        files = store.files_with(missing, severity, spec, visit)
+        print('\n'.join(files))
+        print(f"\n{len(files)} of {int(store.select(spec, visit).sum())} files {severity}: {missing}")
+    elif trend:
+        print(summary_table(store.trend(trend, severity, spec), ('Visit', severity.capitalize(), 'Files')))
+    else:
+        print(summary_table(store.counts(severity, spec, visit), ('Key', 'Files')))
+        print(f"\n{int(store.select(spec, visit).sum())} files")
+    print(f"Query of {store} took {1000 * (time.perf_counter() - t0):.1f} ms")
+
+
+def connect_daemon():
+    """Return DaemonClient if a daemon is running, otherwise None"""
+    from .daemon import connect
+    return connect()
+
+
+def iter_check_daemon(client, files: list[str], specs: list[str], profiles: list, link_policy: str,
+                      use_cache: bool, cache_file: str | None, profiler=None):
+    """Check files in the daemon, checking any files left in this process if the daemon fails"""
+    from .daemon import DaemonError
+    from .batch import iter_check_batch
+    from .cache import ResultCache
+
+    done = set()
+    try:
+        for result in client.check(files, link_policy, specs, use_cache, cache_file, profiler is not None):
+            done.add((result.file, result.spec))
+            yield result
+        if profiler is not None and client.info.get('profile'):
+            profiler.merge(client.info['profile'])
+        return
+    except (OSError, EOFError, DaemonError) as ex:
+        print(f"Daemon failed ({ex}), checking remaining files in this process")
+    remaining = [file for file in files if any((file, profile.name) not in done for profile in profiles)]
+    with ResultCache(cache_file) if use_cache else contextlib.nullcontext() as cache:
+        for result in iter_check_batch(remaining, cache=cache, profiler=profiler, link_policy=link_policy,
+                                       profiles=profiles):
+            if (result.file, result.spec) not in done:
+                yield result
+
+
+def run_daemon_command(args: tuple[str, ...], workers: int | None):
+    """Start the daemon in the foreground, or stop the running daemon"""
+    from .daemon import run_daemon, connect
+
+    if '--daemon-stop' in args:
+        client = connect()
+        if client is None:
+            print('No daemon running')
+        else:
+            pid = client.info.get('pid')  # from connect
+            client.stop()
+            print(f"Stopped daemon (pid {pid})")
+        return
+    if '--debug' not in args:
+        set_logging_level('info')
+    try:
+        run_daemon(workers=workers)
+    except RuntimeError as ex:
+        print(ex)
+
+
+def run_watch(paths: list[str], args: tuple[str, ...], workers: int, cache_file: str | None,
+              output: str | None, fmt: str | None, severities: tuple[str, ...], link_policy: str,
+              profiles: list | None = None):
+    """Watch directories until interrupted, printing a line for each checked file and appending to output"""
+    from .watch import iter_watch
+    from .cache import ResultCache, spec_hash
+    from .results import TextEmitter, open_emitter
+
+    directories = [path for path in paths if os.path.isdir(path)]
+    if len(directories) != 1:
+        print('--watch requires a single directory')
+        return
+    interval = get_number(args, '--interval', default='1', kind=float)
+    with contextlib.ExitStack() as stack:
+        cache = stack.enter_context(ResultCache(cache_file, spec_hash(link_policy)))
+        emitters = [stack.enter_context(open_emitter(output, fmt, severities, append=True))] if output else []
+        if '--info' in args or '--debug' in args:
+            emitters.append(stack.enter_context(TextEmitter(sys.stdout)))
+        print(f"Watching {directories[0]}, press Ctrl+C to stop")
+        try:
+            for result in iter_watch(directories[0], workers=workers, cache=cache, interval=interval,
+                                     poll='--poll' in args, link_policy=link_policy, profiles=profiles):
+                for emitter in emitters:
+                    emitter.emit(result)
+                    emitter.stream.flush()
+                status = f"ERROR {result.error}" if result.error else f"score {result.score}"
+                spec = f" [{result.spec}]" if profiles and len(profiles) > 1 else ''
+                print(f"{result.file}{spec}: {status}", flush=True)
+        except KeyboardInterrupt:
+            print('\nStopped watching')
+
+
+def run_incremental(paths: list[str], args: tuple[str, ...], output: str | None, fmt: str | None,
+                    severities: tuple[str, ...], link_policy: str, profiles: list | None = None):
+    """Check a scan as it is written, printing new failures after each pass and writing the full check to output"""
+    from .incremental import iter_incremental
+    from .batch import is_nexus_file
+    from .results import TextEmitter, open_emitter, OK
+
+    files = [path for path in paths if is_nexus_file(path)]
+    if len(files) != 1:
+        print('--swmr requires a single NeXus file')
+        return
+    interval = get_number(args, '--interval', default='10', kind=float)
+    failures = set()  # (spec, path, attribute, kind) of findings reported
+    print(f"Checking {files[0]} until the scan finishes, press Ctrl+C to stop")
+    try:
+        for check in iter_incremental(files[0], profiles, link_policy, interval):
+            stage = 'full check' if check.complete else f"{check.n_rechecked} paths checked"
+            for result in check.results:
+                spec = f" [{result.spec}]" if profiles and len(profiles) > 1 else ''
+                print(f"pass {check.n_passes}{spec}, {stage}: score {result.score}", flush=True)
+                for f in result.findings:
+                    key = (result.spec, f.path, f.attribute, f.kind)
+                    if f.severity != OK and key not in failures:
+                        failures.add(key)
+                        print(f"  {f.severity}: {f.path}{'@' + f.attribute if f.attribute else ''} {f.kind}")
+    except KeyboardInterrupt:
+        print('\nStopped checking')
+        return
+    with contextlib.ExitStack() as stack:
+        emitters = [stack.enter_context(open_emitter(output, fmt, severities))] if output else []
+        if '--info' in args or '--debug' in args:
+            emitters.append(stack.enter_context(TextEmitter(sys.stdout)))
+        for result in check.results:
+            for emitter in emitters:
+                emitter.emit(result)
 
 
 def cli_check_nexus():
     """command line argument"""
-    run_check(*sys.argv)
+    try:
+        run_check(*sys.argv)
+    except OptionError as ex:
+        print(ex)
 
 
 def run_validate(*args):
-    """argument runner for validator"""
+    """
+    argument runner for validator
+        validate_nexus 12345.nxs 12346.nxs      - validate files
+        validate_nexus /dls/i16/data/2024/mm12345-1/ -j 8  - validate all files in directory using 8 warm workers
+    options:
+        -j N, --workers N   - number of worker processes, each loads the NXDL definitions once
+        --ref NAME          - NXDL file set to validate against, e.g. 'main'
+        --profile           - print time spent in each phase of validation
+        --profile-output FILE   - write profile metrics as JSON, or Prometheus text format if FILE ends .prom
+        --no-daemon         - validate in this process, even if a check_nexus daemon is running
+    """
+    from .batch import find_nexus_files
+
     tot = 0
-    for n, arg in enumerate(args):
+    workers = get_number(args, '-j', '--workers', default='1')
+    ref = get_option(args, '--ref')
+    profiler = get_profiler_option(args)
+
+    for arg in args:
         if arg == '-h' or arg.lower() == '--help' or arg == 'man':
             tot += 1
-            import check_nexus
-            help(check_nexus)
-        if arg.endswith('.nxs'):
-            tot += 1
-            validate_nexus(arg)
+            print_help(run_validate)
+    paths = get_paths(args)
+
+    files = find_nexus_files(*paths)
+    if files:
+        tot += len(files)
+        client = None if '--no-daemon' in args else connect_daemon()
+        if client is not None:
+            for file, report, average, summary in client.validate(files, ref, profiler is not None):
+                print(report)
+            if profiler is not None and client.info.get('profile'):
+                profiler.merge(client.info['profile'])
+        else:
+            from .validate import validate_nexus
+            validate_nexus(files, workers=workers, ref=ref, profiler=profiler)
+        write_profile(args, profiler)
 
     if tot > 0:
         print('\nCompleted')
     else:
-        import check_nexus
-        help(check_nexus)
+        print_help(run_validate)
 
 
 def cli_validate_nexus():
     """command line argument"""
-    run_validate(*sys.argv)
+    try:
+        run_validate(*sys.argv)
+    except OptionError as ex:
+        print(ex)
+
+
+def run_compare(*args):
+    """
+    argument runner for compare_dat, comparing original SRS .dat files to the nexus2srs conversion of each .nxs file
+        compare_dat 12345.dat                       - compare a single file, printing the full report
+        compare_dat /dls/i16/data/2024/mm12345-1/ -j 8  - compare every pair of files in directory using 8 workers
+    .dat and .nxs files are paired by scan number, e.g. 12345.dat with 12345.nxs or i16-12345.nxs
+    options:
+        --info              - print full report for each pair
+        -j N, --workers N   - number of worker processes
+        --atol X, --rtol X  - absolute and relative tolerance of scannables and numeric metadata (default 0.1, 0)
+        --top N             - number of the most frequent differences and largest deviations reported (default 20)
+        --write-dat         - also write each converted file, as 12345.nexus2srs.dat
+        -o FILE, --output FILE  - write the result of each pair to file as JSON Lines
+        --profile           - print time spent converting, reading and comparing
+        --profile-output FILE   - write profile metrics as JSON, or Prometheus text format if FILE ends .prom
+    """
+    import json
+    from .dat_file_comparison import pair_dat_files, iter_compare_dat, ComparisonSummary, set_conversion_logging_level
+
+    if '--debug' in args:
+        set_logging_level('debug')
+    set_conversion_logging_level('warning' if '--info' in args or '--debug' in args else 'error')
+    workers = get_number(args, '-j', '--workers', default='1')
+    atol = get_number(args, '--atol', default='0.1', kind=float)
+    rtol = get_number(args, '--rtol', default='0', kind=float)
+    top = get_number(args, '--top', default='20')
+    output = get_option(args, '-o', '--output')
+    verbose = '--info' in args or '--debug' in args
+    profiler = get_profiler_option(args)
+
+    pairs, unpaired = pair_dat_files(*get_paths(args))
+    if not pairs and not unpaired or '-h' in args or '--help' in args:
+        print(run_compare.__doc__)
+        return
+    for file in unpaired:
+        print(f"No NeXus file for {file}")
+    verbose = verbose or len(pairs) == 1
+
+    summary = ComparisonSummary(top)
+    with open(output, 'w') if output else contextlib.nullcontext() as out:
+        for comparison in iter_compare_dat(pairs, workers, atol, rtol, write_dat='--write-dat' in args,
+                                           profiler=profiler):
+            summary.add(comparison)
+            if out is not None:
+                out.write(json.dumps(comparison.to_dict(), default=str) + '\n')
+            if verbose:
+                print(f"\n---{comparison.dat_file} : {comparison.nexus_file}---")
+                print(comparison.error or comparison.report())
+    print(f"\n{summary.report()}")
+    if output:
+        print(f"Results written to {output}")
+    write_profile(args, profiler)
+
+
+def cli_compare_dat():
+    """command line argument"""
+    try:
+        run_compare(*sys.argv)
+    except OptionError as ex:
+        print(ex)
@@ -0,0 +1,220 @@
+"""
+Shape and value consistency checks
+
+Checks that need more than the existence of a path, using dataset metadata and small samples of data:
+    - the leading dimensions of every NXdata signal and axis match /entry/diamond_scan/scan_shape
+    - detector data isn't all zero or NaN
+
+Detector data can be tens of GB, so only a few stored chunks are read, each into the same preallocated
+buffer using read_direct. Memory use is bounded by MAX_SAMPLE_BYTES, whatever the size of the dataset.
+Each thread has its own buffer, so checks can run in several threads at once.
+"""
+
+import math
+import threading
+
+import h5py
+import numpy as np
+
+from .links import ExternalLinks, FOLLOW
+from .results import Finding, OK, WRONG
+from .profiling import get_profiler
+
+N_SAMPLES = 3  # number of chunks of detector data read
+MAX_SAMPLE_BYTES = 8 * 2 ** 20  # maximum size of each read, larger chunks are only partly read
+
+
+class SampleBuffer:
+    """
+    Reusable buffer for reading samples of data
+    :param max_bytes: size of the buffer, reads are limited to this size
+    """
+
+    def __init__(self, max_bytes: int = MAX_SAMPLE_BYTES):
+        self.max_bytes = max_bytes
+        self.buffer = np.empty(0, dtype=np.uint8)
+
+    def __repr__(self):
+        return f"SampleBuffer(max_bytes={self.max_bytes}, allocated={self.buffer.nbytes})"
+
+    def fit(self, block: tuple[int, ...], itemsize: int) -> tuple[int, ...]:
+        """Return block shape reduced, starting from the first dimension, so it fits in the buffer"""
+        block = list(block)
+        for dim in range(len(block)):
+            nbytes = itemsize * math.prod(block)
+            if nbytes <= self.max_bytes:
+                break
+            block[dim] = max(1, block[dim] * self.max_bytes // nbytes)
+        return tuple(block)
+
+    def array(self, shape: tuple[int, ...], dtype: np.dtype) -> np.ndarray:
+        """Return array view of the buffer, growing the buffer if required"""
+        nbytes = dtype.itemsize * math.prod(shape)
+        if nbytes > self.buffer.nbytes:
+            self.buffer = np.empty(nbytes, dtype=np.uint8)
+        return self.buffer[:nbytes].view(dtype).reshape(shape)
+
+
+_LOCAL = threading.local()
+
+
+def thread_buffer() -> SampleBuffer:
+    """Return the SampleBuffer of the current thread"""
+    buffer = getattr(_LOCAL, 'buffer', None)
+    if buffer is None:
+        buffer = _LOCAL.buffer = SampleBuffer()
+    return buffer
+
+
+def sample_blocks(dataset: h5py.Dataset, n_samples: int = N_SAMPLES) -> list[tuple[int, ...]] | None:
+    """
+    Return the start of blocks to sample, evenly spaced through the data written
+    For chunked datasets these are the offsets of stored chunks, for other datasets the first index.
+    :param dataset: h5py.Dataset
+    :param n_samples: maximum number of blocks
+    :return: [start index, ], empty if no chunks are stored, None if the dataset is empty
+    """
+    if dataset.size == 0:
+        return None
+    if dataset.ndim == 0:
+        return [()]
+    if dataset.chunks is not None:
+        n_chunks = dataset.id.get_num_chunks()
+        positions = sorted({round(n) for n in np.linspace(0, n_chunks - 1, min(n_samples, n_chunks))})
+        return [dataset.id.get_chunk_info(n).chunk_offset for n in positions]
+    positions = sorted({round(n) for n in np.linspace(0, dataset.shape[0] - 1, n_samples)})
+    return [(n,) + (0,) * (dataset.ndim - 1) for n in positions]
+
+
+def sample_values(dataset: h5py.Dataset, buffer: SampleBuffer | None = None, n_samples: int = N_SAMPLES) -> str:
+    """
+    Read samples of numeric data, returning a description if the data isn't valid
+    :param dataset: numeric h5py.Dataset
+    :param buffer: SampleBuffer to read into, default is the buffer of the current thread
+    :param n_samples: maximum number of blocks to read
+    :return: '' if some sampled values are finite and non-zero, otherwise a description of the data
+    """
+    buffer = buffer or thread_buffer()
+    starts = sample_blocks(dataset, n_samples)
+    if starts is None:
+        return 'empty'
+    if not starts:
+        return 'no data written'
+    profiler = get_profiler()
+    chunk = dataset.chunks or (1,) + dataset.shape[1:]
+    block = buffer.fit(chunk, dataset.dtype.itemsize)
+    n_nan = n_zero = n_values = 0
+    for start in starts:
+        selection = tuple(slice(s, min(s + b, n)) for s, b, n in zip(start, block, dataset.shape))
+        values = buffer.array(tuple(sl.stop - sl.start for sl in selection), dataset.dtype)
+        dataset.read_direct(values, source_sel=selection or None)
+        profiler.count('chunks_sampled')
+        profiler.count('bytes_sampled', values.nbytes)
+        n_values += values.size
+        n_zero += values.size - np.count_nonzero(values)
+        if values.dtype.kind in 'fc':
+            n_nan += np.count_nonzero(np.isnan(values))
+            if np.count_nonzero(np.isfinite(values) & (values != 0)):
+                return ''
+        elif np.count_nonzero(values):
+            return ''
+    if n_zero == n_values:
+        return f"all zero in {len(starts)} sampled blocks"
+    if n_nan == n_values:
+        return f"all NaN in {len(starts)} sampled blocks"
+    return f"no finite non-zero values in {len(starts)} sampled blocks"
+
+
+def _get(nxs: h5py.File, path: str, links: ExternalLinks | None) -> h5py.Group | h5py.Dataset | None:
+    """Return object at path, only opening external files if allowed by the link policy"""
+    path = path.strip('/')
+    if links is not None and links.is_external(path):
+        if links.policy != FOLLOW or links.error(path):
+            return None
+        return links.open(path)
+    try:
+        return nxs.get(path)
+    except (KeyError, OSError):
+        return None
+
+
+def _decode(value) -> str:
+    return value.decode() if isinstance(value, bytes) else str(value)
+
+
+def check_scan_shape(nxs: h5py.File, nxdata_paths: list[str], links: ExternalLinks | None = None) -> list[Finding]:
+    """
+    Check the leading dimensions of the signal and axes of NXdata groups match the scan shape
+    Only dataset shapes are read, not data.
+    :param nxs: open h5py.File
+    :param nxdata_paths: paths of NXdata groups
+    :param links: ExternalLinks of the file, datasets in external files are only checked if followed
+    :return: [Finding, ]
+    """
+    findings = []
+    for path in nxdata_paths:
+        entry = path.strip('/').split('/')[0]
+        scan_shape = _get(nxs, f"{entry}/diamond_scan/scan_shape", links)
+        nxdata = _get(nxs, path, links)
+        if not isinstance(scan_shape, h5py.Dataset) or not isinstance(nxdata, h5py.Group):
+            continue
+        scan_shape = tuple(int(n) for n in np.atleast_1d(scan_shape[()]))
+        rank = len(scan_shape)
+        signal = nxdata.attrs.get('signal')
+        axes = nxdata.attrs.get('axes')
+        axes = [] if axes is None else [_decode(axis) for axis in np.atleast_1d(axes)]
+        names = [(_decode(signal), None)] if signal is not None else []
+        names += [(axis, dim) for dim, axis in enumerate(axes[:rank]) if axis != '.']
+        for name, dim in names:
+            dataset = _get(nxs, f"{path}/{name}", links)
+            if not isinstance(dataset, h5py.Dataset):
+                continue
+            shape = dataset.shape or ()
+            if dim is None:
+                matches = shape[:rank] == scan_shape
+            else:  # axis of one dimension, or of the whole scan
+                matches = shape == (scan_shape[dim],) or shape[:rank] == scan_shape
+            expected = f"scan_shape {scan_shape}" if dim is None else f"scan_shape[{dim}] = {scan_shape[dim]}"
+            findings.append(Finding(f"{path}/{name}", '', 'shape', expected, shape, OK if matches else WRONG))
+    return findings
+
+
+def check_detector_data(nxs: h5py.File, detector_paths: list[str], links: ExternalLinks | None = None,
+                        buffer: SampleBuffer | None = None) -> list[Finding]:
+    """
+    Check detector data isn't all zero or NaN, reading a few chunks
+    :param nxs: open h5py.File
+    :param detector_paths: paths of NXdetector groups
+    :param links: ExternalLinks of the file, data in external files is only checked if followed
+    :param buffer: SampleBuffer to read into, default is the buffer of the current thread
+    :return: [Finding, ]
+    """
+    buffer = buffer or thread_buffer()
+    findings = []
+    for path in detector_paths:
+        data_path = f"{path.rstrip('/')}/data"
+        dataset = _get(nxs, data_path, links)
+        if not isinstance(dataset, h5py.Dataset) or dataset.dtype.kind not in 'biufc':
+            continue
+        error = sample_values(dataset, buffer)
+        findings.append(Finding(data_path, '', 'values', 'finite, non-zero values', error or 'ok',
+                                WRONG if error else OK))
+    return findings
+
+
+def check_consistency(nxs: h5py.File, metadata: dict, results: dict, links: ExternalLinks | None = None) -> list[Finding]:
+    """
+    Run shape and value consistency checks on the NXdata and NXdetector groups of the spec
+    :param nxs: open h5py.File
+    :param metadata: {path: expected value} spec of the file
+    :param results: {spec_path: (kind, nx_class, attrs)} from run_plan
+    :param links: ExternalLinks of the file
+    :return: [Finding, ]
+    """
+    with get_profiler().phase('consistency'):
+        groups = {
+            nx_class: list(dict.fromkeys(
+                path.strip('/') for path, value in metadata.items() if value == nx_class and results[path][0] == 'group'
+            )) for nx_class in ('NXdata', 'NXdetector')
+        }
+        return check_scan_shape(nxs, groups['NXdata'], links) + check_detector_data(nxs, groups['NXdetector'], links)
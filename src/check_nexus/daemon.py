@@ -0,0 +1,343 @@
+"""
+Long-running checker daemon, and the client used by check_nexus and validate_nexus
+
+Each check_nexus or validate_nexus call starts a new interpreter, imports h5py and punx and, for validation,
+loads the NXDL definitions, before the first file is read. Called from GDA after every scan, this dominates.
+The daemon keeps a pool of warm worker processes, with their punx validators, compiled spec profiles and file
+layouts, and keeps the result cache open. Requests are handled concurrently, each in its own thread, sharing
+the worker pool.
+
+    check_nexus --daemon -j 8 &         # start the daemon
+    check_nexus 12345.nxs               # sent to the daemon if it is running, otherwise checked in-process
+    check_nexus --daemon-stop
+
+The daemon listens on a Unix socket, by default ~/.cache/check_nexus/daemon.sock or the path in the environment
+variable CHECK_NEXUS_DAEMON, only accessible by the user that started it. Results are sent back as pickles, so
+there is no TCP option: a localhost port can be reached by every user on the machine.
+
+Each request is a single message, answered by a stream of messages, every message a length-prefixed pickle:
+    ('result', value)   - CheckResult, or validation report tuple, in file order
+    ('done', info)      - end of the response, info is a dict
+    ('error', message)  - the request failed
+"""
+
+import os
+import sys
+import pickle
+import signal
+import socket
+import struct
+import typing
+import logging
+import threading
+import socketserver
+
+logger = logging.getLogger(__name__)
+
+DAEMON_ENV = 'CHECK_NEXUS_DAEMON'
+DEFAULT_ADDRESS = os.path.join(os.path.expanduser('~'), '.cache', 'check_nexus', 'daemon.sock')
+CONNECT_TIMEOUT = 1.0  # s to wait for the daemon to accept a connection
+_HEADER = struct.Struct('!Q')
+
+
+class DaemonError(Exception):
+    """Error reported by the daemon"""
+
+
+def default_address() -> str:
+    """Return daemon socket path, from environment variable CHECK_NEXUS_DAEMON if set"""
+    return os.environ.get(DAEMON_ENV, DEFAULT_ADDRESS)
+
+
+def _write(stream: typing.BinaryIO, obj):
+    data = pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL)
+    stream.write(_HEADER.pack(len(data)) + data)
+    stream.flush()
+
+
+def _read(stream: typing.BinaryIO):
+    header = stream.read(_HEADER.size)
+    if len(header) < _HEADER.size:
+        raise EOFError('connection closed')
+    size, = _HEADER.unpack(header)
+    data = stream.read(size)
+    if len(data) < size:
+        raise EOFError('connection closed')
+    return pickle.loads(data)
+
+
+class DaemonClient:
+    """
+    Send requests to a running daemon, one connection per request
+    :param address: socket path, default from default_address()
+    :param timeout: s to wait for the daemon to accept a connection
+    """
+
+    def __init__(self, address: str | None = None, timeout: float = CONNECT_TIMEOUT):
+        self.address = address or default_address()
+        self.timeout = timeout
+        self.info = {}  # info from the 'done' message of the last request
+
+    def __repr__(self):
+        return f"DaemonClient('{self.address}')"
+
+    def request(self, request: dict) -> typing.Iterator:
+        """
+        Send request and yield each result as it arrives
+        :param request: {'command': name, **options}
+        :return: generator of results, the final info is stored in self.info
+        :raises OSError: if the daemon isn't running or the connection fails
+        :raises DaemonError: if the daemon reports an error
+        """
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(self.timeout)
+            sock.connect(self.address)
+            sock.settimeout(None)  # checks may take a long time
+            with sock.makefile('rwb') as stream:
+                _write(stream, request)
+                while True:
+                    kind, value = _read(stream)
+                    if kind == 'result':
+                        yield value
+                    elif kind == 'done':
+                        self.info = value
+                        return
+                    else:
+                        raise DaemonError(value)
+
+    def ping(self) -> dict:
+        """Return status of the daemon: pid, workers and number of requests"""
+        for _ in self.request({'command': 'ping'}):
+            pass
+        return self.info
+
+    def stop(self):
+        """Stop the daemon, after requests in progress have finished"""
+        for _ in self.request({'command': 'stop'}):
+            pass
+
+    def check(self, files: list[str], link_policy: str = 'follow', specs: list[str] = (), use_cache: bool = False,
+              cache_file: str | None = None, profile: bool = False) -> typing.Iterator:
+        """
+        Check files in the daemon, as batch.iter_check_batch
+        :param files: list of NeXus filenames
+        :param link_policy: 'follow', 'verify' or 'none', see links.py
+        :param specs: spec profile names or files, see profiles.load_profiles
+        :param use_cache: if True, use the result cache
+        :param cache_file: result cache filename, None for the default
+        :param profile: if True, profile metrics are returned in self.info['profile']
+        :return: generator of CheckResult
+        """
+        names = {os.path.abspath(file): file for file in files}  # the daemon has a different working directory
+        request = {
+            'command': 'check',
+            'files': list(names),
+            'link_policy': link_policy,
+            'specs': [os.path.abspath(spec) if os.path.isfile(spec) else spec for spec in specs],
+            'use_cache': use_cache,
+            'cache_file': os.path.abspath(cache_file) if cache_file else None,
+            'profile': profile,
+        }
+        for result in self.request(request):
+            result.file = names.get(result.file, result.file)
+            yield result
+
+    def validate(self, files: list[str], ref: str | None = None, profile: bool = False) -> typing.Iterator:
+        """
+        Validate files in the daemon, as validate.iter_validate
+        :param files: list of NeXus filenames
+        :param ref: NXDL file set name, None for the punx default
+        :param profile: if True, profile metrics are returned in self.info['profile']
+        :return: generator of (file, str report, average finding score, {status: count})
+        """
+        names = {os.path.abspath(file): file for file in files}
+        request = {'command': 'validate', 'files': list(names), 'ref': ref, 'profile': profile}
+        for file, report, average, summary in self.request(request):
+            yield names.get(file, file), report, average, summary
+
+
+def connect(address: str | None = None) -> DaemonClient | None:
+    """Return client of the running daemon, or None if no daemon is running"""
+    client = DaemonClient(address)
+    if not os.path.exists(client.address):
+        return None
+    try:
+        client.ping()
+    except (OSError, EOFError, DaemonError):
+        return None
+    return client
+
+
+class LockedCache:
+    """ResultCache shared by the request threads, used as the cache of batch.iter_check_batch"""
+
+    def __init__(self, cache):
+        self.cache = cache
+        self.lock = threading.Lock()
+
+    def get(self, file: str, spec: str | None = None):
+        with self.lock:
+            return self.cache.get(file, spec)
+
+    def put(self, result, spec: str | None = None):
+        with self.lock:
+            self.cache.put(result, spec)
+
+    def commit(self):
+        with self.lock:
+            self.cache.commit()
+
+    def close(self):
+        with self.lock:
+            self.cache.close()
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        try:
+            request = _read(self.rfile)
+        except (EOFError, pickle.UnpicklingError):
+            return
+        self.server.checker.handle(request, lambda message: _write(self.wfile, message))
+
+
+class _Server(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+    checker: 'CheckDaemon'
+
+
+class CheckDaemon:
+    """
+    Checker daemon, serving requests from DaemonClient on a Unix socket
+
+        CheckDaemon(workers=8).serve_forever()
+
+    :param address: socket path, default from default_address()
+    :param workers: number of worker processes, default is the number of CPUs
+    """
+
+    def __init__(self, address: str | None = None, workers: int | None = None):
+        self.address = address or default_address()
+        self.workers = max(1, workers or os.cpu_count() or 1)
+        self.n_requests = 0
+        self.lock = threading.Lock()
+        self.caches = {}  # {filename: LockedCache}
+        self.server = None
+        self.executor = self._start_workers()
+
+    def __repr__(self):
+        return f"CheckDaemon('{self.address}', workers={self.workers})"
+
+    def _start_workers(self):
+        from concurrent.futures import ProcessPoolExecutor
+        from .watch import _init_worker
+        level = logging.getLogger('check_nexus.check').level
+        return ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker, initargs=(level,))
+
+    def get_cache(self, filename: str | None) -> LockedCache:
+        """Return open result cache, opening each cache file once"""
+        from .cache import ResultCache, default_cache_file
+        filename = filename or default_cache_file()
+        with self.lock:
+            if filename not in self.caches:
+                self.caches[filename] = LockedCache(ResultCache(filename))
+            return self.caches[filename]
+
+    def handle(self, request: dict, send: typing.Callable[[tuple], None]):
+        """Run request, sending each result and a final 'done' or 'error' message"""
+        from concurrent.futures.process import BrokenProcessPool
+        command = request.get('command')
+        with self.lock:
+            self.n_requests += 1
+        try:
+            if command == 'ping':
+                send(('done', {'pid': os.getpid(), 'workers': self.workers, 'requests': self.n_requests}))
+            elif command == 'check':
+                send(('done', self.check(request, send)))
+            elif command == 'validate':
+                send(('done', self.validate(request, send)))
+            elif command == 'stop':
+                send(('done', {}))
+                threading.Thread(target=self.server.shutdown).start()
+            else:
+                send(('error', f"Unknown command '{command}'"))
+        except (BrokenPipeError, ConnectionResetError):
+            logger.info(f"Client disconnected during '{command}'")
+        except BrokenProcessPool as ex:
+            logger.error(f"Worker process failed, restarting workers: {ex}")
+            with self.lock:
+                self.executor = self._start_workers()
+            send(('error', f"worker process failed: {ex}"))
+        except Exception as ex:
+            logger.exception(f"'{command}' failed")
+            send(('error', f"{type(ex).__name__}: {ex}"))
+
+    def check(self, request: dict, send: typing.Callable[[tuple], None]) -> dict:
+        """Run check request, see DaemonClient.check"""
+        from .batch import iter_check_batch
+        from .profiles import load_profiles
+        from .profiling import Profiler
+        profiles = load_profiles(*request['specs'])
+        cache = self.get_cache(request['cache_file']) if request['use_cache'] else None
+        profiler = Profiler() if request['profile'] else None
+        for result in iter_check_batch(request['files'], self.workers, cache, profiler, request['link_policy'],
+                                       profiles, executor=self.executor):
+            send(('result', result))
+        if cache is not None:
+            cache.commit()
+        return {'profile': profiler.as_dict() if profiler else None}
+
+    def validate(self, request: dict, send: typing.Callable[[tuple], None]) -> dict:
+        """Run validate request, see DaemonClient.validate"""
+        from .validate import iter_validate
+        from .profiling import Profiler
+        profiler = Profiler() if request['profile'] else None
+        for result in iter_validate(request['files'], self.workers, request['ref'], profiler, self.executor):
+            send(('result', result))
+        return {'profile': profiler.as_dict() if profiler else None}
+
+    def start(self):
+        """Listen on the socket, removing the socket file of a daemon that didn't shut down"""
+        if connect(self.address) is not None:
+            raise RuntimeError(f"A daemon is already running on {self.address}")
+        if os.path.exists(self.address):
+            os.unlink(self.address)
+        os.makedirs(os.path.dirname(os.path.abspath(self.address)), exist_ok=True)
+        umask = os.umask(0o077)  # socket only accessible by this user
+        try:
+            self.server = _Server(self.address, _Handler)
+        finally:
+            os.umask(umask)
+        self.server.checker = self
+
+    def serve_forever(self):
+        """Serve requests until stopped by DaemonClient.stop, SIGTERM or Ctrl+C"""
+        self.start()
+        signal.signal(signal.SIGTERM, lambda signum, frame: threading.Thread(target=self.server.shutdown).start())
+        logger.info(f"{self} listening")
+        try:
+            self.server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.close()
+
+    def close(self):
+        """Stop listening, shut down the workers and close the caches"""
+        if self.server is not None:
+            self.server.server_close()
+            if os.path.exists(self.address):
+                os.unlink(self.address)
+            self.server = None
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        for cache in self.caches.values():
+            cache.close()
+        self.caches.clear()
+
+
+def run_daemon(address: str | None = None, workers: int | None = None):
+    """Run daemon in the foreground, until stopped"""
+    daemon = CheckDaemon(address, workers)
+    print(f"check_nexus daemon (pid {os.getpid()}) listening on {daemon.address} with {daemon.workers} workers",
+          file=sys.stderr, flush=True)
+    daemon.serve_forever()
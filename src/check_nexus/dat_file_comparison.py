@@ -1,10 +1,43 @@
 """
 Use nexus2srs and compare dat files
+
+A single file is compared with convert_and_compare_dat. To compare a whole visit, pair the .dat and .nxs files
+and compare each pair in a process pool, collecting the results in a ComparisonSummary:
+
+    pairs, unpaired = pair_dat_files('/dls/i16/data/2024/mm12345-1/')
+    summary = ComparisonSummary()
+    for comparison in iter_compare_dat(pairs, workers=8):
+        summary.add(comparison)
+    print(summary.report())
 """
 
+import io
 import os
+import re
+import ast
+import time
+import heapq
+import typing
+import logging
+import warnings
+import contextlib
+import collections
+from concurrent.futures import ProcessPoolExecutor
+
 import numpy as np
-import nexus2srs
+import hdfmap
+from nexus2srs.nexus2srs import generate_datafile
+
+from .profiling import Profiler, get_profiler, profiling
+
+logger = logging.getLogger(__name__)
+
+BOOLEAN_VALUES = {'true': '1', 'false': '0', 'True': '1', 'False': '0'}
+DAT_EXTENSION = '.dat'
+NEXUS_EXTENSION = '.nxs'
+CONVERTED_SUFFIX = '.nexus2srs.dat'  # written by convert_and_compare_dat(write_dat=True), not an original
+CONVERSION_LOGGERS = ('hdfmap', 'nexus2srs')
+SCAN_NUMBER = re.compile(r'(\d+)$')  # '1070249.dat', 'i16-1070249.nxs'
 
 
 class Dict2Obj(dict):
@@ -18,9 +51,87 @@ class Dict2Obj(dict):
             self.update({name: dictvals[name]})
 
 
+def parse_value(value: str):
+    """
+    Convert metadata value from dat file to python object, without using eval
+        '1.5' -> 1.5, "'scan x 1 10 1'" -> 'scan x 1 10 1', '[1, 2]' -> [1, 2], 'Array(...)' -> 'Array(...)'
+    """
+    try:
+        return float(value) if '.' in value or 'e' in value.lower() else int(value)
+    except ValueError:
+        pass
+    try:
+        return ast.literal_eval(value)
+    except (ValueError, TypeError, SyntaxError, MemoryError, RecursionError):
+        return value
+
+
+def parse_metadata_line(line: str) -> dict:
+    """Return {name: value} from line of metadata in dat file header"""
+    line = line.strip(' ,\n')
+    neq = line.count('=')
+    if neq == 1:
+        # e.g. cmd = "scan x 1 10 1"
+        inlines = [line]
+    elif neq > 1 and '{' not in line:
+        # e.g. SRSRUN=571664,SRSDAT=201624,SRSTIM=183757
+        # but not ubMeta={"name": "crystal=big", ...}
+        inlines = line.split(',')
+    else:
+        # e.g. <MetaDataAtStart>
+        return {}
+
+    meta = {}
+    for inln in inlines:
+        vals = inln.split('=')
+        if len(vals) != 2:
+            continue
+        meta[vals[0]] = parse_value(vals[1])
+    return meta
+
+
+def parse_data_block(text: str, ncolumns: int) -> np.ndarray:
+    """
+    Parse whitespace separated table of numbers into 2D array
+    Values of 'true' and 'false' are read as 1 and 0, other non-numeric values are read as nan.
+    :param text: str block of lines of numbers
+    :param ncolumns: number of columns
+    :return: array with shape (rows, ncolumns)
+    """
+    for old, new in BOOLEAN_VALUES.items():
+        if old in text:
+            text = text.replace(old, new)
+    text = text.strip()
+    nrows = text.count('\n') + 1 if text else 0
+
+    # Fast path - parse whole block at once in C, if every line has ncolumns values
+    if all(len(ln.split()) == ncolumns for ln in text.split('\n')):
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', DeprecationWarning)
+            try:
+                values = np.fromstring(text, dtype=float, sep=' ')
+            except ValueError:
+                values = np.empty(0)
+        if values.size == nrows * ncolumns:
+            return values.reshape(nrows, ncolumns)
+
+    # Slow path - irregular lines or non-numeric values, fill preallocated array line by line
+    lines = [ln for ln in text.splitlines() if ln.strip()]
+    data = np.full((len(lines), ncolumns), np.nan)
+    for row, ln in enumerate(lines):
+        for col, val in enumerate(ln.split()[:ncolumns]):
+            try:
+                data[row, col] = float(val)
+            except ValueError:
+                pass
+    return data
+
+
 def read_dat_file(filename):
     """
     Reads #####.dat files from instrument, returns class instance containing all data
+    The header is read line by line, metadata values are converted using ast.literal_eval and
+    the table of scanned values is parsed in bulk. Values of 'true' and 'false' are read as 1 and 0.
     Input:
       filename = string filename of data file
     Output:
@@ -31,48 +142,25 @@ def read_dat_file(filename):
          d.items() - returns parameter (name,value) tuples
     """
     with open(filename, 'r') as f:
-        lines = f.readlines()
+        return read_dat_stream(f)
 
+
+def read_dat_stream(stream: typing.TextIO) -> Dict2Obj:
+    """
+    Reads SRS .dat format from a text stream, e.g. an open file or io.StringIO
+    See read_dat_file
+    """
     # Read metadata
     meta = {}
-    lineno = 0
-    for ln in lines:
-        lineno += 1
-        if '&END' in ln: break
-        ln = ln.strip(' ,\n')
-        neq = ln.count('=')
-        if neq == 1:
-            'e.g. cmd = "scan x 1 10 1"'
-            inlines = [ln]
-        elif neq > 1 and '{' not in ln:
-            'e.g. SRSRUN=571664,SRSDAT=201624,SRSTIM=183757'
-            ' but not ubMeta={"name": "crystal=big", ...}'
-            inlines = ln.split(',')
-        else:
-            'e.g. <MetaDataAtStart>'
-            continue
-
-        for inln in inlines:
-            vals = inln.split('=')
-            if len(vals) != 2: continue
-            try:
-                meta[vals[0]] = eval(vals[1])
-            except:
-                meta[vals[0]] = vals[1]
+    for ln in stream:
+        if '&END' in ln:
+            break
+        meta.update(parse_metadata_line(ln))
 
     # Read Main data
     # previous loop ended at &END, now starting on list of names
-    names = lines[lineno].split()
-
-    # Load 2D arrays of scanned values
-    # vals = np.loadtxt(lines[lineno+1:],ndmin=2)
-    try:
-        vals = np.genfromtxt(lines[lineno + 1:],
-                             ndmin=2)  # changed 31/10/24 to handle 'true'/'false' in file (returns nan)
-    except TypeError:  # numpy < 1.2
-        vals = np.genfromtxt(lines[lineno + 1:])
-        if np.ndim(vals) < 2:  # single point scans
-            vals = np.reshape(vals, (1, -1))
+    names = stream.readline().split()
+    vals = parse_data_block(stream.read(), len(names))
 
     # Assign arrays to a dictionary
     main = {
@@ -85,91 +173,494 @@ def read_dat_file(filename):
     return obj
 
 
-def compare_dat_objects(old_dat_obj: Dict2Obj, new_dat_obj: Dict2Obj):
+def nexus2srs_string(nexus_file: str) -> str:
     """
-    Compare data objects
-    :param old_dat_obj:
-    :param new_dat_obj:
-    :return:
+    Convert NeXus file to SRS .dat format using nexus2srs, returning the file contents without writing to disk
+    :param nexus_file: '123456.nxs'
+    :return: str contents of .dat file
+    """
+    nxs_map = hdfmap.create_nexus_map(nexus_file)
+    with hdfmap.load_hdf(nexus_file) as hdf:
+        outstr, detector_image_paths = generate_datafile(hdf, nxs_map)
+    return outstr
+
+
+def read_nexus2srs(nexus_file: str) -> Dict2Obj:
     """
+    Convert NeXus file using nexus2srs and parse the result in memory
+    :param nexus_file: '123456.nxs'
+    :return: Dict2Obj, as read_dat_file
+    """
+    return read_dat_stream(io.StringIO(nexus2srs_string(nexus_file)))
+
+
+class DatComparison:
+    """
+    Differences between an original and converted dat file, from compare_dat_objects
+        n_scannables, n_metadata, scan_length: (original, converted)
+        different_scannables: {name: norm of the differences} for shared scannables outside tolerance
+        max_deviation: {name: max absolute deviation} for shared scannables outside tolerance
+        different_metadata: {name: (original, converted)} for shared metadata outside tolerance
+        missing_scannables: {name: shape} in original but not converted
+        new_scannables: {name: shape} in converted but not original
+        missing_metadata: {name: value} in original but not converted
+        dat_file, nexus_file, duration, error: files compared by compare_pair, seconds taken and any error
+    """
+
+    def __init__(self, name: str = ''):
+        self.name = name
+        self.dat_file = ''
+        self.nexus_file = ''
+        self.error = ''
+        self.duration = 0.0
+        self.profile = None  # profile metrics, when compared in a worker with profiling
+        self.n_scannables = (0, 0)
+        self.n_metadata = (0, 0)
+        self.scan_length = (0, 0)
+        self.different_scannables = {}
+        self.max_deviation = {}
+        self.different_metadata = {}
+        self.missing_scannables = {}
+        self.new_scannables = {}
+        self.missing_metadata = {}
+
+    def __repr__(self):
+        if self.error:
+            return f"DatComparison('{self.name}', error='{self.error}')"
+        return (f"DatComparison('{self.name}', different_scannables={len(self.different_scannables)}, "
+                f"different_metadata={len(self.different_metadata)}, "
+                f"missing_scannables={len(self.missing_scannables)}, missing_metadata={len(self.missing_metadata)})")
 
+    @property
+    def matches(self) -> bool:
+        """True if the converted file contains everything in the original, within tolerance"""
+        return (
+            not self.error and self.scan_length[0] == self.scan_length[1] and not self.different_scannables and
+            not self.different_metadata and not self.missing_scannables and not self.missing_metadata
+        )
+
+    def report(self) -> str:
+        """Return human-readable report"""
+        out = [
+            f"{'':20}  Original  :  Converted",
+            f"{'Scannables':20} {self.n_scannables[0]:9}  :  {self.n_scannables[1]}",
+            f"{'Metadata':20} {self.n_metadata[0]:9}  :  {self.n_metadata[1]}",
+            f"{'Scan length':20} {self.scan_length[0]:9}  :  {self.scan_length[1]}",
+        ]
+        if self.scan_length[0] == self.scan_length[1]:
+            different_scannables = "\n  ".join(f"{name}: {diff}" for name, diff in self.different_scannables.items())
+            out.append(f"\n\nDifferent scan data:\n  {different_scannables}")
+        different_metadata = "\n  ".join(
+            f"{name} : {old}  : {new}" for name, (old, new) in self.different_metadata.items()
+        )
+        out.append(f"\nDifferent metadata:\n  {different_metadata}")
+        missing_scannables = "\n  ".join(f"{name}: {shape}" for name, shape in self.missing_scannables.items())
+        new_scannables = "\n  ".join(f"{name}: {shape}" for name, shape in self.new_scannables.items())
+        missing_metadata = "\n  ".join(f"{name}: {value}" for name, value in self.missing_metadata.items())
+        out.append(f"\n\nMissing scannables:\n  {missing_scannables}")
+        out.append(f"\nNew scannables:\n  {new_scannables}")
+        out.append(f"\nMissing metadata:\n  {missing_metadata}")
+        return '\n'.join(out)
+
+    def to_dict(self) -> dict:
+        """Return dict of the comparison, e.g. for a line of JSON"""
+        return {
+            'name': self.name,
+            'dat_file': self.dat_file,
+            'nexus_file': self.nexus_file,
+            'matches': self.matches,
+            'error': self.error,
+            'duration': self.duration,
+            'n_scannables': list(self.n_scannables),
+            'n_metadata': list(self.n_metadata),
+            'scan_length': list(self.scan_length),
+            'different_scannables': self.different_scannables,
+            'max_deviation': self.max_deviation,
+            'different_metadata': {name: [old, new] for name, (old, new) in self.different_metadata.items()},
+            'missing_scannables': {name: list(shape) for name, shape in self.missing_scannables.items()},
+            'new_scannables': {name: list(shape) for name, shape in self.new_scannables.items()},
+            'missing_metadata': self.missing_metadata,
+        }
+
+
+def _outside_tolerance(old: np.ndarray, new: np.ndarray, atol: np.ndarray, rtol: np.ndarray) -> np.ndarray:
+    """Return boolean array, True where old and new differ by more than atol + rtol * |new|, NaN == NaN"""
+    both_nan = np.isnan(old) & np.isnan(new)
+    with np.errstate(invalid='ignore'):
+        close = np.abs(old - new) <= atol + rtol * np.abs(new)
+    return ~(close | both_nan)
+
+
+def _tolerance_arrays(names: list[str], atol: float, rtol: float,
+                      tolerances: dict[str, tuple[float, float]]) -> tuple[np.ndarray, np.ndarray]:
+    """Return arrays of absolute and relative tolerance for each name"""
+    tol = np.array([tolerances.get(name, (atol, rtol)) for name in names], dtype=float).reshape(-1, 2)
+    return tol[:, 0], tol[:, 1]
+
+
+def _is_number(value) -> bool:
+    return isinstance(value, (int, float, np.number)) and not isinstance(value, bool)
+
+
+def compare_dat_objects(old_dat_obj: Dict2Obj, new_dat_obj: Dict2Obj, atol: float = 0.1, rtol: float = 0.0,
+                        tolerances: dict[str, tuple[float, float]] | None = None,
+                        name: str = '', verbose: bool = True) -> DatComparison:
+    """
+    Compare data objects
+    Shared scannables are compared in a single vectorised pass, a scannable is different if the norm of its
+    differences, sqrt(sum(diff**2)), is more than atol + rtol * norm(converted), so the default is the original
+    rule of a norm above 0.1. The tolerance applies to the norm of the whole column, not to each value as in
+    np.isclose. Values that are NaN on both sides are equal. Unlike the original rule, which let any NaN hide the
+    differences of its column, a value that is NaN on only one side makes the scannable different, and the norm
+    and maximum deviation are of the other values.
+    Numeric metadata is different if it differs by more than atol + rtol * |converted|, other metadata is compared
+    as strings.
+    :param old_dat_obj: original data, from read_dat_file
+    :param new_dat_obj: converted data, from read_dat_file
+    :param atol: default absolute tolerance, of the norm of each scannable and of each metadata value
+    :param rtol: default relative tolerance, of norm(converted) for scannables and |converted| for metadata
+    :param tolerances: {name: (atol, rtol)} tolerance for specific scannables or metadata, as atol and rtol, so
+        for scannables a tolerance of the norm of the column
+    :param name: name of comparison, e.g. the original filename
+    :param verbose: if True, print report
+    :return: DatComparison
+    """
+    tolerances = tolerances or {}
     old_metadata = old_dat_obj.metadata
     new_metadata = new_dat_obj.metadata
-    len_old_data = len(old_dat_obj[next(iter(old_dat_obj))])
-    len_new_data = len(new_dat_obj[next(iter(new_dat_obj))])
+    len_old_data = len(old_dat_obj[next(iter(old_dat_obj))]) if old_dat_obj else 0
+    len_new_data = len(new_dat_obj[next(iter(new_dat_obj))]) if new_dat_obj else 0
 
-    # Compare number of data
-    print(f"{'':20}  Original  :  Converted")
-    print(f"{'Scannables':20} {len(old_dat_obj):9}  :  {len(new_dat_obj)}")
-    print(f"{'Metadata':20} {len(old_metadata):9}  :  {len(new_metadata)}")
-    print(f"{'Scan length':20} {len_old_data:9}  :  {len_new_data}")
+    comparison = DatComparison(name)
+    comparison.n_scannables = (len(old_dat_obj), len(new_dat_obj))
+    comparison.n_metadata = (len(old_metadata), len(new_metadata))
+    comparison.scan_length = (len_old_data, len_new_data)
 
     # Check for differences in data
-    if len_old_data == len_new_data:
-        different_scannables = "\n ".join(
-            f"{name}: {diff}" for name, value in old_dat_obj.items()
-            if name in new_dat_obj and (
-                diff := np.sqrt(np.sum(np.square(np.subtract(value, new_dat_obj[name]))))
-            ) > 0.1
-        )
-        print(f"\n\nDifferent scan data:\n  {different_scannables}")
-
-    def compare_metadata(val1, val2):
-        """Return true if match"""
-        try:
-            _diff = val1 - val2
-            return np.sqrt(np.sum(np.square(np.subtract(val1, val2)))) < 0.1
-        except:
-            return str(val1) == str(val2)
-
-    different_metadata = "\n ".join(
-        f"{name} : {value}  : {new_metadata[name]}" for name, value in old_metadata.items()
-        if name in new_metadata and not compare_metadata(value, new_metadata[name])
+    shared = [name for name in old_dat_obj if name in new_dat_obj]
+    if shared and len_old_data == len_new_data:
+        old_array = np.stack([np.asarray(old_dat_obj[name], dtype=float) for name in shared], axis=1)
+        new_array = np.stack([np.asarray(new_dat_obj[name], dtype=float) for name in shared], axis=1)
+        column_atol, column_rtol = _tolerance_arrays(shared, atol, rtol, tolerances)
+        old_nan = np.isnan(old_array)
+        new_nan = np.isnan(new_array)
+        diff = np.abs(old_array - new_array)
+        diff[old_nan | new_nan] = 0  # NaN on both sides is equal, NaN on one side is counted below
+        norm = np.sqrt(np.sum(np.square(diff), axis=0))
+        new_norm = np.sqrt(np.nansum(np.square(new_array), axis=0))
+        different = (norm > column_atol + column_rtol * new_norm) | np.any(old_nan != new_nan, axis=0)
+        if different.any():
+            names = [name for name, isdiff in zip(shared, different) if isdiff]
+            comparison.different_scannables = dict(zip(names, norm[different].tolist()))
+            comparison.max_deviation = dict(zip(names, np.max(diff[:, different], axis=0).tolist()))
+
+    # Check for differences in metadata, numbers in bulk, everything else as strings
+    shared = [name for name in old_metadata if name in new_metadata]
+    numeric = [name for name in shared if _is_number(old_metadata[name]) and _is_number(new_metadata[name])]
+    if numeric:
+        old_values = np.array([old_metadata[name] for name in numeric], dtype=float)
+        new_values = np.array([new_metadata[name] for name in numeric], dtype=float)
+        meta_atol, meta_rtol = _tolerance_arrays(numeric, atol, rtol, tolerances)
+        different = _outside_tolerance(old_values, new_values, meta_atol, meta_rtol)
+        different_names = {name for name, isdiff in zip(numeric, different) if isdiff}
+    else:
+        different_names = set()
+    numeric = set(numeric)
+    different_names.update(
+        name for name in shared
+        if name not in numeric and str(old_metadata[name]) != str(new_metadata[name])
     )
-    print(f"\nDifferent metadata:\n  {different_metadata}")
+    comparison.different_metadata = {
+        name: (old_metadata[name], new_metadata[name]) for name in shared if name in different_names
+    }
 
     # List missing data
-    missing_scannables = "\n  ".join(
-        f"{name}: {np.shape(value)}"
-        for name, value in old_dat_obj.items() if name not in new_dat_obj
-    )
-    new_scannables = '\n  '.join(
-        f"{name}: {np.shape(value)}"
-        for name, value in new_dat_obj.items() if name not in old_dat_obj
-    )
-    mising_metadata = "\n  ".join(
-        f"{name}: {value}"
-        for name, value in old_metadata.items() if name not in new_metadata
-    )
-    print(f"\n\nMissing scannables:\n  {missing_scannables}")
-    print(f"\nNew scannables:\n  {new_scannables}")
-    print(f"\nMissing metadata:\n  {mising_metadata}")
+    comparison.missing_scannables = {
+        name: np.shape(value) for name, value in old_dat_obj.items() if name not in new_dat_obj
+    }
+    comparison.new_scannables = {
+        name: np.shape(value) for name, value in new_dat_obj.items() if name not in old_dat_obj
+    }
+    comparison.missing_metadata = {
+        name: value for name, value in old_metadata.items() if name not in new_metadata
+    }
+    if verbose:
+        print(comparison.report())
+    return comparison
+
+
+def nexus_filename(dat_file: str) -> str:
+    """Return NeXus file written with a dat file, '/dls/i16/data/123456.dat' -> '/dls/i16/data/123456.nxs'"""
+    return os.path.splitext(dat_file)[0] + NEXUS_EXTENSION
+
+
+def converted_filename(dat_file: str) -> str:
+    """Return filename of converted dat file, '123456.dat' -> '123456.nexus2srs.dat'"""
+    return os.path.splitext(dat_file)[0] + CONVERTED_SUFFIX
+
 
+def scan_number(filename: str) -> str | None:
+    """Return scan number at the end of the filename, '/data/i16-123456.nxs' -> '123456', or None"""
+    match = SCAN_NUMBER.search(os.path.splitext(os.path.basename(filename))[0])
+    return match.group(1) if match else None
 
-def convert_and_compare_dat(old_dat_file: str):
+
+def pair_dat_files(*paths: str) -> tuple[list[tuple[str, str]], list[str]]:
     """
-    Compare old dat file to one generated using nexus2srs
-    :param old_dat_file: '123456.dat'
-    :return:
+    Pair original .dat files with the .nxs file of the same scan, searching directories recursively
+    Files are paired by scan number, so '123456.dat' pairs with '123456.nxs' or 'i16-123456.nxs', preferring a
+    NeXus file in the same directory. Converted files ('*.nexus2srs.dat') are ignored.
+    :param paths: directories, or .dat and .nxs files
+    :return: [(dat_file, nexus_file), ], [dat files without a NeXus file]
     """
-    nexus_filename = old_dat_file.replace('.dat', '.nxs')
-    new_dat_filename = old_dat_file.replace('.dat', '.nexus2srs.dat')
+    dat_files, nexus_files = set(), set()
+    for path in paths:
+        if os.path.isdir(path):
+            for root, dirs, filenames in os.walk(path):
+                dat_files.update(os.path.join(root, name) for name in filenames if name.endswith(DAT_EXTENSION))
+                nexus_files.update(os.path.join(root, name) for name in filenames if name.endswith(NEXUS_EXTENSION))
+        elif path.endswith(DAT_EXTENSION):
+            dat_files.add(path)
+            if os.path.isfile(nexus_filename(path)):
+                nexus_files.add(nexus_filename(path))
+        elif path.endswith(NEXUS_EXTENSION):
+            nexus_files.add(path)
+    dat_files = sorted(file for file in dat_files if not file.endswith(CONVERTED_SUFFIX))
 
-    if os.path.isfile(new_dat_filename):
-        os.remove(new_dat_filename)
+    in_directory = {}  # {(directory, scan number): nexus file}
+    anywhere = collections.defaultdict(list)  # {scan number: [nexus file, ]}
+    for file in sorted(nexus_files):
+        number = scan_number(file)
+        if number is not None:
+            in_directory.setdefault((os.path.dirname(file), number), file)
+            anywhere[number].append(file)
+
+    pairs, unpaired = [], []
+    for file in dat_files:
+        number = scan_number(file)
+        nexus = in_directory.get((os.path.dirname(file), number))
+        if nexus is None and len(anywhere.get(number, ())) == 1:
+            nexus = anywhere[number][0]
+        if nexus is None:
+            unpaired.append(file)
+        else:
+            pairs.append((file, nexus))
+    return pairs, unpaired
+
+
+def _convert_and_compare(old_dat_file: str, nexus_file: str, atol: float = 0.1, rtol: float = 0.0,
+                         tolerances: dict[str, tuple[float, float]] | None = None,
+                         write_dat: bool = False) -> DatComparison:
+    """Convert NeXus file in memory and compare it to the original dat file, without printing"""
+    profiler = get_profiler()
+    start = time.perf_counter()
+    # Convert nexus file in memory
+    with profiler.phase('convert'):
+        new_dat_string = nexus2srs_string(nexus_file)
+        if write_dat:
+            with open(converted_filename(old_dat_file), 'wt') as f:
+                f.write(new_dat_string)
 
-    # Generate new file
-    nexus2srs.nxs2dat(
-        nexus_file=nexus_filename,
-        dat_file=new_dat_filename,
-        write_tiff=False
-    )
     # Load files
-    old_dat_obj = read_dat_file(old_dat_file)
-    new_dat_obj = read_dat_file(new_dat_filename)
-
-    print(f"---{os.path.basename(old_dat_file)}---")
-    print("Nexus2SRS DAT file Comparison")
-    print(f"Old file: {old_dat_file}")
-    print(f"Converted file: {new_dat_filename}")
-    compare_dat_objects(old_dat_obj, new_dat_obj)
+    with profiler.phase('read_dat'):
+        old_dat_obj = read_dat_file(old_dat_file)
+        new_dat_obj = read_dat_stream(io.StringIO(new_dat_string))
+
+    with profiler.phase('compare'):
+        comparison = compare_dat_objects(old_dat_obj, new_dat_obj, atol, rtol, tolerances,
+                                         name=old_dat_file, verbose=False)
+    comparison.dat_file = old_dat_file
+    comparison.nexus_file = nexus_file
+    comparison.duration = time.perf_counter() - start
+    return comparison
+
+
+def compare_pair(old_dat_file: str, nexus_file: str | None = None, atol: float = 0.1, rtol: float = 0.0,
+                 tolerances: dict[str, tuple[float, float]] | None = None,
+                 write_dat: bool = False) -> DatComparison:
+    """
+    Compare original dat file to the conversion of its NeXus file, catching errors
+    :param old_dat_file: '123456.dat'
+    :param nexus_file: '123456.nxs', default is the dat filename with a .nxs extension
+    :param atol: default absolute tolerance
+    :param rtol: default relative tolerance
+    :param tolerances: {name: (atol, rtol)} tolerance for specific scannables or metadata
+    :param write_dat: if True, also write the converted file to '123456.nexus2srs.dat'
+    :return: DatComparison, with error set if either file can't be read or converted
+    """
+    nexus_file = nexus_file or nexus_filename(old_dat_file)
+    try:
+        return _convert_and_compare(old_dat_file, nexus_file, atol, rtol, tolerances, write_dat)
+    except Exception as ex:
+        logger.warning(f"{old_dat_file} failed with error: {ex}")
+        comparison = DatComparison(old_dat_file)
+        comparison.dat_file = old_dat_file
+        comparison.nexus_file = nexus_file
+        comparison.error = f"{type(ex).__name__}: {ex}"
+        return comparison
+
+
+def _compare_pair(pair: tuple[str, str], atol: float, rtol: float, tolerances: dict | None, write_dat: bool,
+                  profile: bool = False) -> DatComparison:
+    """Run compare_pair, optionally collecting profile metrics in the comparison, for use in worker processes"""
+    with profiling() if profile else contextlib.nullcontext() as profiler:
+        comparison = compare_pair(*pair, atol, rtol, tolerances, write_dat)
+    if profile:
+        comparison.profile = profiler.as_dict()
+    return comparison
+
+
+def set_conversion_logging_level(level: str | int):
+    """Set logging level of hdfmap and nexus2srs, which warn about missing metadata in most files"""
+    if isinstance(level, str):
+        level = level.upper()
+    for name in CONVERSION_LOGGERS:
+        logging.getLogger(name).setLevel(level)
+
+
+def iter_compare_dat(pairs: list[tuple[str, str]], workers: int = 1, atol: float = 0.1, rtol: float = 0.0,
+                     tolerances: dict[str, tuple[float, float]] | None = None, write_dat: bool = False,
+                     profiler: Profiler | None = None) -> typing.Iterator[DatComparison]:
+    """
+    Convert and compare many pairs of files, optionally in parallel, yielding each comparison in the order of pairs
+    :param pairs: [(dat_file, nexus_file), ] from pair_dat_files
+    :param workers: number of worker processes, if <= 1 pairs are compared in this process
+    :param atol: default absolute tolerance
+    :param rtol: default relative tolerance
+    :param tolerances: {name: (atol, rtol)} tolerance for specific scannables or metadata
+    :param write_dat: if True, also write each converted file next to the original
+    :param profiler: Profiler, if given metrics from every worker are collected in it
+    :return: generator of DatComparison
+    """
+    n = len(pairs)
+    with contextlib.ExitStack() as stack:
+        if workers <= 1 or n <= 1:
+            if profiler is not None:
+                stack.enter_context(profiling(profiler))
+            comparisons = (compare_pair(*pair, atol, rtol, tolerances, write_dat) for pair in pairs)
+        else:
+            level = logging.getLogger('nexus2srs').getEffectiveLevel()
+            executor = stack.enter_context(
+                ProcessPoolExecutor(max_workers=workers, initializer=set_conversion_logging_level,
+                                    initargs=(level,))
+            )
+            chunksize = max(1, n // (4 * workers))
+            comparisons = executor.map(_compare_pair, pairs, [atol] * n, [rtol] * n, [tolerances] * n,
+                                       [write_dat] * n, [profiler is not None] * n, chunksize=chunksize)
+        for comparison in comparisons:
+            if comparison.profile:
+                profiler.merge(comparison.profile)
+            yield comparison
+
+
+def compare_dat_batch(pairs: list[tuple[str, str]], workers: int = 1, atol: float = 0.1, rtol: float = 0.0,
+                      tolerances: dict[str, tuple[float, float]] | None = None, write_dat: bool = False,
+                      profiler: Profiler | None = None) -> 'ComparisonSummary':
+    """
+    Convert and compare many pairs of files, returning the summary of every comparison
+    See iter_compare_dat
+    :return: ComparisonSummary
+    """
+    summary = ComparisonSummary()
+    for comparison in iter_compare_dat(pairs, workers, atol, rtol, tolerances, write_dat, profiler):
+        summary.add(comparison)
+    return summary
+
+
+class ComparisonSummary:
+    """
+    Aggregate of many comparisons, without keeping each comparison
+        n_files, n_matching, n_errors, n_length_mismatch: number of comparisons
+        missing_scannables, missing_metadata, different_scannables, different_metadata: Counter of files by name
+        worst: [(max deviation, scannable, dat file), ] of the largest deviations, at most top
+        errors: [(dat file, error), ]
+    :param top: number of the largest deviations kept
+    """
+
+    def __init__(self, top: int = 20):
+        self.top = top
+        self.n_files = 0
+        self.n_matching = 0
+        self.n_errors = 0
+        self.n_length_mismatch = 0
+        self.duration = 0.0
+        self.missing_scannables = collections.Counter()
+        self.missing_metadata = collections.Counter()
+        self.different_scannables = collections.Counter()
+        self.different_metadata = collections.Counter()
+        self._worst = []  # min-heap of (deviation, scannable, dat file)
+        self.errors = []
+
+    def __repr__(self):
+        return f"ComparisonSummary(files={self.n_files}, matching={self.n_matching}, errors={self.n_errors})"
+
+    def add(self, comparison: DatComparison):
+        """Add result of compare_pair"""
+        self.n_files += 1
+        self.duration += comparison.duration
+        if comparison.error:
+            self.n_errors += 1
+            self.errors.append((comparison.dat_file, comparison.error))
+            return
+        self.n_matching += comparison.matches
+        self.n_length_mismatch += comparison.scan_length[0] != comparison.scan_length[1]
+        self.missing_scannables.update(comparison.missing_scannables.keys())
+        self.missing_metadata.update(comparison.missing_metadata.keys())
+        self.different_scannables.update(comparison.different_scannables.keys())
+        self.different_metadata.update(comparison.different_metadata.keys())
+        for name, deviation in comparison.max_deviation.items():
+            item = (deviation, name, comparison.dat_file)
+            if len(self._worst) < self.top:
+                heapq.heappush(self._worst, item)
+            elif item > self._worst[0]:
+                heapq.heapreplace(self._worst, item)
+
+    @property
+    def worst(self) -> list[tuple[float, str, str]]:
+        return sorted(self._worst, reverse=True)
+
+    def report(self, top: int | None = None) -> str:
+        """Return human-readable report of the most frequent differences, top of each"""
+        top = top or self.top
+
+        sections = [
+            ('Most frequently missing scannables', self.missing_scannables),
+            ('Most frequently missing metadata', self.missing_metadata),
+            ('Most frequently different scannables', self.different_scannables),
+            ('Most frequently different metadata', self.different_metadata),
+        ]
+        out = [
+            f"Compared {self.n_files} files: {self.n_matching} match, {self.n_errors} failed, "
+            f"{self.n_length_mismatch} with different scan length"
+        ]
+        for title, counter in sections:
+            if counter:
+                out.append(f"\n{title} (files):")
+                out.extend(f"  {count:6}  {name}" for name, count in counter.most_common(top))
+        if self._worst:
+            out.append("\nLargest deviations:")
+            out.extend(f"  {deviation:12.6g}  {name} in {file}" for deviation, name, file in self.worst[:top])
+        if self.errors:
+            out.append("\nFailed:")
+            out.extend(f"  {file}: {error}" for file, error in self.errors[:top])
+        return '\n'.join(out)
+
+
+def convert_and_compare_dat(old_dat_file: str, write_dat: bool = False, verbose: bool = True) -> DatComparison:
+    """
+    Compare old dat file to one generated using nexus2srs
+    The NeXus file is converted in memory, the converted file is only written if write_dat is True.
+    :param old_dat_file: '123456.dat'
+    :param write_dat: if True, also write the converted file to '123456.nexus2srs.dat'
+    :param verbose: if True, print report
+    :return: DatComparison
+    """
+    nexus_file = nexus_filename(old_dat_file)
+    comparison = _convert_and_compare(old_dat_file, nexus_file, write_dat=write_dat)
+    if verbose:
+        print(f"---{os.path.basename(old_dat_file)}---")
+        print("Nexus2SRS DAT file Comparison")
+        print(f"Old file: {old_dat_file}")
+        print(f"Converted file: {converted_filename(old_dat_file) if write_dat else f'{nexus_file} (in memory)'}")
+        print(comparison.report())
+    return comparison
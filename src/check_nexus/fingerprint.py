@@ -0,0 +1,76 @@
+"""
+Structural fingerprint of a NeXus file
+
+Most scans in a visit share the same layout, differing only in the data and attribute values.
+The fingerprint is a hash of the layout, built with the low-level h5py API without reading any data:
+    - link names, and the targets of soft and external links (excluding the external filename)
+    - group NX_class and the other attributes that determine the spec: default, signal and axes
+    - dataset type class, size and rank (not the shape, which depends on the scan length), and whether it is virtual
+    - attribute names of every object
+
+    fingerprint = structure_fingerprint(h5py.File('12345.nxs'))
+"""
+
+import hashlib
+
+import h5py
+import numpy as np
+from h5py import h5a, h5d, h5g, h5l, h5o, h5t
+
+# attributes whose values determine which paths are in the spec, see check.file_spec
+STRUCTURE_ATTRIBUTES = (b'NX_class', b'default', b'signal', b'axes')
+
+
+def _read_attribute(oid: h5g.GroupID | h5d.DatasetID, name: bytes) -> bytes:
+    """Return attribute value as bytes, attributes with a null dataspace (h5py.Empty) have no value to read"""
+    aid = h5a.open(oid, name)
+    if aid.shape is None:
+        return b'<empty>'
+    value = np.empty(aid.shape, dtype=aid.dtype)
+    aid.read(value)
+    return repr(value.tolist()).encode()
+
+
+def structure_fingerprint(hdf_file: h5py.File) -> str:
+    """
+    Return hash of the layout of the file
+    Files with the same fingerprint have the same groups, datasets, links and attribute names,
+    and the same spec from check.file_spec. External files are not opened.
+    :param hdf_file: open h5py.File
+    :return: str hex digest
+    """
+    fid = hdf_file.id
+    links = fid.links
+    digest = hashlib.sha1()
+
+    def visit_link(name: bytes):
+        info = links.get_info(name)
+        if info.type == h5l.TYPE_SOFT:
+            digest.update(b'S' + name + b'>' + links.get_val(name) + b'\n')
+            return
+        if info.type == h5l.TYPE_EXTERNAL:
+            # the external filename usually contains the scan number, only the path is part of the layout
+            digest.update(b'E' + name + b'>' + links.get_val(name)[1] + b'\n')
+            return
+        oid = h5o.open(fid, name)
+        if isinstance(oid, h5g.GroupID):
+            digest.update(b'G' + name)
+        elif isinstance(oid, h5d.DatasetID):
+            dtype = oid.get_type()
+            dtype_class = dtype.get_class()
+            size = 0 if dtype_class == h5t.STRING else dtype.get_size()  # string length depends on the value
+            digest.update(b'D' + name + f":{dtype_class}:{size}:{oid.rank}".encode())
+            if oid.get_create_plist().get_layout() == h5d.VIRTUAL:
+                digest.update(b':virtual')  # the sources of virtual datasets are checked in every file
+        else:
+            digest.update(b'T' + name)
+        attr_names = []
+        h5a.iterate(oid, attr_names.append)
+        digest.update(b'@' + b','.join(attr_names))
+        for attr in STRUCTURE_ATTRIBUTES:
+            if attr in attr_names:
+                digest.update(b'@' + attr + b'=' + _read_attribute(oid, attr))
+        digest.update(b'\n')
+
+    links.visit(visit_link)
+    return digest.hexdigest()
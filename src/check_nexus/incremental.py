@@ -0,0 +1,218 @@
+"""
+Incremental checks of scans that are still being written
+
+Long scans can take hours, and the layout of the file is written at the start. IncrementalCheck opens the file
+in SWMR read mode while the scan is running and checks its structure: the NX_class and attributes of every path
+in the spec, and dangling links. Later passes only re-check the spec paths whose objects are new or have been
+replaced or gained attributes since the last pass, virtual datasets and the paths that weren't found, keeping the
+earlier results. Changes are found from the link and object info of the file, without opening any object, and the
+file is only indexed again when something has changed. Shapes and detector data are still being written, so the
+consistency checks are left to the final pass, the full check_profiles, which runs once
+/entry/diamond_scan/scan_finished is set:
+
+    for check in iter_incremental('12345.nxs', interval=30):
+        print(check.n_passes, check.n_rechecked, [result.score for result in check.results])
+
+h5py can refresh datasets but not groups, so the file is opened again for each pass rather than kept open, which
+also sees any groups added by a writer that isn't in SWMR mode.
+"""
+
+import os
+import time
+import typing
+import logging
+
+import h5py
+
+from h5py import h5l, h5o
+
+from .plan import EXTERNAL, compile_plan, merge_plans, run_plan
+from .profiles import SpecProfile, DEFAULT_PROFILE
+from .links import MAX_SOFTLINK_DEPTH, FOLLOW, ExternalLinks, external_aliases, dangling_soft_links
+from .check import build_nxclass_index, file_spec, path_findings, check_profiles, _is_external
+from .watch import scan_finished, TIMEOUT
+from .results import CheckResult, Finding, WRONG
+from .profiling import get_profiler
+
+logger = logging.getLogger(__name__)
+
+INTERVAL = 10.0  # s between passes
+
+
+def object_signatures(nxs: h5py.File) -> dict[str, tuple]:
+    """
+    Return signature of every link in the file, from the link and object info without opening any object
+    Hard links are signed by the address, type and number of attributes of their object, so the signature changes
+    when the object is replaced or gains attributes, but not when a dataset grows. Soft links are signed by their
+    target and the signature of the object they resolve to, external links by their target.
+    :param nxs: open h5py.File
+    :return: {path: signature}
+    """
+    fid = nxs.id
+    objects = {}  # {address: (type, number of attributes)}
+    h5o.visit(fid, lambda name, info: objects.__setitem__(info.addr, (info.type, info.num_attrs)), info=True)
+
+    signatures = {}
+    soft = {}  # {path: target path}
+
+    def visit_link(name: bytes, info: h5l.LinkInfo):
+        path = name.decode()
+        if info.type == h5l.TYPE_HARD:
+            signatures[path] = ('hard', info.u, *objects[info.u])
+        elif info.type == h5l.TYPE_SOFT:
+            soft[path] = fid.links.get_val(name).decode()
+        else:
+            signatures[path] = ('link', info.type, fid.links.get_val(name))
+
+    fid.links.visit(visit_link, info=True)
+    for path, target in soft.items():
+        resolved = target
+        for _ in range(MAX_SOFTLINK_DEPTH):
+            resolved = '/'.join(name for name in resolved.split('/') if name not in ('', '.'))
+            if resolved not in soft:
+                break
+            resolved = soft[resolved]
+        signatures[path] = ('soft', target, signatures.get(resolved))
+    return signatures
+
+
+class IncrementalCheck:
+    """
+    Check of a scan file while it is being written, keeping the results of unchanged paths between passes
+        check = IncrementalCheck('12345.nxs')
+        while not check.complete:
+            time.sleep(30)
+            check.update()
+        print(check.results[0].report())
+    :param file: NeXus .nxs filename
+    :param profiles: [SpecProfile, ] with unique names, from profiles.load_profiles, default is the Diamond spec
+    :param link_policy: how external files are checked, 'follow', 'verify' or 'none', see links.py
+    """
+
+    def __init__(self, file: str, profiles: list[SpecProfile] | None = None, link_policy: str = FOLLOW):
+        self.file = file
+        self.profiles = list(profiles or [DEFAULT_PROFILE])
+        self.link_policy = link_policy
+        self.n_passes = 0
+        self.n_rechecked = 0  # spec paths checked in the last structural pass, of every profile
+        self.complete = False  # True once the full check has run
+        self.results = []  # [CheckResult, ] of the last pass, one per profile
+        self._signatures = {}  # {path: signature} of the links in the file at the last pass
+        self._checked = {}  # {(profile name, spec path): (kind, nx_class, found_attrs)} from run_plan
+        self._layout = None  # (index, aliases, {profile name: (metadata, attributes)}) of the last changed pass
+        self._virtual = set()  # paths of virtual datasets, whose sources may appear at any time
+
+    def __repr__(self):
+        return f"IncrementalCheck('{self.file}', passes={self.n_passes}, complete={self.complete})"
+
+    def update(self, final: bool = False) -> list[CheckResult]:
+        """
+        Check the file again, only re-checking what has changed, or run the full check if the scan has finished
+        :param final: if True, run the full check even if the scan hasn't finished
+        :return: [CheckResult, ] one per profile
+        :raises OSError: if the file can't be read, e.g. it hasn't been created yet
+        """
+        if self.complete:
+            return self.results
+        t0 = time.perf_counter()
+        with h5py.File(self.file, 'r', swmr=True) as nxs:
+            final = final or scan_finished(nxs)
+            if not final:
+                results = self._check_structure(nxs)
+        if final:
+            results = check_profiles(self.file, self.profiles, reuse_layout=False, link_policy=self.link_policy)
+            self.complete = True
+        else:
+            for result in results:
+                result.duration = time.perf_counter() - t0
+        self.n_passes += 1
+        self.results = results
+        return results
+
+    def _recheck(self, name: str, path: str, changed: set[str], aliases: dict[str, str]) -> bool:
+        """Return True if the spec path needs checking in this pass"""
+        result = self._checked.get((name, path))
+        if result is None or result[0] in ('missing', EXTERNAL) or _is_external(path, aliases):
+            return True
+        path = '/'.join(n for n in path.strip('/').split('/') if n not in ('', '.'))
+        return path in changed or path in self._virtual
+
+    def _check_structure(self, nxs: h5py.File) -> list[CheckResult]:
+        """Check paths and attributes of objects that have changed since the last pass"""
+        profiler = get_profiler()
+        with profiler.phase('fingerprint'):
+            signatures = object_signatures(nxs)
+        changed = {path for path, signature in signatures.items() if self._signatures.get(path) != signature}
+        changed.update(path for path in self._signatures if path not in signatures)
+        self._signatures = signatures
+
+        if changed or self._layout is None:
+            # the index and spec only change with the links and objects in the file
+            with profiler.phase('index'):
+                index = build_nxclass_index(nxs)
+                aliases = external_aliases(nxs, index)
+            with profiler.phase('spec'):
+                file_specs = {profile.name: file_spec(nxs, index, profile) for profile in self.profiles}
+            self._layout = (index, aliases, file_specs)
+        index, aliases, file_specs = self._layout
+
+        with ExternalLinks(nxs, aliases, self.link_policy) as links:
+            specs = {}
+            plans = []
+            for profile in self.profiles:
+                metadata, attributes = file_specs[profile.name]
+                specs[profile.name] = {**profile.metadata, **metadata}
+                recheck = {
+                    path: value for path, value in specs[profile.name].items()
+                    if self._recheck(profile.name, path, changed, aliases)
+                }
+                plans.append(compile_plan(recheck, {**profile.attributes, **attributes}, tag=profile.name))
+            with profiler.phase('resolve'):
+                results = run_plan(nxs, merge_plans(*plans), links)
+            # spec paths of groups that have gone aren't kept
+            self._checked = {
+                key: result for key, result in {**self._checked, **results}.items() if key[1] in specs[key[0]]
+            }
+            self._virtual.update(links.virtual)
+            self.n_rechecked = len(results)
+            dangling = {**dangling_soft_links(nxs, index), **links.dangling}
+        logger.info(f"'{self.file}' pass {self.n_passes + 1}: {len(changed)} objects changed, "
+                    f"{self.n_rechecked} spec paths checked")
+
+        check_results = []
+        for name, metadata in specs.items():
+            findings = []
+            for path, value in metadata.items():
+                findings.extend(path_findings(path, value, self._checked[name, path]))
+            for path, (target, error) in dangling.items():
+                findings.append(Finding(path, '', 'link', target, error, WRONG))
+            check_results.append(CheckResult(self.file, findings, spec=name))
+        return check_results
+
+
+def iter_incremental(file: str, profiles: list[SpecProfile] | None = None, link_policy: str = FOLLOW,
+                     interval: float = INTERVAL, timeout: float = TIMEOUT) -> typing.Iterator[IncrementalCheck]:
+    """
+    Check a scan while it is being written, every interval seconds, until the full check has run
+    Passes that can't read the file, e.g. before the writer has created it, are tried again after interval seconds.
+    If the scan hasn't finished timeout seconds after the file was last modified, e.g. it was aborted, the full
+    check runs anyway.
+    :param file: NeXus .nxs filename
+    :param profiles: [SpecProfile, ] with unique names, from profiles.load_profiles, default is the Diamond spec
+    :param link_policy: how external files are checked, 'follow', 'verify' or 'none', see links.py
+    :param interval: seconds between passes
+    :param timeout: seconds since last modification after which the full check runs
+    :return: generator of IncrementalCheck, after each pass, with the results in IncrementalCheck.results
+    """
+    check = IncrementalCheck(file, profiles, link_policy)
+    while True:
+        try:
+            age = time.time() - os.stat(file).st_mtime
+            check.update(final=age >= timeout)
+        except OSError as ex:
+            logger.info(f"'{file}' can't be read ({ex}), trying again in {interval} s")
+        else:
+            yield check
+            if check.complete:
+                return
+        time.sleep(interval)
@@ -0,0 +1,277 @@
+"""
+External links and virtual datasets
+
+Detector data in I16 files is held in separate HDF5 files, reached through external links or virtual datasets.
+Opening these on a slow or missing file system can stall a check, so each check has a link policy:
+    FOLLOW - open external files, each at most once per check (default)
+    VERIFY - only check that the external files exist
+    IGNORE - don't look at external files at all
+Except with IGNORE, every external file is stat'ed in parallel with a timeout before anything is opened,
+and files that are missing or don't respond are reported as dangling links and never opened. Files are looked for
+where HDF5 looks for them, see external_file_candidates, so a link is only dangling if HDF5 couldn't resolve it.
+
+    with ExternalLinks(nxs, aliases, policy=VERIFY) as links:
+        results = run_plan(nxs, plan, links)
+    print(links.dangling)
+"""
+
+import os
+import queue
+import typing
+import threading
+from concurrent.futures import Future, wait
+
+import h5py
+from h5py import h5l
+
+from .profiling import get_profiler
+
+FOLLOW = 'follow'
+VERIFY = 'verify'
+IGNORE = 'none'
+LINK_POLICIES = (FOLLOW, VERIFY, IGNORE)
+STAT_TIMEOUT = 5.0  # s to wait for all external files of a NeXus file to be stat'ed
+STAT_WORKERS = 16  # threads shared by every check in the process to stat external files
+EXT_PREFIX = 'HDF5_EXT_PREFIX'  # environment variables of directories HDF5 searches for external files
+VDS_PREFIX = 'HDF5_VDS_PREFIX'
+MAX_SOFTLINK_DEPTH = 32  # soft link chains longer than this are treated as dangling
+
+
+def external_link_targets(hdf_file: h5py.File) -> dict[str, tuple[str, str]]:
+    """
+    Return every external link in the file, using the low-level API so no external file is opened
+    :param hdf_file: open h5py.File
+    :return: {link path: (filename as stored in the link, object path)}
+    """
+    links = hdf_file.id.links
+    targets = {}
+
+    def visit_link(name: bytes):
+        if links.get_info(name).type == h5l.TYPE_EXTERNAL:
+            filename, obj_path = links.get_val(name)
+            targets[os.fsdecode(name)] = (os.fsdecode(filename), os.fsdecode(obj_path))
+
+    links.visit(visit_link)
+    return targets
+
+
+def external_aliases(hdf_file: h5py.File, index: dict[str, tuple[str, str]]) -> dict[str, str]:
+    """
+    Return the external link reached from each path in the index that resolves to one, following soft links
+    :param hdf_file: open h5py.File
+    :param index: index from check.build_nxclass_index
+    :return: {path: path of external link}
+    """
+    aliases = {}
+    for path, (kind, nx_class) in index.items():
+        if kind != 'external':
+            continue
+        target = path
+        for _ in range(MAX_SOFTLINK_DEPTH):
+            link = hdf_file.get(target, getlink=True)
+            if not isinstance(link, h5py.SoftLink):
+                break
+            target = link.path
+        aliases[path] = target.strip('/')
+    return aliases
+
+
+def dangling_soft_links(hdf_file: h5py.File, index: dict[str, tuple[str, str]]) -> dict[str, tuple[str, str]]:
+    """
+    Return soft links in the index that don't lead to an object
+    :param hdf_file: open h5py.File
+    :param index: index from check.build_nxclass_index
+    :return: {path: (target, error)}
+    """
+    dangling = {}
+    for path, (kind, nx_class) in index.items():
+        if kind == 'dangling':
+            link = hdf_file.get(path, getlink=True)
+            target = link.path if isinstance(link, h5py.SoftLink) else ''
+            dangling[path] = (target, 'no object at target')
+    return dangling
+
+
+def external_file_candidates(filename: str, folder: str, env: str = EXT_PREFIX) -> list[str]:
+    """
+    Return the files HDF5 tries, in order, to open the file of an external link or virtual dataset source
+    An absolute filename is tried as given, then only its last part is used. The name is then looked for in each
+    directory of the environment variable env, in folder, then relative to the current directory.
+    :param filename: filename as stored in the link
+    :param folder: directory of the file holding the link
+    :param env: EXT_PREFIX for external links, VDS_PREFIX for virtual dataset sources
+    :return: [filename, ] without repeats
+    """
+    candidates = []
+    if os.path.isabs(filename):
+        candidates.append(filename)
+        filename = os.path.basename(filename)
+    for prefix in os.environ.get(env, '').split(os.pathsep):
+        if prefix:
+            candidates.append(os.path.join(prefix.replace('${ORIGIN}', folder), filename))
+    candidates.extend([os.path.join(folder, filename), os.path.abspath(filename)])
+    return list(dict.fromkeys(os.path.normpath(candidate) for candidate in candidates))
+
+
+_STAT_LOCK = threading.Lock()
+_STAT_POOL = {'pid': None, 'requests': None, 'pending': {}}  # worker threads are started once in each process
+
+
+def _stat_worker(requests: queue.SimpleQueue):
+    while True:
+        filename, future = requests.get()
+        try:
+            os.stat(filename)
+            future.set_result('')
+        except OSError as ex:
+            future.set_result(ex.strerror or str(ex))
+
+
+def _stat_future(filename: str) -> Future:
+    """Return Future of the stat of filename by the shared worker threads, reusing a stat still running"""
+    with _STAT_LOCK:
+        if _STAT_POOL['pid'] != os.getpid():  # threads aren't copied into forked worker processes
+            requests = queue.SimpleQueue()
+            for n in range(STAT_WORKERS):
+                threading.Thread(target=_stat_worker, args=(requests,), daemon=True, name=f"stat_files_{n}").start()
+            _STAT_POOL.update(pid=os.getpid(), requests=requests, pending={})
+        pending = _STAT_POOL['pending']
+        future = pending.get(filename)
+        if future is None:
+            future = pending[filename] = Future()
+            future.add_done_callback(lambda done: pending.pop(filename, None))
+            _STAT_POOL['requests'].put((filename, future))
+    return future
+
+
+def stat_files(filenames: list[str], timeout: float = STAT_TIMEOUT) -> dict[str, str]:
+    """
+    Check files exist, in parallel, giving up after timeout
+    Files are stat'ed by STAT_WORKERS daemon threads shared by the process, so a hung file system can't stop the
+    program exiting and stats that never return don't add threads. A file still being stat'ed by an earlier call
+    isn't stat'ed again.
+    :param filenames: list of filenames
+    :param timeout: s to wait for all files
+    :return: {filename: error}, error is '' if the file exists
+    """
+    futures = {filename: _stat_future(filename) for filename in filenames}
+    wait(futures.values(), timeout)
+    return {
+        filename: future.result() if future.done() else f"no response after {timeout:.3g} s"
+        for filename, future in futures.items()
+    }
+
+
+class ExternalLinks:
+    """
+    External links of an open file, the status of the files they point to and the external files opened
+    :param hdf_file: open h5py.File
+    :param aliases: {path: path of external link} for every path that resolves to an external link,
+        from external_aliases
+    :param policy: FOLLOW, VERIFY or IGNORE
+    :param timeout: s to wait for the external files to be stat'ed
+    :param targets: {link path: (filename, object path)} from external_link_targets, if already read
+    """
+
+    def __init__(self, hdf_file: h5py.File, aliases: dict[str, str], policy: str = FOLLOW,
+                 timeout: float = STAT_TIMEOUT, targets: dict[str, tuple[str, str]] | None = None):
+        if policy not in LINK_POLICIES:
+            raise ValueError(f"Unknown link policy '{policy}', use one of {LINK_POLICIES}")
+        self.policy = policy
+        self.timeout = timeout
+        self.aliases = aliases
+        self.folder = os.path.dirname(os.path.abspath(hdf_file.filename))
+        if targets is None:
+            targets = external_link_targets(hdf_file) if aliases else {}
+        self.targets = targets
+        self.errors = {}  # {filename: error}, of the filenames in the links joined to the folder holding the link
+        self.found = {}  # {filename: file found by the HDF5 search}
+        self.dangling = {}  # {path: (target, error)}
+        self.virtual = []  # [path, ] virtual datasets checked by check_virtual
+        self.files = {}  # {filename: h5py.File} external files opened
+        if policy != IGNORE and self.targets:
+            with get_profiler().phase('stat_links'):
+                errors = self.check_files(filename for filename, obj_path in self.targets.values())
+            for path, (filename, obj_path) in self.targets.items():
+                if errors[filename]:
+                    self.dangling[path] = (f"{self.file_key(filename)}:{obj_path}", errors[filename])
+
+    def __repr__(self):
+        return f"ExternalLinks(policy='{self.policy}', links={len(self.targets)}, dangling={len(self.dangling)})"
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def file_key(self, filename: str, folder: str | None = None) -> str:
+        """Return filename of a link joined to the folder holding the link, the key of errors and found"""
+        return os.path.normpath(os.path.join(folder or self.folder, filename))
+
+    def check_files(self, filenames: typing.Iterable[str], folder: str | None = None,
+                    env: str = EXT_PREFIX) -> dict[str, str]:
+        """
+        Find files not already checked, stat'ing every file HDF5 would try, see external_file_candidates
+        :param filenames: filenames as stored in the links
+        :param folder: directory of the file holding the links, default is the directory of this file
+        :param env: EXT_PREFIX for external links, VDS_PREFIX for virtual dataset sources
+        :return: {filename: error} of each filename, error is '' if the file was found
+        """
+        folder = folder or self.folder
+        keys = {filename: self.file_key(filename, folder) for filename in filenames}
+        new = {
+            key: external_file_candidates(filename, folder, env)
+            for filename, key in keys.items() if key not in self.errors
+        }
+        if new:
+            status = stat_files(list(dict.fromkeys(name for names in new.values() for name in names)), self.timeout)
+            for key, candidates in new.items():
+                found = [candidate for candidate in candidates if not status[candidate]]
+                if found:
+                    self.found[key] = found[0]
+                self.errors[key] = '' if found else status[candidates[0]]
+        return {filename: self.errors[key] for filename, key in keys.items()}
+
+    def is_external(self, path: str) -> bool:
+        """Return True if path resolves to an external link"""
+        return path in self.aliases
+
+    def error(self, path: str) -> str:
+        """Return error of the external file reached from path, '' if the file exists"""
+        filename, obj_path = self.targets.get(self.aliases[path], ('', ''))
+        return self.errors.get(self.file_key(filename), '') if filename else ''
+
+    def open(self, path: str) -> h5py.Group | h5py.Dataset | None:
+        """Return object in external file reached from path, opening each external file once"""
+        filename, obj_path = self.targets[self.aliases[path]]
+        key = self.file_key(filename)
+        if key not in self.files:
+            get_profiler().count('external_files_opened')
+            try:
+                self.files[key] = h5py.File(self.found.get(key, key), 'r')
+            except OSError as ex:
+                self.errors[key] = str(ex)
+                self.dangling[self.aliases[path]] = (f"{key}:{obj_path}", str(ex))
+                return None
+        return self.files[key].get(obj_path)
+
+    def check_virtual(self, path: str, dataset: h5py.Dataset):
+        """Stat the source files of a virtual dataset, adding any missing sources to dangling"""
+        if self.policy == IGNORE or not dataset.is_virtual:
+            return
+        self.virtual.append(path)
+        folder = os.path.dirname(os.path.abspath(dataset.file.filename))
+        sources = {
+            source.file_name: source.dset_name for source in dataset.virtual_sources() if source.file_name != '.'
+        }
+        errors = self.check_files(sources, folder, VDS_PREFIX)
+        for filename, dset_name in sources.items():
+            if errors[filename]:
+                self.dangling[path] = (f"{self.file_key(filename, folder)}:{dset_name}", errors[filename])
+
+    def close(self):
+        """Close external files"""
+        for file in self.files.values():
+            file.close()
+        self.files.clear()
@@ -1,5 +1,7 @@
 
 
+PROFILE_NAME = 'diamond'  # name of this spec in profiles.BUILTIN_PROFILES
+
 # from "diamond standard nexus structure V2.docx"
 METADATA = {
     '/entry': 'NXentry',
@@ -0,0 +1,291 @@
+"""
+Compiled check plan
+
+The metadata specification is a flat dict of paths, many sharing the same parent groups.
+The plan arranges the spec into a tree of groups, so each group in the file is opened once and
+all of its expected children are found with a single listing of the group.
+Expected attribute values are encoded once when the plan is compiled, and the attributes of each object are read
+in a single pass with the low-level API, so attributes that are missing cost nothing.
+"""
+
+import typing
+import functools
+
+import h5py
+import numpy as np
+from h5py import h5a, h5t
+
+from .metadata import METADATA, ATTRIBUTES
+from .profiling import get_profiler, Profiler, NullProfiler
+from .links import ExternalLinks, FOLLOW
+
+
+class PlanNode:
+    """
+    Node of the check plan, one per HDF5 object named in the spec
+        name: link name in the parent group
+        checks: [(spec_path, expected_value, {attr: (expected, encoded)}), ] - spec lines for this object
+        children: {name: PlanNode}
+    """
+    __slots__ = ('name', 'checks', 'children')
+
+    def __init__(self, name: str):
+        self.name = name
+        self.checks = []
+        self.children = {}
+
+    def __repr__(self):
+        return f"PlanNode('{self.name}', checks={len(self.checks)}, children={len(self.children)})"
+
+
+def encode_attribute(value):
+    """Return attribute value in the form stored by h5py: str as bytes, lists as numpy arrays"""
+    if isinstance(value, str):
+        return value.encode()
+    if isinstance(value, (list, tuple)):
+        return np.array([encode_attribute(val) for val in value])
+    return value
+
+
+def attribute_matches(found, encoded) -> bool:
+    """Return True if attribute value read from file matches the pre-encoded expected value"""
+    if isinstance(encoded, np.ndarray) or isinstance(found, np.ndarray):
+        found, encoded = np.asarray(found), np.asarray(encoded)
+        if found.shape != encoded.shape or (found.dtype.kind == 'S') != (encoded.dtype.kind == 'S'):
+            return False  # bytes never equal str or numbers
+        return bool(np.equal(found, encoded).all())
+    return bool(found == encoded)
+
+
+@functools.lru_cache(maxsize=4096)
+def decode_name(value: bytes) -> str:
+    """Return str of a name read from the file, e.g. NX_class, each name is decoded once"""
+    return value.decode()
+
+
+@functools.lru_cache(maxsize=256)
+def _encode_name(name: str) -> bytes:
+    return name.encode()
+
+
+@functools.lru_cache(maxsize=1024)
+def _memory_type(dtype: np.dtype) -> h5t.TypeID:
+    return h5t.py_create(dtype)
+
+
+@functools.lru_cache(maxsize=1024)
+def _string_type(size: int, cset: int) -> tuple[np.dtype, h5t.TypeID]:
+    """Return dtype and memory type of fixed-length strings, UTF-8 strings are read as bytes, like h5py"""
+    dtype = np.dtype(f"S{size}")
+    if cset == h5t.CSET_UTF8:
+        return dtype, h5t.py_create(h5py.string_dtype('utf-8', size))
+    return dtype, h5t.py_create(dtype)
+
+
+def read_attributes(obj: h5py.Group | h5py.Dataset, names: typing.Iterable[str]) -> dict[str, typing.Any]:
+    """
+    Return values of the attributes of object in names, listing its attribute names once with the low-level API
+    Values are the same as obj.attrs[name]. Numeric and fixed-length string attributes are read directly,
+    other types through h5py.
+    :param obj: h5py object
+    :param names: attribute names
+    :return: {name: value}, without the attributes the object doesn't have
+    """
+    oid = obj.id
+    wanted = {_encode_name(name): name for name in names}
+    found = []
+    h5a.iterate(oid, lambda name: found.append(name) if name in wanted else None)
+    values = {}
+    for name in found:
+        aid = h5a.open(oid, name)
+        shape = aid.shape
+        tid = aid.get_type()
+        if shape is not None and tid.get_class() == h5t.STRING and not tid.is_variable_str():
+            # most attributes, without building the dtype from the type
+            dtype, mtype = _string_type(tid.get_size(), tid.get_cset())
+        else:
+            dtype = aid.dtype
+            if shape is None or dtype.kind not in 'biuf' or dtype.subdtype is not None:
+                values[wanted[name]] = obj.attrs[wanted[name]]  # empty, vlen, compound or array types
+                continue
+            mtype = _memory_type(dtype)
+        value = np.zeros(shape, dtype=dtype)
+        aid.read(value, mtype=mtype)
+        values[wanted[name]] = value[()] if value.ndim == 0 else value
+    return values
+
+
+def read_nx_class(group: h5py.Group, default: str = '') -> str:
+    """Return NX_class attribute of group as str, or default if it doesn't have one"""
+    nx_class = read_attributes(group, ('NX_class',)).get('NX_class')
+    if nx_class is None:
+        return default
+    return decode_name(nx_class) if isinstance(nx_class, bytes) else str(nx_class)
+
+
+def compile_plan(metadata: dict, attributes: dict, tag: str | None = None) -> PlanNode:
+    """
+    Compile metadata spec into a tree of groups
+    :param metadata: {path: expected value}
+    :param attributes: {path: {attr: expected value}}, only paths in metadata are checked
+    :param tag: if given, results are keyed by (tag, path) rather than path, so plans can be merged
+    :return: root PlanNode
+    """
+    root = PlanNode('/')
+    for path, value in metadata.items():
+        node = root
+        for name in path.strip('/').split('/'):
+            if name in ('', '.'):  # e.g. NXdata axes '.', refers to the group itself
+                continue
+            if name not in node.children:
+                node.children[name] = PlanNode(name)
+            node = node.children[name]
+        attrs = {
+            attr: (attr_value, encode_attribute(attr_value))
+            for attr, attr_value in attributes.get(path, {}).items()
+        }
+        node.checks.append((path if tag is None else (tag, path), value, attrs))
+    return root
+
+
+def merge_plans(*plans: PlanNode) -> PlanNode:
+    """
+    Merge plans into a single tree, so every plan is run in one pass over the file
+    Where plans check the same result key, the result from the last plan is kept.
+    :param plans: root PlanNodes, from compile_plan with different tags
+    :return: root PlanNode
+    """
+    root = PlanNode('/')
+    for plan in plans:
+        _merge_node(root, plan)
+    return root
+
+
+def _merge_node(target: PlanNode, node: PlanNode):
+    target.checks.extend(node.checks)
+    for name, child in node.children.items():
+        if name not in target.children:
+            target.children[name] = PlanNode(name)
+        _merge_node(target.children[name], child)
+
+
+@functools.cache
+def default_plan() -> PlanNode:
+    """Return plan compiled from METADATA and ATTRIBUTES, compiled once per process"""
+    return compile_plan(METADATA, ATTRIBUTES)
+
+
+EXTERNAL = 'external'  # object in an external file that isn't opened
+
+
+def object_kind(obj: h5py.Group | h5py.Dataset | str | None, path: str = '',
+                links: ExternalLinks | None = None, attributes: dict | None = None) -> tuple[str, str]:
+    """
+    Return kind and NX_class of object, checking the sources of virtual datasets
+    :param obj: h5py object, EXTERNAL or None if missing
+    :param path: path of the object, for links
+    :param links: ExternalLinks of the file
+    :param attributes: {name: value} from read_attributes including NX_class, if already read
+    :return: kind, nx_class - kind is 'group', 'dataset', 'external' or 'missing', nx_class is '' if not a group
+    """
+    if isinstance(obj, h5py.Group):
+        if attributes is None:
+            return 'group', read_nx_class(obj, 'none')
+        nx_class = attributes.get('NX_class', b'none')
+        return 'group', decode_name(nx_class) if isinstance(nx_class, bytes) else str(nx_class)
+    if isinstance(obj, h5py.Dataset):
+        if links is not None:
+            links.check_virtual(path, obj)
+        return 'dataset', ''
+    if obj == EXTERNAL:
+        return EXTERNAL, ''
+    return 'missing', ''
+
+
+def check_attributes(obj: h5py.Group | h5py.Dataset, attrs: dict, attributes: dict | None = None) -> dict:
+    """
+    Compare attributes of object with expected values
+    :param obj: h5py object
+    :param attrs: {attr: (expected, encoded)} from compile_plan
+    :param attributes: {name: value} from read_attributes including every attr, if already read
+    :return: {attr: (expected, found, matches)}, found is None if the attribute is missing
+    """
+    if attributes is None:
+        attributes = read_attributes(obj, attrs)
+    found_attrs = {}
+    for attr, (attr_value, encoded) in attrs.items():
+        found = attributes.get(attr)
+        if found is None:
+            found_attrs[attr] = (attr_value, None, False)
+        else:
+            found_attrs[attr] = (attr_value, found, attribute_matches(found, encoded))
+    return found_attrs
+
+
+class _LinkNames:
+    """Link names of a group, tested one at a time rather than listing the group"""
+    __slots__ = ('links',)
+
+    def __init__(self, group: h5py.Group):
+        self.links = group.id.links
+
+    def __contains__(self, name: str) -> bool:
+        return self.links.exists(name.encode())
+
+
+def _run_node(node: PlanNode, obj: h5py.Group | h5py.Dataset | str | None, results: dict,
+              profiler: Profiler | NullProfiler, path: str = '', links: ExternalLinks | None = None,
+              list_groups: bool = True):
+    """Check node against obj, then check children, listing the group and the attributes of obj only once"""
+    attributes = None
+    names = {attr for spec_path, value, attrs in node.checks for attr in attrs}
+    if names and isinstance(obj, (h5py.Group, h5py.Dataset)):
+        with profiler.phase('attributes'):
+            attributes = read_attributes(obj, names | {'NX_class'} if isinstance(obj, h5py.Group) else names)
+    kind, nx_class = object_kind(obj, path, links, attributes)
+
+    for spec_path, value, attrs in node.checks:
+        found_attrs = check_attributes(obj, attrs, attributes) if kind in ('group', 'dataset') and attrs else {}
+        results[spec_path] = (kind, nx_class, found_attrs)
+
+    if node.children:
+        if kind != 'group':
+            members = ()
+        else:
+            members = set(obj.keys()) if list_groups else _LinkNames(obj)
+        for name, child in node.children.items():
+            child_path = f"{path}/{name}" if path else name
+            if kind == EXTERNAL:
+                _run_node(child, EXTERNAL, results, profiler, child_path, links, list_groups)
+            elif name not in members:
+                _run_node(child, None, results, profiler, child_path, links, list_groups)
+            elif links is not None and links.is_external(child_path):
+                if links.error(child_path):
+                    child_obj = None  # dangling, don't try to open it
+                elif links.policy == FOLLOW:
+                    profiler.count('external_links_followed')
+                    child_obj = links.open(child_path)
+                else:
+                    child_obj = EXTERNAL
+                _run_node(child, child_obj, results, profiler, child_path, links, list_groups)
+            else:
+                profiler.count('hdf5_objects_opened')
+                _run_node(child, obj.get(name), results, profiler, child_path, links, list_groups)
+
+
+def run_plan(hdf_file: h5py.File, plan: PlanNode, links: ExternalLinks | None = None,
+             list_groups: bool = True) -> dict[str, tuple[str, str, dict]]:
+    """
+    Run check plan on open file
+    :param hdf_file: open h5py.File
+    :param plan: root PlanNode from compile_plan
+    :param links: ExternalLinks of the file, if None external links are followed by h5py
+    :param list_groups: if False, each child in the plan is looked up rather than listing its group, which is
+        slower for small groups but doesn't hold the names of every link in a large group
+    :return: {spec_path: (kind, nx_class, {attr: (expected, found, matches)})}
+        kind is 'group', 'dataset', 'external' (not opened) or 'missing', found is None if the attribute is missing
+        spec_path is (tag, path) for plans compiled with a tag
+    """
+    results = {}
+    _run_node(plan, hdf_file, results, get_profiler(), '', links, list_groups)
+    return results
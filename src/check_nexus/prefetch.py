@@ -0,0 +1,132 @@
+"""
+Prefetch files ahead of the checks
+
+On GPFS and NFS most of the time checking a file goes on waiting for reads of the HDF5 metadata, which is
+spread through the file. In-process batches are otherwise strictly sequential, so the CPU is idle during each read.
+The Prefetcher reads the next files in background threads, with plain reads that release the GIL, so that when
+h5py opens a file its blocks are already in the page cache:
+
+    for file in Prefetcher(files, depth=8):
+        check_file(file)
+
+At most depth files are read ahead, and at most max_bytes of each file, through a fixed buffer per thread, so
+memory use doesn't depend on the number or size of the files.
+"""
+
+import os
+import time
+import typing
+import threading
+import collections
+from concurrent.futures import ThreadPoolExecutor
+
+from .profiling import Profiler, NullProfiler
+
+PREFETCH_DEPTH = 8  # files read ahead of the check
+PREFETCH_THREADS = 4  # files read at once
+PREFETCH_BYTES = 64 * 2 ** 20  # maximum read from each file, detector data is usually in separate files
+BLOCK_SIZE = 2 ** 20  # size of each read, and of each thread's buffer
+
+_local = threading.local()
+
+
+def prefetch_file(file: str, max_bytes: int = PREFETCH_BYTES, block_size: int = BLOCK_SIZE) -> int:
+    """
+    Read the start of a file into the page cache, discarding the data
+    :param file: filename
+    :param max_bytes: maximum number of bytes read
+    :param block_size: size of each read
+    :return: number of bytes read, 0 if the file can't be read
+    """
+    buffer = getattr(_local, 'buffer', None)
+    if buffer is None or len(buffer) != block_size:
+        buffer = _local.buffer = bytearray(block_size)
+    total = 0
+    try:
+        with open(file, 'rb', buffering=0) as f:
+            if hasattr(os, 'posix_fadvise'):
+                os.posix_fadvise(f.fileno(), 0, max_bytes, os.POSIX_FADV_WILLNEED)
+            while total < max_bytes:
+                n = f.readinto(memoryview(buffer)[:min(block_size, max_bytes - total)])
+                if not n:
+                    break
+                total += n
+    except OSError:
+        pass  # reported when the file is checked
+    return total
+
+
+class Prefetcher:
+    """
+    Iterate over files, reading ahead of the consumer in background threads
+    Each file is yielded once its prefetch has finished.
+    :param files: list of filenames
+    :param depth: maximum number of files read ahead
+    :param threads: number of files read at once
+    :param max_bytes: maximum read from each file
+    :param profiler: Profiler, counts files and bytes prefetched and times waits for prefetches to finish
+    """
+
+    def __init__(self, files: typing.Iterable[str], depth: int = PREFETCH_DEPTH, threads: int = PREFETCH_THREADS,
+                 max_bytes: int = PREFETCH_BYTES, profiler: Profiler | NullProfiler | None = None):
+        self.files = files
+        self.depth = max(1, depth)
+        self.threads = max(1, min(threads, self.depth))
+        self.max_bytes = max_bytes
+        self.profiler = profiler or NullProfiler()
+
+    def __repr__(self):
+        return f"Prefetcher(depth={self.depth}, threads={self.threads}, max_bytes={self.max_bytes})"
+
+    def __iter__(self) -> typing.Iterator[str]:
+        files = iter(self.files)
+        queue = collections.deque()  # (file, future), at most depth
+        with ThreadPoolExecutor(max_workers=self.threads, thread_name_prefix='prefetch') as executor:
+            try:
+                while True:
+                    while len(queue) < self.depth:
+                        file = next(files, None)
+                        if file is None:
+                            break
+                        queue.append((file, executor.submit(prefetch_file, file, self.max_bytes)))
+                    if not queue:
+                        return
+                    file, future = queue.popleft()
+                    with self.profiler.phase('prefetch_wait'):
+                        nbytes = future.result()
+                    self.profiler.count('files_prefetched')
+                    self.profiler.count('bytes_prefetched', nbytes)
+                    yield file
+            finally:
+                for file, future in queue:
+                    future.cancel()
+
+
+class Throughput:
+    """
+    End-to-end throughput of a batch, from creation to the last file
+        throughput = Throughput()
+        for result in iter_check_batch(files):
+            throughput.add()
+        print(throughput)
+    """
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.end = self.start
+        self.files = 0
+
+    def __str__(self):
+        return f"Checked {self.files} files in {self.seconds:.2f} s, {self.files_per_second:.1f} files/s"
+
+    def add(self, n: int = 1):
+        self.files += n
+        self.end = time.perf_counter()
+
+    @property
+    def seconds(self) -> float:
+        return self.end - self.start
+
+    @property
+    def files_per_second(self) -> float:
+        return self.files / self.seconds if self.seconds > 0 else 0.0
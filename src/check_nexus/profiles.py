@@ -0,0 +1,240 @@
+"""
+Spec profiles
+
+A profile is a complete metadata specification: the fixed paths to check, and the attributes and fields
+expected in every NXentry, NXdata and NXdetector group. The built-in 'diamond' profile is the spec in metadata.py.
+Other profiles are read from JSON or YAML files (YAML requires PyYAML), and may extend another profile:
+
+    name: i16_draft
+    description: next draft of the Diamond spec, with I16 extras
+    extends: diamond            # built-in profile name, or profile file relative to this one
+    remove:
+      - /entry/sample/diffcalc
+    metadata:
+      /entry/instrument/diffractometer: NXpositioner
+    attributes:
+      /entry/instrument/diffractometer: {depends_on: .}
+    nxdetector_data:
+      depends_on: str
+
+Parsed profiles, with their compiled check plans, are cached as pickles and only re-read when a file changes.
+Several profiles can be checked at once in a single pass over each file, see check.check_profiles.
+"""
+
+import os
+import json
+import pickle
+import hashlib
+import functools
+
+from . import metadata
+from .plan import PlanNode, compile_plan
+from .links import FOLLOW
+
+PROFILE_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'check_nexus', 'profiles')
+PROFILE_EXTENSIONS = ('.json', '.yaml', '.yml')
+
+
+class SpecProfile:
+    """
+    Metadata specification
+    :param name: profile name, used to label results
+    :param metadata: {path: expected value}
+    :param attributes: {path: {attr: expected value}}
+    :param nxentry_attributes: {attr: expected value} for every NXentry
+    :param nxdata_attributes: {attr: expected value} for every NXdata
+    :param dataset_attributes: {attr: expected value} for every dataset in an NXdata
+    :param nxdetector_data: {name: expected value} for every NXdetector
+    :param description: description of the profile
+    """
+    FIELDS = ('metadata', 'attributes', 'nxentry_attributes', 'nxdata_attributes', 'dataset_attributes',
+              'nxdetector_data')
+
+    def __init__(self, name: str, metadata: dict, attributes: dict | None = None,
+                 nxentry_attributes: dict | None = None, nxdata_attributes: dict | None = None,
+                 dataset_attributes: dict | None = None, nxdetector_data: dict | None = None,
+                 description: str = ''):
+        self.name = name
+        self.description = description
+        self.metadata = metadata
+        self.attributes = attributes or {}
+        self.nxentry_attributes = nxentry_attributes or {}
+        self.nxdata_attributes = nxdata_attributes or {}
+        self.dataset_attributes = dataset_attributes or {}
+        self.nxdetector_data = nxdetector_data or {}
+
+    def __repr__(self):
+        return f"SpecProfile('{self.name}', paths={len(self.metadata)})"
+
+    @functools.cached_property
+    def plan(self) -> PlanNode:
+        """Compiled check plan of the fixed paths, results are keyed by (name, path)"""
+        return compile_plan(self.metadata, self.attributes, tag=self.name)
+
+    @functools.cached_property
+    def _hash(self) -> str:
+        spec = [
+            self.metadata,
+            self.attributes,
+            self.nxdetector_data,
+            self.nxentry_attributes,
+            self.nxdata_attributes,
+            self.dataset_attributes,
+        ]
+        return repr(spec)
+
+    @functools.cached_property
+    def _spec_hashes(self) -> dict[str, str]:
+        return {}  # {link_policy: spec_hash}, filled by spec_hash
+
+    def spec_hash(self, link_policy: str = FOLLOW) -> str:
+        """Return hash of the specification, used to key cached results"""
+        spec_hash = self._spec_hashes.get(link_policy)
+        if spec_hash is None:
+            spec_hash = hashlib.sha1(f"[{link_policy!r}, {self._hash[1:]}".encode()).hexdigest()[:16]
+            self._spec_hashes[link_policy] = spec_hash
+        return spec_hash
+
+    def extend(self, name: str, description: str = '', remove: list[str] = (), **updates: dict) -> 'SpecProfile':
+        """
+        Return new profile based on this one
+        :param name: name of new profile
+        :param description: description of new profile
+        :param remove: paths to remove from metadata and attributes
+        :param updates: fields to add to or replace in each dict, e.g. metadata={path: value}
+        :return: SpecProfile
+        """
+        fields = {}
+        for field in self.FIELDS:
+            values = {key: value for key, value in getattr(self, field).items() if key not in remove}
+            values.update(updates.get(field) or {})
+            fields[field] = values
+        return SpecProfile(name, description=description or self.description, **fields)
+
+    def to_dict(self) -> dict:
+        """Return profile as a dict that can be written as JSON or YAML, attribute values as str"""
+        return {
+            'name': self.name,
+            'description': self.description,
+            **{field: _to_text(getattr(self, field)) for field in self.FIELDS},
+        }
+
+
+def _to_text(value):
+    """Convert bytes in spec values to str"""
+    if isinstance(value, bytes):
+        return value.decode()
+    if isinstance(value, dict):
+        return {key: _to_text(val) for key, val in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_to_text(val) for val in value]
+    return value
+
+
+DEFAULT_PROFILE = SpecProfile(
+    name=metadata.PROFILE_NAME,
+    metadata=metadata.METADATA,
+    attributes=metadata.ATTRIBUTES,
+    nxentry_attributes=metadata.NXENTRY_ATTRIBUTES,
+    nxdata_attributes=metadata.NXDATA_ATTRIBUTES,
+    dataset_attributes=metadata.DATASET_ATTRIBUTES,
+    nxdetector_data=metadata.NXDETECTOR_DATA,
+    description='Diamond standard NeXus structure V2, with NXmx',
+)
+BUILTIN_PROFILES = {DEFAULT_PROFILE.name: DEFAULT_PROFILE}
+
+
+def read_profile_file(filename: str) -> dict:
+    """Read JSON or YAML profile file"""
+    with open(filename) as f:
+        if filename.lower().endswith(('.yaml', '.yml')):
+            try:
+                import yaml
+            except ImportError:
+                raise ImportError(f"PyYAML is required to read '{filename}', use pip install pyyaml")
+            return yaml.safe_load(f) or {}
+        return json.load(f)
+
+
+def _cache_file(filename: str) -> str:
+    return os.path.join(PROFILE_CACHE_DIR, hashlib.sha1(filename.encode()).hexdigest()[:16] + '.pickle')
+
+
+def _file_state(filenames: list[str]) -> list[tuple[str, int, int]]:
+    """Return (filename, size, mtime) of each file, used to check a cached profile is up to date"""
+    return [(filename, os.stat(filename).st_size, os.stat(filename).st_mtime_ns) for filename in filenames]
+
+
+def _parse_profile_file(filename: str) -> tuple[SpecProfile, list[str]]:
+    """Return profile from file and list of files it depends on"""
+    data = read_profile_file(filename)
+    unknown = set(data) - {'name', 'description', 'extends', 'remove', *SpecProfile.FIELDS}
+    if unknown:
+        raise ValueError(f"Unknown fields in spec profile '{filename}': {', '.join(sorted(unknown))}")
+    name = data.get('name') or os.path.splitext(os.path.basename(filename))[0]
+    updates = {field: data.get(field) for field in SpecProfile.FIELDS}
+    base = data.get('extends')
+    if not base:
+        return SpecProfile(name, description=data.get('description', ''), **updates), [filename]
+    if base in BUILTIN_PROFILES:
+        base_profile, files = BUILTIN_PROFILES[base], []
+    else:
+        base_profile, files = _parse_profile_file(os.path.join(os.path.dirname(filename), base))
+    profile = base_profile.extend(name, data.get('description', ''), data.get('remove') or (), **updates)
+    return profile, files + [filename]
+
+
+def load_profile(source: str, use_cache: bool = True) -> SpecProfile:
+    """
+    Return spec profile from built-in name or file
+    Profiles from files are cached, with their compiled plan, until the file or a file it extends changes.
+    :param source: built-in profile name, e.g. 'diamond', or JSON or YAML filename
+    :param use_cache: if False, always read the file
+    :return: SpecProfile
+    """
+    if source in BUILTIN_PROFILES:
+        return BUILTIN_PROFILES[source]
+    if not source.lower().endswith(PROFILE_EXTENSIONS):
+        raise ValueError(f"Unknown spec profile '{source}', use one of {list(BUILTIN_PROFILES)} or a .json/.yaml file")
+    filename = os.path.abspath(source)
+    cache_file = _cache_file(filename)
+    if use_cache and os.path.isfile(cache_file):
+        try:
+            with open(cache_file, 'rb') as f:
+                state, profile = pickle.load(f)
+            if state == _file_state([name for name, size, mtime in state]):
+                return profile
+        except (OSError, pickle.PickleError, EOFError, AttributeError, ValueError):
+            pass
+    profile, files = _parse_profile_file(filename)
+    profile.plan  # compile before caching
+    if use_cache:
+        os.makedirs(PROFILE_CACHE_DIR, exist_ok=True)
+        with open(cache_file, 'wb') as f:
+            pickle.dump((_file_state(files), profile), f)
+    return profile
+
+
+def load_profiles(*sources: str) -> list[SpecProfile]:
+    """
+    Return spec profiles from built-in names or files, the default profile if none given
+    :param sources: built-in profile names or JSON or YAML filenames
+    :return: [SpecProfile, ]
+    """
+    profiles = [load_profile(source) for source in sources] or [DEFAULT_PROFILE]
+    names = [profile.name for profile in profiles]
+    duplicates = {name for name in names if names.count(name) > 1}
+    if duplicates:
+        raise ValueError(f"Spec profile names must be unique: {', '.join(sorted(duplicates))}")
+    return profiles
+
+
+def save_profile(profile: SpecProfile, filename: str):
+    """Write profile to a JSON or YAML file, e.g. to start a new draft from the built-in spec"""
+    data = profile.to_dict()
+    with open(filename, 'w') as f:
+        if filename.lower().endswith(('.yaml', '.yml')):
+            import yaml
+            yaml.safe_dump(data, f, sort_keys=False)
+        else:
+            json.dump(data, f, indent=2)
@@ -0,0 +1,152 @@
+"""
+Per-phase timing and counters
+
+Instrumented code asks for the current profiler and times each phase:
+
+    profiler = get_profiler()
+    with profiler.phase('index'):
+        ...
+    profiler.count('hdf5_objects_opened')
+
+Profiling is off by default, when the current profiler is a no-op and the overhead is a single function call.
+Turn it on for a block of code with:
+
+    with profiling() as profiler:
+        check_file('12345.nxs')
+    print(profiler.report())
+    print(profiler.to_prometheus())
+"""
+
+import time
+import json
+import contextlib
+import contextvars
+import typing
+
+
+class NullProfiler:
+    """Profiler that does nothing, used when profiling is off"""
+    enabled = False
+    _null_context = contextlib.nullcontext()
+
+    def phase(self, name: str) -> typing.ContextManager:
+        return self._null_context
+
+    def count(self, name: str, n: int = 1):
+        pass
+
+
+class Profiler:
+    """
+    Collects the time spent in each named phase and named counters
+    :param callback: function called as callback(phase, seconds) at the end of each phase
+    """
+    enabled = True
+
+    def __init__(self, callback: typing.Callable[[str, float], None] | None = None):
+        self.phases = {}  # {name: [total seconds, calls]}
+        self.counters = {}  # {name: count}
+        self.callbacks = [callback] if callback else []
+
+    def __repr__(self):
+        return f"Profiler(phases={len(self.phases)}, counters={len(self.counters)})"
+
+    def add_callback(self, callback: typing.Callable[[str, float], None]):
+        """Add function called as callback(phase, seconds) at the end of each phase"""
+        self.callbacks.append(callback)
+
+    @contextlib.contextmanager
+    def phase(self, name: str):
+        """Context manager timing a phase"""
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            duration = time.perf_counter() - t0
+            total = self.phases.setdefault(name, [0.0, 0])
+            total[0] += duration
+            total[1] += 1
+            for callback in self.callbacks:
+                callback(name, duration)
+
+    def count(self, name: str, n: int = 1):
+        """Increment counter"""
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def as_dict(self) -> dict:
+        """Return {'phases': {name: {'seconds': s, 'calls': n}}, 'counters': {name: n}}"""
+        return {
+            'phases': {name: {'seconds': seconds, 'calls': calls} for name, (seconds, calls) in self.phases.items()},
+            'counters': dict(self.counters),
+        }
+
+    def merge(self, metrics: dict):
+        """Add metrics from as_dict(), e.g. from another process"""
+        for name, phase in metrics.get('phases', {}).items():
+            total = self.phases.setdefault(name, [0.0, 0])
+            total[0] += phase['seconds']
+            total[1] += phase['calls']
+        for name, count in metrics.get('counters', {}).items():
+            self.count(name, count)
+
+    def to_json(self) -> str:
+        """Return metrics as JSON"""
+        return json.dumps(self.as_dict(), indent=2)
+
+    def to_prometheus(self, prefix: str = 'check_nexus') -> str:
+        """Return metrics in the Prometheus text exposition format"""
+        out = [
+            f"# HELP {prefix}_phase_seconds_total Time spent in each phase",
+            f"# TYPE {prefix}_phase_seconds_total counter",
+        ]
+        out.extend(f'{prefix}_phase_seconds_total{{phase="{name}"}} {seconds:.6f}'
+                   for name, (seconds, calls) in self.phases.items())
+        out.extend([
+            f"# HELP {prefix}_phase_calls_total Number of times each phase ran",
+            f"# TYPE {prefix}_phase_calls_total counter",
+        ])
+        out.extend(f'{prefix}_phase_calls_total{{phase="{name}"}} {calls}'
+                   for name, (seconds, calls) in self.phases.items())
+        for name, count in self.counters.items():
+            out.extend([f"# TYPE {prefix}_{name}_total counter", f"{prefix}_{name}_total {count}"])
+        return '\n'.join(out) + '\n'
+
+    def report(self) -> str:
+        """Return human-readable table of phases and counters"""
+        total = sum(seconds for seconds, calls in self.phases.values()) or 1.0
+        out = f"{'Phase':24} {'Calls':>8} {'Total s':>10} {'Mean ms':>10} {'%':>6}\n"
+        for name, (seconds, calls) in sorted(self.phases.items(), key=lambda item: -item[1][0]):
+            out += f"{name:24} {calls:8} {seconds:10.4f} {1000 * seconds / calls:10.3f} {100 * seconds / total:6.1f}\n"
+        for name, count in self.counters.items():
+            out += f"{name:24} {count:8}\n"
+        return out
+
+    def write(self, filename: str):
+        """Write metrics to file, Prometheus text format if filename ends in .prom, otherwise JSON"""
+        with open(filename, 'w') as f:
+            f.write(self.to_prometheus() if filename.endswith('.prom') else self.to_json())
+
+
+NULL_PROFILER = NullProfiler()
+_current_profiler = contextvars.ContextVar('check_nexus_profiler', default=NULL_PROFILER)
+
+
+def get_profiler() -> Profiler | NullProfiler:
+    """Return current profiler, a NullProfiler if profiling is off"""
+    return _current_profiler.get()
+
+
+@contextlib.contextmanager
+def profiling(profiler: Profiler | None = None):
+    """
+    Context manager turning on profiling in this thread
+        with profiling() as profiler:
+            check_file('12345.nxs')
+    :param profiler: Profiler to collect metrics, or None to create a new one
+    """
+    profiler = profiler or Profiler()
+    token = _current_profiler.set(profiler)
+    try:
+        yield profiler
+    finally:
+        _current_profiler.reset(token)
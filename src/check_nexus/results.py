@@ -0,0 +1,320 @@
+"""
+Structured results of check_metadata and streaming emitters
+
+Results hold the raw values found in the file; text is only formatted when a report is written.
+Emitters write one result at a time, so large batches never need to be held in memory:
+
+    with open_emitter('report.jsonl') as emitter:
+        for result in iter_check_batch(files):
+            emitter.emit(result)
+"""
+
+import csv
+import json
+import typing
+from xml.sax.saxutils import quoteattr
+
+import numpy as np
+
+from .metadata import PROFILE_NAME
+
+# Finding severity
+OK = 'ok'
+WRONG = 'wrong'  # present, but with the wrong NX_class or attribute value
+MISSING = 'missing'
+SEVERITIES = (OK, WRONG, MISSING)
+
+
+class Finding(typing.NamedTuple):
+    """
+    Single check of a path or attribute
+        path: path in the spec
+        attribute: attribute name, '' for a group or dataset
+        kind: 'group', 'dataset', 'external' (not opened), 'attribute', 'link' (dangling),
+            'limit' (part of the file not checked by the streaming check),
+            'shape' or 'values' (consistency checks), '' if the path is missing
+        expected: value in the spec
+        found: NX_class of group, 'dataset', attribute value, link error, shape, or None if missing
+        severity: OK, WRONG or MISSING
+    """
+    path: str
+    attribute: str
+    kind: str
+    expected: typing.Any
+    found: typing.Any
+    severity: str
+
+
+class CheckResult:
+    """
+    Result of checking a single file
+    :param file: NeXus filename
+    :param findings: list of Finding
+    :param duration: time taken to check file in s
+    :param error: error message if the file could not be checked
+    :param profile: metrics from Profiler.as_dict(), if the check was profiled
+    :param spec: name of the spec profile the file was checked against
+    """
+
+    def __init__(self, file: str, findings: list[Finding] | None = None, duration: float = 0, error: str = '',
+                 profile: dict | None = None, spec: str = PROFILE_NAME):
+        self.file = file
+        self.spec = spec
+        self.findings = findings or []
+        self.duration = duration
+        self.error = error
+        self.profile = profile
+        self.n_missing = sum(1 for f in self.findings if f.severity == MISSING and not f.attribute)
+        self.n_missing_attributes = sum(1 for f in self.findings if f.severity == MISSING and f.attribute)
+
+    def __repr__(self):
+        if self.error:
+            return f"CheckResult('{self.file}', spec='{self.spec}', error='{self.error}')"
+        return f"CheckResult('{self.file}', spec='{self.spec}', score={self.score}, findings={len(self.findings)})"
+
+    @property
+    def score(self) -> int:
+        """Score, 100 per missing path, 1 per missing attribute, -1 if the file could not be checked"""
+        if self.error:
+            return -1
+        return 100 * self.n_missing + self.n_missing_attributes
+
+    @property
+    def missing(self) -> list[str]:
+        """List of missing paths, 'path = expected'"""
+        return [
+            f"{f.path} = {f.expected}" for f in self.findings
+            if f.severity == MISSING and not f.attribute
+        ]
+
+    @property
+    def missing_attributes(self) -> list[str]:
+        """List of missing attributes, 'path@attribute = expected'"""
+        return [
+            f"{f.path}@{f.attribute} = {f.expected}" for f in self.findings
+            if f.severity == MISSING and f.attribute
+        ]
+
+    def summary(self) -> 'CheckResult':
+        """Return copy of result without the list of findings, keeping the score"""
+        result = CheckResult(self.file, duration=self.duration, error=self.error, spec=self.spec)
+        result.n_missing = self.n_missing
+        result.n_missing_attributes = self.n_missing_attributes
+        return result
+
+    def report(self) -> str:
+        """Return human-readable report"""
+        return '\n'.join(self.report_lines())
+
+    def report_lines(self) -> list[str]:
+        """Return human-readable report, as a list of log messages"""
+        out = [f"\nFile: {self.file}"]
+        if self.spec != PROFILE_NAME:
+            out.append(f"Spec: {self.spec}")
+        if self.error:
+            out.append(f"Error: {self.error}")
+        for f in self.findings:
+            isgood = f.severity == OK
+            if f.attribute and f.found is None:
+                out.append(f"  @{f.attribute} Missing, Should be {f.expected}")
+            elif f.attribute:
+                out.append(f"  @{f.attribute} = {f.found} {'' if isgood else f'(Should be {f.expected})'}")
+            elif f.kind == 'group':
+                out.append(f"{f.path}: NX_class = {f.found} {'' if isgood else f'!Should be {f.expected}!'}")
+            elif f.kind == 'dataset':
+                out.append(f"{f.path} = {f.expected}")
+            elif f.kind == 'external':
+                out.append(f"{f.path} = {f.expected} (external, not opened)")
+            elif f.kind in ('shape', 'values'):
+                out.append(f"{f.path}: {f.kind} = {to_text(f.found)} {'' if isgood else f'!Should be {f.expected}!'}")
+            elif f.kind == 'link':
+                out.append(f"{f.path}: dangling link to {f.expected} ({f.found})")
+            elif f.kind == 'limit':
+                out.append(f"{f.path}: {f.found}, {f.expected}")
+        out.extend(['\nMissing fields:', '\n'.join(self.missing)])
+        out.extend(['\nMissing attributes:', '\n'.join(self.missing_attributes)])
+        return out
+
+
+def to_text(value) -> str:
+    """Convert value from spec or file to text"""
+    if value is None:
+        return ''
+    if isinstance(value, bytes):
+        return value.decode(errors='replace')
+    if isinstance(value, (list, tuple, np.ndarray)):
+        return ', '.join(to_text(val) for val in value)
+    return str(value)
+
+
+class Emitter:
+    """
+    Base class of result emitters, writes results to a text stream one at a time
+    :param stream: open text stream, e.g. sys.stdout or open('file', 'w')
+    :param severities: only write findings with these severities, default all
+    :param close_stream: if True, close the stream when the emitter is closed
+    """
+    def __init__(self, stream: typing.TextIO, severities: typing.Iterable[str] = SEVERITIES,
+                 close_stream: bool = False):
+        self.stream = stream
+        self.severities = set(severities)
+        self.close_stream = close_stream
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def findings(self, result: CheckResult) -> typing.Iterator[Finding]:
+        return (f for f in result.findings if f.severity in self.severities)
+
+    def emit(self, result: CheckResult):
+        raise NotImplementedError
+
+    def close(self):
+        """Finish writing, closing the stream if it was opened by open_emitter"""
+        self.stream.flush()
+        if self.close_stream:
+            self.stream.close()
+
+
+class TextEmitter(Emitter):
+    """Write human-readable reports"""
+    def emit(self, result: CheckResult):
+        self.stream.write(result.report() + '\n')
+
+
+class JsonLinesEmitter(Emitter):
+    """Write each result as a line of JSON"""
+    def emit(self, result: CheckResult):
+        record = {
+            'file': result.file,
+            'spec': result.spec,
+            'score': result.score,
+            'duration': result.duration,
+            'error': result.error,
+            'findings': [
+                {
+                    'path': f.path,
+                    'attribute': f.attribute,
+                    'kind': f.kind,
+                    'expected': to_text(f.expected),
+                    'found': None if f.found is None else to_text(f.found),
+                    'severity': f.severity,
+                } for f in self.findings(result)
+            ]
+        }
+        self.stream.write(json.dumps(record) + '\n')
+
+
+class CsvEmitter(Emitter):
+    """Write each finding as a row of CSV"""
+    HEADER = ['file', 'path', 'attribute', 'kind', 'expected', 'found', 'severity', 'duration', 'error', 'spec']
+
+    def __init__(self, stream: typing.TextIO, severities: typing.Iterable[str] = SEVERITIES,
+                 close_stream: bool = False):
+        super().__init__(stream, severities, close_stream)
+        self.writer = csv.writer(stream)
+        if not (stream.seekable() and stream.tell() > 0):  # no header when appending to an existing report
+            self.writer.writerow(self.HEADER)
+
+    def emit(self, result: CheckResult):
+        if result.error:
+            self.writer.writerow(
+                [result.file, '', '', '', '', '', 'error', result.duration, result.error, result.spec]
+            )
+        self.writer.writerows(
+            [result.file, f.path, f.attribute, f.kind, to_text(f.expected),
+             '' if f.found is None else to_text(f.found), f.severity, result.duration, '', result.spec]
+            for f in self.findings(result)
+        )
+
+
+class JUnitEmitter(Emitter):
+    """Write JUnit XML, one testsuite per file and one testcase per finding"""
+
+    def __init__(self, stream: typing.TextIO, severities: typing.Iterable[str] = SEVERITIES,
+                 close_stream: bool = False):
+        super().__init__(stream, severities, close_stream)
+        self.stream.write('<?xml version="1.0" encoding="UTF-8"?>\n<testsuites name="check_nexus">\n')
+
+    def emit(self, result: CheckResult):
+        findings = list(self.findings(result))
+        failures = sum(1 for f in findings if f.severity != OK)
+        self.stream.write(
+            f'  <testsuite name={quoteattr(result.file)} tests="{len(findings)}" failures="{failures}" '
+            f'errors="{1 if result.error else 0}" time="{result.duration:.6f}">\n'
+            f'    <properties><property name="spec" value={quoteattr(result.spec)}/></properties>\n'
+        )
+        if result.error:
+            self.stream.write(
+                f'    <testcase classname={quoteattr(result.file)} name="open">'
+                f'<error message={quoteattr(result.error)}/></testcase>\n'
+            )
+        for f in findings:
+            name = f"{f.path}@{f.attribute}" if f.attribute else f.path
+            self.stream.write(f'    <testcase classname={quoteattr(result.file)} name={quoteattr(name)}>')
+            if f.severity != OK:
+                message = f"expected: {to_text(f.expected)}, found: {to_text(f.found) or 'missing'}"
+                self.stream.write(f'<failure type="{f.severity}" message={quoteattr(message)}/>')
+            self.stream.write('</testcase>\n')
+        self.stream.write('  </testsuite>\n')
+
+    def close(self):
+        self.stream.write('</testsuites>\n')
+        super().close()
+
+
+EMITTERS = {
+    'text': TextEmitter,
+    'jsonl': JsonLinesEmitter,
+    'csv': CsvEmitter,
+    'junit': JUnitEmitter,
+}
+EXTENSIONS = {
+    '.txt': 'text',
+    '.log': 'text',
+    '.jsonl': 'jsonl',
+    '.json': 'jsonl',
+    '.csv': 'csv',
+    '.xml': 'junit',
+}
+
+
+def output_format(filename: str, fmt: str | None = None, append: bool = False) -> str:
+    """
+    Return output format of filename
+    :param filename: output filename, format is determined from the extension if fmt is None
+    :param fmt: 'text', 'jsonl', 'csv' or 'junit'
+    :param append: if True, the format must allow results to be added to an existing file
+    :return: format name, a key of EMITTERS
+    :raises ValueError: if the format is unknown, or can't be appended to
+    """
+    if fmt is None:
+        ext = filename[filename.rfind('.'):].lower() if '.' in filename else ''
+        if ext not in EXTENSIONS:
+            raise ValueError(f"Unknown output format for '{filename}', use one of {', '.join(EXTENSIONS)} "
+                             f"or --format {'|'.join(EMITTERS)}")
+        fmt = EXTENSIONS[ext]
+    if fmt not in EMITTERS:
+        raise ValueError(f"Unknown output format '{fmt}', use one of {', '.join(EMITTERS)}")
+    if append and fmt == 'junit':
+        raise ValueError("JUnit XML reports can't be appended to, use 'text', 'jsonl' or 'csv'")
+    return fmt
+
+
+def open_emitter(filename: str, fmt: str | None = None, severities: typing.Iterable[str] = SEVERITIES,
+                 append: bool = False) -> Emitter:
+    """
+    Open file and return emitter
+    :param filename: output filename, format is determined from the extension if fmt is None
+    :param fmt: 'text', 'jsonl', 'csv' or 'junit'
+    :param severities: only write findings with these severities, default all
+    :param append: if True, add results to the end of an existing file (not available for 'junit')
+    :return: Emitter
+    :raises ValueError: if the format is unknown, see output_format
+    """
+    fmt = output_format(filename, fmt, append)
+    stream = open(filename, 'a' if append else 'w', newline='' if fmt == 'csv' else None)
+    return EMITTERS[fmt](stream, severities, close_stream=True)
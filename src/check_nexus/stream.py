@@ -0,0 +1,408 @@
+"""
+Streaming check with bounded memory
+
+check_profiles indexes every link in the file, then builds the spec of the file, with an entry for every dataset in
+every NXdata group, before anything is checked. For files with very large NXdata groups or thousands of detector
+groups both grow with the file. The streaming check walks the file depth first instead, checking each NXentry,
+NXdata and NXdetector group and each NXdata dataset as it is reached, and yields findings as it goes:
+
+    for spec, finding in iter_file_findings('12345.nxs'):
+        ...
+    result, = check_streaming('12345.nxs', limits=StreamLimits(max_depth=8, max_objects=100_000))
+
+Link names are read LINK_BATCH at a time, so the walk holds at most one batch of names for each level of groups it
+is inside. Groups below max_depth aren't entered and the walk stops after max_objects links, either is reported
+as a 'limit' finding. Otherwise the findings are the same as check_profiles, in a different order. Layouts aren't
+reused, as the layout holds the results of every path.
+"""
+
+import time
+import typing
+import logging
+
+import h5py
+from h5py import h5l, h5o
+
+from .plan import EXTERNAL, encode_attribute, object_kind, check_attributes, read_nx_class, merge_plans, run_plan
+from .profiles import SpecProfile, DEFAULT_PROFILE
+from .links import MAX_SOFTLINK_DEPTH, FOLLOW, ExternalLinks, external_link_targets
+from .consistency import check_scan_shape, check_detector_data
+from .check import path_findings
+from .results import CheckResult, Finding, OK, WRONG
+from .profiling import get_profiler
+
+logger = logging.getLogger(__name__)
+
+MAX_DEPTH = 32  # levels of groups entered
+MAX_OBJECTS = 10_000_000  # links visited before the walk stops
+LINK_BATCH = 256  # link names read from a group at a time
+
+
+class StreamLimits(typing.NamedTuple):
+    """Limits of the walk of the streaming check"""
+    max_depth: int = MAX_DEPTH
+    max_objects: int = MAX_OBJECTS
+
+
+class Link(typing.NamedTuple):
+    """
+    Link visited by FileWalk
+        path: path of the link, without a leading '/'
+        kind: 'group', 'dataset', 'datatype', 'external' or 'dangling', as check.build_nxclass_index
+        nx_class: NX_class of a group, otherwise ''
+        target: path of the object, or of the external link, after following soft links,
+            or the target of a dangling link
+        entered: True if the links in the group will be visited next
+    """
+    path: str
+    kind: str
+    nx_class: str
+    target: str
+    entered: bool = False
+
+
+def iter_group_links(group: h5py.Group, batch: int = LINK_BATCH) -> typing.Iterator[tuple[str, int]]:
+    """
+    Yield name and link type of each link in a group, in name order, reading batch names at a time
+    :param group: h5py.Group
+    :param batch: number of names read at a time
+    :return: generator of (name, h5l.TYPE_HARD | TYPE_SOFT | TYPE_EXTERNAL)
+    """
+    names = []
+
+    def collect(name: bytes, info):
+        names.append((name, info.type))
+        return len(names) >= batch or None
+
+    n_links, idx = len(group), 0
+    while idx < n_links:
+        names.clear()
+        stop, idx = group.id.links.iterate(collect, idx=idx, info=True)
+        for name, link_type in names:
+            yield name.decode('utf-8', 'surrogateescape'), link_type
+        if not stop:
+            break
+
+
+class FileWalk:
+    """
+    Depth-first walk of the links in a file, visiting the same links as check.build_nxclass_index
+    Soft links are followed to classify them, but only groups reached through hard links are entered. As in
+    H5Lvisit, groups with more than one hard link are only entered once, so only the addresses of those are kept.
+        walk = FileWalk(nxs, max_depth=8)
+        for link in walk:
+            print(link.path, link.kind, link.nx_class)
+        print(walk.n_links, walk.n_skipped)
+    :param hdf_file: open h5py.File
+    :param max_depth: groups below this depth aren't entered
+    :param max_objects: the walk stops after this many links
+    :param batch: number of link names read from a group at a time
+    """
+
+    def __init__(self, hdf_file: h5py.File, max_depth: int = MAX_DEPTH, max_objects: int = MAX_OBJECTS,
+                 batch: int = LINK_BATCH):
+        self.hdf_file = hdf_file
+        self.max_depth = max_depth
+        self.max_objects = max_objects
+        self.batch = batch
+        self.n_links = 0
+        self.n_skipped = 0  # groups below max_depth that weren't entered
+        self.stopped_at = ''  # path of the last link visited, if the walk stopped at max_objects
+        self._entered = set()  # addresses of groups with several hard links that have been entered
+
+    def __repr__(self):
+        return f"FileWalk(max_depth={self.max_depth}, max_objects={self.max_objects}, links={self.n_links})"
+
+    def classify(self, path: str, link_type: int | None = None, parent: h5py.Group | None = None) -> Link:
+        """
+        Return Link of path, following soft links within the file
+        :param path: path in the file
+        :param link_type: h5l link type, if known
+        :param parent: group holding the link, if known, so hard links are found without resolving the path
+        """
+        target = path
+        if link_type == h5l.TYPE_EXTERNAL:
+            return Link(path, 'external', '', target)
+        if link_type == h5l.TYPE_HARD and parent is not None:
+            name = path.rpartition('/')[2].encode('utf-8', 'surrogateescape')
+            obj_type = h5o.get_info(parent.id, name).type
+            if obj_type == h5o.TYPE_GROUP:
+                return Link(path, 'group', read_nx_class(h5py.Group(h5o.open(parent.id, name))), target)
+            return Link(path, 'dataset' if obj_type == h5o.TYPE_DATASET else 'datatype', '', target)
+        if link_type != h5l.TYPE_HARD:
+            link = self.hdf_file.get(path, getlink=True)
+            first = link.path if isinstance(link, h5py.SoftLink) else ''
+            for _ in range(MAX_SOFTLINK_DEPTH):
+                if not isinstance(link, h5py.SoftLink):
+                    break
+                target = link.path
+                link = self.hdf_file.get(target, getlink=True)
+            if link is None or isinstance(link, h5py.SoftLink):
+                return Link(path, 'dangling', '', first)
+            if isinstance(link, h5py.ExternalLink):
+                return Link(path, 'external', '', target.strip('/'))
+        obj_class = self.hdf_file.get(target, getclass=True)
+        if obj_class is h5py.Group:
+            return Link(path, 'group', read_nx_class(self.hdf_file[target]), target)
+        if obj_class is h5py.Dataset:
+            return Link(path, 'dataset', '', target)
+        return Link(path, 'datatype', '', target)
+
+    def _enter(self, group: h5py.Group) -> bool:
+        """Return True if the group hasn't been entered through another hard link"""
+        info = h5o.get_info(group.id)
+        if info.rc <= 1:
+            return True
+        if info.addr in self._entered:
+            return False
+        self._entered.add(info.addr)
+        return True
+
+    def __iter__(self) -> typing.Iterator[Link]:
+        profiler = get_profiler()
+        stack = [('', self.hdf_file, iter_group_links(self.hdf_file, self.batch))]
+        while stack:
+            parent, parent_group, links = stack[-1]
+            for name, link_type in links:
+                path = f"{parent}/{name}" if parent else name
+                self.n_links += 1
+                profiler.count('links_walked')
+                if self.n_links > self.max_objects:
+                    self.stopped_at = path
+                    return
+                link = self.classify(path, link_type, parent_group)
+                if link.kind == 'group' and link_type == h5l.TYPE_HARD:
+                    if len(stack) >= self.max_depth:
+                        self.n_skipped += 1
+                    else:
+                        group = parent_group[name]
+                        if self._enter(group):
+                            yield link._replace(entered=True)
+                            stack.append((path, group, iter_group_links(group, self.batch)))
+                            break
+                yield link
+            else:
+                stack.pop()
+
+
+def _encode(attributes: dict) -> dict:
+    return {attr: (value, encode_attribute(value)) for attr, value in attributes.items()}
+
+
+def resolve(nxs: h5py.File, path: str, links: ExternalLinks) -> tuple[str, str, h5py.Group | h5py.Dataset | str | None]:
+    """
+    Return kind, NX_class and object at path, as run_plan, without listing the groups on the way
+    :param nxs: open h5py.File
+    :param path: path in the file
+    :param links: ExternalLinks of the file
+    :return: kind, nx_class, object - kind is 'group', 'dataset', 'external' or 'missing'
+    """
+    obj, current = nxs, ''
+    for name in path.strip('/').split('/'):
+        if name in ('', '.'):
+            continue
+        current = f"{current}/{name}" if current else name
+        if obj == EXTERNAL:
+            continue
+        if not isinstance(obj, h5py.Group) or name not in obj:
+            obj = None
+            break
+        if links.is_external(current):
+            if links.error(current):
+                obj = None
+                break
+            obj = links.open(current) if links.policy == FOLLOW else EXTERNAL
+        else:
+            obj = obj.get(name)
+    kind, nx_class = object_kind(obj, current, links)
+    return kind, nx_class, obj
+
+
+class _ProfileChecks:
+    """Spec of the groups of a profile, with the attributes encoded once"""
+
+    def __init__(self, profile: SpecProfile):
+        self.name = profile.name
+        self.profile = profile
+        self.nxentry_attributes = _encode(profile.nxentry_attributes)
+        self.nxdata_attributes = _encode(profile.nxdata_attributes)
+        self.dataset_attributes = _encode(profile.dataset_attributes)
+        self.replaced = set()  # paths of the profile metadata replaced by the groups found, at most len(metadata)
+
+    def findings(self, nxs: h5py.File, links: ExternalLinks, path: str, value, attrs: dict,
+                 obj=None) -> list[Finding]:
+        """Return findings of path, resolving it if obj isn't given"""
+        if path in self.profile.metadata:
+            self.replaced.add(path)
+        if obj is None:
+            kind, nx_class, obj = resolve(nxs, path, links)
+        else:
+            kind, nx_class = object_kind(obj, path, links)
+        found_attrs = check_attributes(obj, attrs) if kind in ('group', 'dataset') and attrs else {}
+        return path_findings(path, value, (kind, nx_class, found_attrs))
+
+
+def _nxdata_names(group: h5py.Group) -> tuple[str | None, list[str]]:
+    """Return signal and axes names of an NXdata group"""
+    signal = group.attrs.get('signal')
+    axes = group.attrs.get('axes', None)
+    return (signal.decode() if signal else None), ([axis.decode() for axis in axes] if axes is not None else [])
+
+
+def iter_findings(nxs: h5py.File, links: ExternalLinks, profiles: list[SpecProfile] = (DEFAULT_PROFILE,),
+                  limits: StreamLimits = StreamLimits()) -> typing.Iterator[tuple[str, Finding]]:
+    """
+    Check an open file against every profile in a single walk, yielding each finding as it is made
+    Soft links that resolve to external links are added to links.aliases as they are found.
+    :param nxs: open h5py.File
+    :param links: ExternalLinks of the file, with the aliases of the external links in the file
+    :param profiles: [SpecProfile, ], with unique names
+    :param limits: StreamLimits of the walk
+    :return: generator of (profile name, Finding)
+    """
+    checks = [_ProfileChecks(profile) for profile in profiles]
+    walk = FileWalk(nxs, limits.max_depth, limits.max_objects)
+    nxdata_stack = []  # [(path, signal, axes), ] NXdata groups the walk is inside
+
+    def shared(findings: list[Finding]) -> typing.Iterator[tuple[str, Finding]]:
+        for check in checks:
+            for finding in findings:
+                yield check.name, finding
+
+    for link in walk:
+        if link.kind == 'external':
+            links.aliases.setdefault(link.path, link.target)
+        parent = link.path.rpartition('/')[0]
+        while nxdata_stack and not (parent == nxdata_stack[-1][0] or parent.startswith(nxdata_stack[-1][0] + '/')):
+            nxdata_stack.pop()
+
+        if link.kind == 'dangling':
+            yield from shared([Finding(link.path, '', 'link', link.target, 'no object at target', WRONG)])
+
+        elif nxdata_stack and nxdata_stack[-1][0] == parent and link.kind in ('dataset', 'external'):
+            path, signal, axes = nxdata_stack[-1]
+            name = link.path.rpartition('/')[2]
+            value = '@axes, nd array' if name in axes else '@signal, nd array' if name == signal else 'nd array'
+            obj = nxs[link.target] if link.kind == 'dataset' else None
+            for check in checks:
+                for finding in check.findings(nxs, links, link.path, value, check.dataset_attributes, obj):
+                    yield check.name, finding
+
+        if link.kind != 'group':
+            continue
+        group = nxs[link.target]
+        if link.nx_class == 'NXentry':
+            default = group.attrs.get('default', None)
+            default_path = f"{link.path}/{default.decode()}" if default else None
+            for check in checks:
+                for finding in check.findings(nxs, links, link.path, 'NXentry', check.nxentry_attributes, group):
+                    yield check.name, finding
+            if default_path:
+                kind, nx_class, obj = resolve(nxs, default_path, links)
+                if not (link.entered and kind == 'group' and nx_class == 'NXdata'):  # else checked when reached
+                    for check in checks:
+                        for finding in check.findings(nxs, links, default_path, 'NXdata', {}, obj):
+                            yield check.name, finding
+                    if kind == 'group':
+                        yield from shared(check_scan_shape(nxs, [default_path.strip('/')], links))
+
+        elif link.nx_class == 'NXdata':
+            signal, axes = _nxdata_names(group)
+            for check in checks:
+                attrs = check.nxdata_attributes
+                for finding in check.findings(nxs, links, link.path, 'NXdata', attrs, group):
+                    yield check.name, finding
+            # signal and axes datasets in a group that is entered are checked when they are reached
+            names = {name: '@signal, nd array' for name in ([signal] if signal else [])}
+            names.update({name: '@axes, nd array' for name in axes})
+            for name, value in names.items():
+                path = f"{link.path}/{name}"
+                child = walk.classify(path) if name != '.' and name in group else None
+                if child is not None and child.kind == 'external':  # alias needed to check the shapes
+                    links.aliases.setdefault(path, child.target)
+                if link.entered and child is not None and child.kind in ('dataset', 'external'):
+                    continue
+                for check in checks:
+                    for finding in check.findings(nxs, links, path, value, {}):
+                        yield check.name, finding
+            yield from shared(check_scan_shape(nxs, [link.path], links))
+            if link.entered:
+                nxdata_stack.append((link.path, signal, axes))
+
+        elif link.nx_class == 'NXdetector':
+            for check in checks:
+                for finding in check.findings(nxs, links, link.path, 'NXdetector', {}, group):
+                    yield check.name, finding
+                for name, example in check.profile.nxdetector_data.items():
+                    for finding in check.findings(nxs, links, f"{link.path}/{name}", example, {}):
+                        yield check.name, finding
+            yield from shared(check_detector_data(nxs, [link.path], links))
+
+    if walk.n_skipped:
+        yield from shared([Finding('/', '', 'limit', f"max_depth = {limits.max_depth}",
+                                   f"{walk.n_skipped} groups not entered", WRONG)])
+    if walk.stopped_at:
+        yield from shared([Finding(walk.stopped_at, '', 'limit', f"max_objects = {limits.max_objects}",
+                                   'walk stopped', WRONG)])
+
+    # paths of the profiles that weren't replaced by the groups found, in a single pass over the file
+    with get_profiler().phase('resolve'):
+        results = run_plan(nxs, merge_plans(*(profile.plan for profile in profiles)), links, list_groups=False)
+    consistency = set()
+    for check in checks:
+        for path, value in check.profile.metadata.items():
+            if path in check.replaced:
+                continue
+            yield from ((check.name, finding) for finding in path_findings(path, value, results[check.name, path]))
+            kind, nx_class, found_attrs = results[check.name, path]
+            if check is checks[0] and value in ('NXdata', 'NXdetector') and kind == 'group' and nx_class != value:
+                consistency.add((path.strip('/'), value))  # not checked during the walk
+    for path, value in sorted(consistency):
+        if value == 'NXdata':
+            yield from shared(check_scan_shape(nxs, [path], links))
+        else:
+            yield from shared(check_detector_data(nxs, [path], links))
+    yield from shared([Finding(path, '', 'link', target, error, WRONG) for path, (target, error) in links.dangling.items()])
+
+
+def iter_file_findings(file: str, profiles: list[SpecProfile] | None = None, link_policy: str = FOLLOW,
+                       limits: StreamLimits = StreamLimits()) -> typing.Iterator[tuple[str, Finding]]:
+    """
+    Open file and yield each finding of the streaming check as it is made, see iter_findings
+    :param file: NeXus .nxs filename
+    :param profiles: [SpecProfile, ] with unique names, default is the Diamond spec
+    :param link_policy: how external files are checked, 'follow', 'verify' or 'none', see links.py
+    :param limits: StreamLimits of the walk
+    :return: generator of (profile name, Finding)
+    """
+    profiles = list(profiles or [DEFAULT_PROFILE])
+    profiler = get_profiler()
+    with profiler.phase('open'):
+        nxs = h5py.File(file, 'r')
+    with nxs:
+        with profiler.phase('index'):
+            targets = external_link_targets(nxs)  # only the external links, to stat their files up front
+        with ExternalLinks(nxs, {path: path for path in targets}, link_policy, targets=targets) as links:
+            yield from iter_findings(nxs, links, profiles, limits)
+
+
+def check_streaming(file: str, profiles: list[SpecProfile] | None = None, link_policy: str = FOLLOW,
+                    limits: StreamLimits = StreamLimits(), keep_ok: bool = False) -> list[CheckResult]:
+    """
+    Check metadata of file against several spec profiles, with memory that doesn't grow with the file
+    OK findings are counted but not kept, unless keep_ok is True.
+    :param file: NeXus .nxs filename
+    :param profiles: [SpecProfile, ] with unique names, from profiles.load_profiles, default is the Diamond spec
+    :param link_policy: how external files are checked, 'follow', 'verify' or 'none', see links.py
+    :param limits: StreamLimits of the walk
+    :param keep_ok: if True, keep every finding, as check_profiles
+    :return: [CheckResult, ] one per profile, with CheckResult.spec set to the profile name
+    """
+    t0 = time.perf_counter()
+    profiles = list(profiles or [DEFAULT_PROFILE])
+    findings = {profile.name: [] for profile in profiles}
+    for name, finding in iter_file_findings(file, profiles, link_policy, limits):
+        if keep_ok or finding.severity != OK:
+            findings[name].append(finding)
+    duration = time.perf_counter() - t0
+    return [CheckResult(file, findings[name], duration, spec=name) for name in findings]
@@ -0,0 +1,254 @@
+"""
+Columnar summary of batch results, for queries across many scans
+
+Reports hold a list of findings per file, so finding every scan without /entry/sample/ub_matrix means reading
+every report. The summary store keeps one status matrix of spec key x file instead, with an index of the files,
+in a single HDF5 file:
+
+    /keys       - spec keys: 'path', 'path@attribute', or 'path:kind' for shape, values, link and limit findings
+    /status     - uint8 (keys, files): 0 ok or not in the spec of the file, 1 wrong, 2 missing
+    /files/     - file index: path, spec, visit, score, checked (unix time), error
+
+The whole store is loaded into memory (20k files of 500 keys is 10 MB), so queries are numpy operations:
+
+    with SummaryStore('visits.h5') as store:
+        for result in iter_check_batch(files):
+            store.add(result)
+    store = SummaryStore('visits.h5')
+    store.files_with('/entry/sample/ub_matrix')
+    store.counts()[:10]
+    store.trend('/entry/sample/ub_matrix')
+
+Only findings that aren't OK are recorded, so results from a new check and from the cache give the same store.
+"""
+
+import os
+import time
+import typing
+
+import h5py
+import numpy as np
+
+from .results import CheckResult, Finding, OK, WRONG, MISSING
+
+STATUS_CODES = {OK: 0, WRONG: 1, MISSING: 2}
+FORMAT_VERSION = 1
+FILE_COLUMNS = ('path', 'spec', 'visit', 'score', 'checked', 'error')
+FILE_DTYPES = {'score': np.int32, 'checked': np.float64}  # other columns are str
+
+
+def finding_key(finding: Finding) -> str:
+    """Return key of the finding in the summary store"""
+    if finding.attribute:
+        return f"{finding.path}@{finding.attribute}"
+    if finding.kind in ('shape', 'values', 'link', 'limit'):
+        return f"{finding.path}:{finding.kind}"
+    return finding.path
+
+
+def visit_name(file: str) -> str:
+    """Return visit of a scan file, the name of the folder it is in, e.g. 'mm12345-1'"""
+    return os.path.basename(os.path.dirname(os.path.abspath(file)))
+
+
+class SummaryStore:
+    """
+    Spec key x file status matrix, stored in an HDF5 file
+    New results are added in memory, and written to the file by save() or at the end of a with block.
+    A file checked again against the same spec replaces its previous result.
+    :param filename: HDF5 filename, loaded if it exists
+    """
+
+    def __init__(self, filename: str):
+        self.filename = filename
+        self.keys = []  # [key, ]
+        self.key_index = {}  # {key: row}
+        self.status = np.zeros((0, 0), dtype=np.uint8)
+        self.files = {name: [] for name in FILE_COLUMNS}
+        self.file_index = {}  # {(path, spec): column}
+        self._pending = []  # [(file row, {key: code}), ] added since the matrix was last built
+        self._columns = {}  # {name: array} of file index columns, for queries
+        if os.path.isfile(filename):
+            self.load()
+
+    def __repr__(self):
+        return f"SummaryStore('{self.filename}', keys={len(self.keys)}, files={self.n_files})"
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.save()
+
+    @property
+    def n_files(self) -> int:
+        return len(self.files['path']) + len(self._pending)
+
+    def load(self):
+        """Read store from file"""
+        with h5py.File(self.filename, 'r') as hdf:
+            version = hdf.attrs.get('format_version', 0)
+            if version != FORMAT_VERSION:
+                raise ValueError(f"'{self.filename}' has summary format {version}, expected {FORMAT_VERSION}")
+            self.keys = list(hdf['keys'].asstr()[()])
+            self.status = hdf['status'][()]
+            for name in FILE_COLUMNS:
+                dataset = hdf['files'][name]
+                values = dataset.asstr()[()] if dataset.dtype.kind == 'O' else dataset[()]
+                self.files[name] = list(values)
+        self.key_index = {key: row for row, key in enumerate(self.keys)}
+        self.file_index = {(path, spec): col for col, (path, spec) in enumerate(zip(self.files['path'],
+                                                                                   self.files['spec']))}
+        self._pending = []
+        self._columns = {}
+
+    def save(self):
+        """Write store to file, replacing it"""
+        self._build()
+        os.makedirs(os.path.dirname(os.path.abspath(self.filename)), exist_ok=True)
+        tmp = f"{self.filename}.tmp{os.getpid()}"
+        string = h5py.string_dtype()
+        with h5py.File(tmp, 'w') as hdf:
+            hdf.attrs['format_version'] = FORMAT_VERSION
+            hdf.create_dataset('keys', data=np.array(self.keys, dtype=object), dtype=string)
+            compression = 'lzf' if self.status.size else None  # empty datasets can't be chunked
+            hdf.create_dataset('status', data=self.status, compression=compression)
+            files = hdf.create_group('files')
+            for name in FILE_COLUMNS:
+                dtype = FILE_DTYPES.get(name, string)
+                files.create_dataset(name, data=np.array(self.files[name], dtype=dtype), dtype=dtype)
+        os.replace(tmp, self.filename)
+
+    def add(self, result: CheckResult):
+        """Add result of check_file, replacing any earlier result of the same file and spec"""
+        codes = {}
+        for finding in result.findings:
+            code = STATUS_CODES.get(finding.severity, 0)
+            if code:
+                key = finding_key(finding)
+                codes[key] = max(code, codes.get(key, 0))
+        row = {
+            'path': os.path.abspath(result.file),
+            'spec': result.spec,
+            'visit': visit_name(result.file),
+            'score': result.score,
+            'checked': time.time(),
+            'error': result.error,
+        }
+        self._pending.append((row, codes))
+
+    def _build(self):
+        """Add pending results to the matrix"""
+        if not self._pending:
+            return
+        for row, codes in self._pending:
+            for key in codes:
+                if key not in self.key_index:
+                    self.key_index[key] = len(self.keys)
+                    self.keys.append(key)
+        new_files = {(row['path'], row['spec']) for row, codes in self._pending} - set(self.file_index)
+        n_files = len(self.files['path']) + len(new_files)
+        status = np.zeros((len(self.keys), n_files), dtype=np.uint8)
+        status[:self.status.shape[0], :self.status.shape[1]] = self.status
+        for row, codes in self._pending:
+            file_key = (row['path'], row['spec'])
+            if file_key in self.file_index:
+                col = self.file_index[file_key]
+                for name in FILE_COLUMNS:
+                    self.files[name][col] = row[name]
+                status[:, col] = 0
+            else:
+                col = self.file_index[file_key] = len(self.files['path'])
+                for name in FILE_COLUMNS:
+                    self.files[name].append(row[name])
+            for key, code in codes.items():
+                status[self.key_index[key], col] = code
+        self.status = status
+        self._pending = []
+        self._columns = {}
+
+    def column(self, name: str) -> np.ndarray:
+        """Return column of the file index as an array, e.g. 'path', 'visit' or 'score'"""
+        self._build()
+        if name not in self._columns:
+            self._columns[name] = np.array(self.files[name], dtype=FILE_DTYPES.get(name, object))
+        return self._columns[name]
+
+    def select(self, spec: str | None = None, visit: str | None = None) -> np.ndarray:
+        """
+        Return boolean mask of files
+        :param spec: only files checked against this spec profile
+        :param visit: only files in this visit
+        :return: bool array (files,)
+        """
+        self._build()
+        mask = np.ones(len(self.files['path']), dtype=bool)
+        if spec is not None:
+            mask &= self.column('spec') == spec
+        if visit is not None:
+            mask &= self.column('visit') == visit
+        return mask
+
+    def matrix(self, severity: str = MISSING) -> np.ndarray:
+        """Return boolean matrix (keys, files), True where the finding has this severity"""
+        self._build()
+        return self.status == STATUS_CODES[severity]
+
+    def files_with(self, key: str, severity: str = MISSING, spec: str | None = None,
+                   visit: str | None = None) -> list[str]:
+        """
+        Return files where key has severity, e.g. the files missing a path
+        :param key: 'path', 'path@attribute' or 'path:kind', see finding_key
+        :param severity: MISSING or WRONG
+        :param spec: only files checked against this spec profile
+        :param visit: only files in this visit
+        :return: [filename, ]
+        """
+        mask = self.select(spec, visit)
+        if key not in self.key_index:
+            return []
+        mask &= self.status[self.key_index[key]] == STATUS_CODES[severity]
+        return list(self.column('path')[mask])
+
+    def counts(self, severity: str = MISSING, spec: str | None = None,
+               visit: str | None = None) -> list[tuple[str, int]]:
+        """
+        Return number of files with each key at severity, most frequent first
+        :return: [(key, number of files), ] excluding keys with no files
+        """
+        mask = self.select(spec, visit)
+        status = self.status if mask.all() else self.status[:, mask]
+        counts = np.count_nonzero(status == STATUS_CODES[severity], axis=1)
+        order = np.argsort(-counts, kind='stable')
+        return [(self.keys[row], int(counts[row])) for row in order if counts[row]]
+
+    def trend(self, key: str, severity: str = MISSING, spec: str | None = None) -> list[tuple[str, int, int]]:
+        """
+        Return number of files with key at severity in each visit, in the order the visits were checked
+        :return: [(visit, number of files with key at severity, number of files), ]
+        """
+        mask = self.select(spec)
+        if not mask.any():
+            return []
+        visits, inverse = np.unique(self.column('visit')[mask], return_inverse=True)
+        if key in self.key_index:
+            found = self.status[self.key_index[key], mask] == STATUS_CODES[severity]
+        else:
+            found = np.zeros(len(inverse), dtype=bool)
+        n_found = np.bincount(inverse, weights=found, minlength=len(visits))
+        n_files = np.bincount(inverse, minlength=len(visits))
+        first_checked = np.full(len(visits), np.inf)
+        np.minimum.at(first_checked, inverse, self.column('checked')[mask])
+        return [(visits[n], int(n_found[n]), int(n_files[n])) for n in np.argsort(first_checked, kind='stable')]
+
+
+def summary_table(rows: typing.Iterable[tuple], headers: tuple[str, ...]) -> str:
+    """Return text table of query results, first column left aligned"""
+    rows = [tuple(str(value) for value in row) for row in rows]
+    widths = [max([len(header)] + [len(row[n]) for row in rows]) for n, header in enumerate(headers)]
+    lines = ['  '.join(f"{header:{width}}" if n == 0 else f"{header:>{width}}"
+                       for n, (header, width) in enumerate(zip(headers, widths)))]
+    for row in rows:
+        lines.append('  '.join(f"{value:{width}}" if n == 0 else f"{value:>{width}}"
+                               for n, (value, width) in enumerate(zip(row, widths))))
+    return '\n'.join(lines)
@@ -0,0 +1,186 @@
+"""
+Synthetic I16-style NeXus and SRS .dat files, for testing and benchmarking
+
+    write_synthetic_nexus('1000.nxs', n_fields=100, n_detectors=2, external_links=True)
+    write_corpus('/tmp/corpus', 'large', n_files=10)
+"""
+
+import os
+
+import h5py
+import numpy as np
+
+from .metadata import METADATA, ATTRIBUTES, NXDETECTOR_DATA
+
+# values written in place of the examples in METADATA
+SCAN_VALUES = {
+    '/entry/diamond_scan/scan_finished': 1,
+    '/entry/diamond_scan/scan_rank': 1,
+    '/entry/diamond_scan/uniqueKeys': 1,
+}
+
+# preset corpus sizes, keyword arguments of write_synthetic_nexus
+SIZES = {
+    'small': dict(n_fields=10, n_detectors=1, link_depth=1, external_links=False,
+                  scan_points=11, detector_shape=(10, 10)),
+    'medium': dict(n_fields=100, n_detectors=2, link_depth=2, external_links=True,
+                   scan_points=101, detector_shape=(195, 487)),
+    'large': dict(n_fields=1000, n_detectors=8, link_depth=4, external_links=True,
+                  scan_points=1001, detector_shape=(195, 487), write_detector_data=False),
+}
+
+
+def _encode(value):
+    """Return value in the form written by GDA, strings as fixed length bytes"""
+    if isinstance(value, str):
+        return np.bytes_(value)
+    if isinstance(value, (list, tuple)):
+        return np.array([_encode(val) for val in value])
+    return value
+
+
+def _write_spec(nxs: h5py.File):
+    """Write every path in METADATA, with attributes from ATTRIBUTES"""
+    for path, value in METADATA.items():
+        if isinstance(value, str) and value.startswith('NX'):
+            nxs.require_group(path).attrs['NX_class'] = np.bytes_(value)
+        elif path not in nxs:
+            nxs.create_dataset(path, data=_encode(SCAN_VALUES.get(path, value)))
+    for path, attributes in ATTRIBUTES.items():
+        if path in nxs:
+            for attr, attr_value in attributes.items():
+                nxs[path].attrs[attr] = _encode(attr_value)
+
+
+def _link_chain(nxs: h5py.File, name: str, target: str, link_depth: int) -> h5py.SoftLink:
+    """Return soft link to target, via link_depth - 1 intermediate soft links"""
+    for depth in range(1, link_depth):
+        link_path = f"/entry/instrument/links{depth}/{name}"
+        nxs.require_group(f"/entry/instrument/links{depth}")
+        nxs[link_path] = h5py.SoftLink(target)
+        target = link_path
+    return h5py.SoftLink(target)
+
+
+def write_synthetic_nexus(filename: str, n_fields: int = 10, n_detectors: int = 1, link_depth: int = 1,
+                          external_links: bool = False, scan_points: int = 11,
+                          detector_shape: tuple[int, int] = (10, 10), write_detector_data: bool = True,
+                          complete: bool = True):
+    """
+    Write synthetic I16-style NeXus scan file
+    :param filename: str filename to write, e.g. '1000.nxs'
+    :param n_fields: number of scanned fields in NXdata /entry/measurement, each in an NXpositioner
+    :param n_detectors: number of NXdetector groups, each with an NXdata group /entry/detector#
+    :param link_depth: number of soft links between each NXdata field and its dataset
+    :param external_links: if True, detector data is written to separate files and linked by external links
+    :param scan_points: number of points in the scan, the length of every scanned field
+    :param detector_shape: (rows, columns) shape of each detector image
+    :param write_detector_data: if False, detector datasets are created but no chunks are written
+    :param complete: if True, also write every path in the metadata spec
+    """
+    rng = np.random.default_rng(0)
+    stem = os.path.splitext(filename)[0]
+    with h5py.File(filename, 'w') as nxs:
+        if complete:
+            _write_spec(nxs)
+        entry = nxs.require_group('/entry')
+        entry.attrs['NX_class'] = np.bytes_('NXentry')
+        entry.attrs['default'] = np.bytes_('measurement')
+        nxs.require_group('/entry/instrument').attrs['NX_class'] = np.bytes_('NXinstrument')
+        scan = nxs.require_group('/entry/diamond_scan')
+        for name in ['scan_shape', 'scan_fields', 'scan_command']:
+            if name in scan:
+                del scan[name]
+        scan['scan_shape'] = np.array([scan_points])
+        scan['scan_fields'] = _encode([f"field{n}.value" for n in range(n_fields)] + ['roi2_sum'])
+        scan['scan_command'] = np.bytes_(f"scan field0 0 {scan_points - 1} 1")
+
+        measurement = nxs.require_group('/entry/measurement')
+        measurement.attrs['NX_class'] = np.bytes_('NXdata')
+        measurement.attrs['signal'] = np.bytes_('roi2_sum')
+        measurement.attrs['axes'] = _encode(['field0'] if n_fields else [])
+
+        for n in range(n_fields):
+            positioner = nxs.create_group(f"/entry/instrument/field{n}")
+            positioner.attrs['NX_class'] = np.bytes_('NXpositioner')
+            value = positioner.create_dataset('value', data=np.linspace(0, 1, scan_points) + n)
+            value.attrs['local_name'] = np.bytes_(f"field{n}.value")
+            value.attrs['units'] = np.bytes_('mm')
+            measurement[f"field{n}"] = _link_chain(nxs, f"field{n}", value.name, link_depth)
+        roi = measurement.create_dataset('roi2_sum', data=rng.poisson(100, scan_points).astype(float))
+        roi.attrs['local_name'] = np.bytes_('pil3_100k.roi2_sum')
+
+        frame_shape = (scan_points, *detector_shape)
+        for d in range(n_detectors):
+            detector = nxs.create_group(f"/entry/instrument/detector{d}")
+            detector.attrs['NX_class'] = np.bytes_('NXdetector')
+            for name, example in NXDETECTOR_DATA.items():
+                if name == 'data':
+                    continue
+                if isinstance(example, str) and example.startswith('NX'):
+                    detector.require_group(name).attrs['NX_class'] = np.bytes_(example)
+                else:
+                    detector.create_dataset(name, data=_encode(example))
+
+            if external_links:
+                det_filename = f"{stem}-detector{d}.h5"
+                with h5py.File(det_filename, 'w') as det_file:
+                    data = det_file.create_dataset('data', frame_shape, dtype='uint32', chunks=(1, *detector_shape))
+                    if write_detector_data:
+                        for frame in range(scan_points):
+                            data[frame] = rng.poisson(1, detector_shape)
+                detector['data'] = h5py.ExternalLink(os.path.basename(det_filename), '/data')
+            else:
+                data = detector.create_dataset('data', frame_shape, dtype='uint32', chunks=(1, *detector_shape))
+                if write_detector_data:
+                    for frame in range(scan_points):
+                        data[frame] = rng.poisson(1, detector_shape)
+
+            nxdata = nxs.create_group(f"/entry/detector{d}")
+            nxdata.attrs['NX_class'] = np.bytes_('NXdata')
+            nxdata.attrs['signal'] = np.bytes_('data')
+            nxdata.attrs['axes'] = _encode(['field0', '.', '.'] if n_fields else ['.', '.', '.'])
+            nxdata['data'] = h5py.SoftLink(f"/entry/instrument/detector{d}/data")
+            if n_fields:
+                nxdata['field0'] = h5py.SoftLink('/entry/instrument/field0/value')
+
+
+def write_synthetic_dat(filename: str, rows: int = 1000, columns: int = 120, metadata: int = 500):
+    """
+    Write synthetic SRS .dat file
+    :param filename: str filename to write, e.g. '1000.dat'
+    :param rows: number of scan points
+    :param columns: number of scannables
+    :param metadata: number of metadata values in the header
+    """
+    rng = np.random.default_rng(0)
+    with open(filename, 'w') as f:
+        f.write(' &SRS\n <MetaDataAtStart>\n')
+        f.write("cmd='scan x 1 10 1 pil3_100k 1'\n")
+        f.write("SRSRUN=1000000,SRSDAT=20241211,SRSTIM=101010\n")
+        f.write('ubMeta={"name": "crystal=big", "ub": [[1, 0, 0], [0, 1, 0], [0, 0, 1]]}\n')
+        for n in range(metadata):
+            f.write(f"meta{n}={rng.normal():.8g}\n" if n % 3 else f"meta{n}='name{n}'\n")
+        f.write(' </MetaDataAtStart>\n &END\n')
+        f.write('\t'.join(f"col{n}" for n in range(columns)) + '\n')
+        data = rng.normal(size=(rows, columns))
+        np.savetxt(f, data, fmt='%.8g', delimiter='\t')
+
+
+def write_corpus(directory: str, size: str | dict = 'small', n_files: int = 1, first_scan: int = 1000) -> list[str]:
+    """
+    Write a set of synthetic NeXus files
+    :param directory: folder to write files in, created if it doesn't exist
+    :param size: name of preset in SIZES, or dict of keyword arguments for write_synthetic_nexus
+    :param n_files: number of files to write
+    :param first_scan: scan number of first file
+    :return: [filename, ]
+    """
+    kwargs = SIZES[size] if isinstance(size, str) else size
+    os.makedirs(directory, exist_ok=True)
+    filenames = []
+    for scan_number in range(first_scan, first_scan + n_files):
+        filename = os.path.join(directory, f"{scan_number}.nxs")
+        write_synthetic_nexus(filename, **kwargs)
+        filenames.append(filename)
+    return filenames
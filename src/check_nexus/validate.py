@@ -1,18 +1,125 @@
 """
 Use the punx validator
+
+Creating a punx validator loads and parses the NXDL definitions, which takes much longer than validating a
+small file. A validator is therefore created once per process and reused for every file.
 """
 
+import io
+import typing
+import contextlib
+from concurrent.futures import Executor, ProcessPoolExecutor
+
 from punx.validate import Data_File_Validator
 
+from .profiling import get_profiler, profiling, Profiler
+
+_VALIDATORS: dict[str | None, Data_File_Validator] = {}
+
 
-def validate_nexus(file: str):
-    """Validate nexus file using punx validator"""
-    validator = Data_File_Validator()
-    try:
-        validator.validate(file)
-    except Exception as ex:
-        print(f"punx validator failed with error:\n{ex}\n")
+def get_validator(ref: str | None = None) -> Data_File_Validator:
+    """
+    Return warm punx validator for this process, creating it on first use
+    :param ref: NXDL file set name, e.g. 'main', 'v2024.02', None for the punx default
+    :return: punx.validate.Data_File_Validator
+    """
+    if ref not in _VALIDATORS:
+        with get_profiler().phase('validator_init'):
+            _VALIDATORS[ref] = Data_File_Validator(ref)
+    return _VALIDATORS[ref]
 
-    print("\n\npunx validator report:")
-    validator.print_report()
+
+def validate_file(file: str, ref: str | None = None) -> tuple[str, str, float, dict[str, int]]:
+    """
+    Validate a single file using the warm punx validator, returning the report
+    :param file: NeXus .nxs filename
+    :param ref: NXDL file set name, None for the punx default
+    :return: file, str report, average finding score, {status: count}
+    """
+    profiler = get_profiler()
+    validator = get_validator(ref)
+    validator.__init_local__()  # clear findings from the previous file, in case this one fails to open
+    validator.fname = file
+    out = io.StringIO()
+    with contextlib.redirect_stdout(out):
+        with profiler.phase('validate'):
+            try:
+                validator.validate(file)
+            except Exception as ex:
+                print(f"punx validator failed with error:\n{ex}\n")
+
+        print("\n\npunx validator report:")
+        with profiler.phase('report'):
+            try:
+                validator.print_report()
+            except Exception as ex:
+                print(f"punx report failed with error:\n{ex}\n")
     validator.close()
+    total, count, average = validator.finding_score()
+    summary = {str(status): count for status, count in validator.finding_summary().items()}
+    return file, out.getvalue(), average, summary
+
+
+def _validate_profiled(file: str, ref: str | None = None) -> tuple[tuple, dict]:
+    """Run validate_file collecting profile metrics, for use in worker processes"""
+    with profiling() as profiler:
+        result = validate_file(file, ref)
+    return result, profiler.as_dict()
+
+
+def iter_validate(files: list[str], workers: int = 1, ref: str | None = None, profiler: Profiler | None = None,
+                  executor: Executor | None = None) -> typing.Iterator[tuple[str, str, float, dict[str, int]]]:
+    """
+    Validate nexus files using punx validator, yielding each result in file order
+    :param files: list of NeXus .nxs filenames
+    :param workers: number of worker processes, if <= 1 files are validated in this process
+    :param ref: NXDL file set name, None for the punx default
+    :param profiler: Profiler, if given metrics from every worker are collected in it
+    :param executor: existing process pool to use, e.g. the daemon's warm workers, instead of starting one
+    :return: generator of (file, str report, average finding score, {status: count})
+    """
+    with contextlib.ExitStack() as stack:
+        if executor is None and (workers <= 1 or len(files) <= 1):
+            if profiler is not None:
+                stack.enter_context(profiling(profiler))
+            results = ((validate_file(file, ref), None) for file in files)
+        else:
+            if executor is None:
+                executor = stack.enter_context(
+                    ProcessPoolExecutor(max_workers=workers, initializer=get_validator, initargs=(ref,))
+                )
+            run = _validate_profiled if profiler is not None else validate_file
+            results = executor.map(run, files, [ref] * len(files))
+            if profiler is None:
+                results = ((result, None) for result in results)
+
+        for result, metrics in results:
+            if metrics:
+                profiler.merge(metrics)
+            yield result
+
+
+def validate_nexus(*files: str | list[str], workers: int = 1, ref: str | None = None,
+                   verbose: bool = True, profiler: Profiler | None = None) -> list[tuple[str, str, float, dict[str, int]]]:
+    """
+    Validate nexus files using punx validator
+    The NXDL definitions are loaded once per worker and reused for every file.
+        validate_nexus('12345.nxs')
+        validate_nexus('12345.nxs', '12346.nxs')
+        validate_nexus(file_list, workers=4)
+
+    :param files: NeXus .nxs filenames, or lists of filenames
+    :param workers: number of worker processes, if <= 1 files are validated in this process
+    :param ref: NXDL file set name, None for the punx default
+    :param verbose: if True, print each report in file order
+    :param profiler: Profiler, if given metrics from every worker are collected in it
+    :return: [(file, str report, average finding score, {status: count}), ]
+    """
+    files = [file for arg in files for file in ([arg] if isinstance(arg, str) else arg)]
+
+    reports = []
+    for result in iter_validate(files, workers, ref, profiler):
+        if verbose:
+            print(result[1])
+        reports.append(result)
+    return reports
@@ -0,0 +1,266 @@
+"""
+Watch a visit directory and check new scans as they are written
+
+    for result in iter_watch('/dls/i16/data/2024/mm12345-1/', workers=4, cache=ResultCache()):
+        print(result.file, result.score)
+
+New or changed .nxs files are found using inotify on Linux, or by polling the directory tree where inotify isn't
+available. inotify doesn't see files written by other hosts on network file systems such as GPFS, use polling there.
+A file is only checked once the writer has finished with it, and results are stored in the cache, so files
+already processed are not checked again after a restart.
+"""
+
+import os
+import time
+import errno
+import signal
+import select
+import struct
+import typing
+import logging
+import ctypes
+import ctypes.util
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+import h5py
+import numpy as np
+
+from .batch import find_nexus_files, is_nexus_file, _check_file
+from .cache import ResultCache
+from .check import set_logging_level
+from .results import CheckResult
+from .links import FOLLOW
+from .profiles import SpecProfile, DEFAULT_PROFILE
+
+logger = logging.getLogger(__name__)
+
+SCAN_FINISHED = '/entry/diamond_scan/scan_finished'
+SETTLE_TIME = 2.0  # s since last modification before a file is checked
+TIMEOUT = 3600.0  # s since last modification after which unfinished or unreadable files are checked anyway
+
+# inotify event flags, from sys/inotify.h
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+IN_ISDIR = 0x40000000
+_EVENT = struct.Struct('iIII')  # wd, mask, cookie, len
+
+
+class PollingWatcher:
+    """
+    Find new or changed NeXus files by comparing the size and modification time of every file between polls
+    :param directory: folder to watch, including sub-folders
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.files = self._stat_files()
+
+    def __repr__(self):
+        return f"PollingWatcher('{self.directory}')"
+
+    def _stat_files(self) -> dict[str, tuple[int, int]]:
+        files = {}
+        for file in find_nexus_files(self.directory):
+            try:
+                stat = os.stat(file)
+            except OSError:
+                continue
+            files[file] = (stat.st_size, stat.st_mtime_ns)
+        return files
+
+    def poll(self, timeout: float) -> list[str]:
+        """Wait timeout seconds and return files that are new or have changed since the last poll"""
+        time.sleep(timeout)
+        files = self._stat_files()
+        changed = [file for file, stat in files.items() if self.files.get(file) != stat]
+        self.files = files
+        return changed
+
+    def close(self):
+        pass
+
+
+class InotifyWatcher:
+    """
+    Find NeXus files that have been closed after writing, or moved into the directory, using Linux inotify
+    :param directory: folder to watch, including sub-folders
+    :raises OSError: if inotify isn't available
+    """
+    MASK = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        libc_name = ctypes.util.find_library('c')
+        if libc_name is None:
+            raise OSError(errno.ENOSYS, 'libc not found')
+        self.libc = ctypes.CDLL(libc_name, use_errno=True)
+        if not hasattr(self.libc, 'inotify_init1'):
+            raise OSError(errno.ENOSYS, 'inotify not available')
+        self.fd = self.libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+        self.watches = {}  # {watch descriptor: folder}
+        try:
+            self._add_tree(directory)
+        except OSError:
+            self.close()
+            raise
+
+    def __repr__(self):
+        return f"InotifyWatcher('{self.directory}', watches={len(self.watches)})"
+
+    def _add_tree(self, directory: str):
+        """Watch directory and all sub-folders"""
+        for root, dirs, files in os.walk(directory):
+            wd = self.libc.inotify_add_watch(self.fd, os.fsencode(root), self.MASK)
+            if wd < 0:
+                raise OSError(ctypes.get_errno(), f"inotify_add_watch failed for '{root}'")
+            self.watches[wd] = root
+
+    def poll(self, timeout: float) -> list[str]:
+        """Wait up to timeout seconds and return files that have been written or moved in since the last poll"""
+        changed = []
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        while ready:
+            try:
+                data = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                break
+            offset = 0
+            while offset < len(data):
+                wd, mask, cookie, length = _EVENT.unpack_from(data, offset)
+                name = os.fsdecode(data[offset + _EVENT.size: offset + _EVENT.size + length].rstrip(b'\0'))
+                offset += _EVENT.size + length
+                if mask & IN_Q_OVERFLOW:
+                    logger.warning('inotify queue overflowed, rescanning directory')
+                    changed.extend(find_nexus_files(self.directory))
+                elif wd in self.watches and name:
+                    path = os.path.join(self.watches[wd], name)
+                    if mask & IN_ISDIR and mask & (IN_CREATE | IN_MOVED_TO):
+                        self._add_tree(path)
+                        changed.extend(find_nexus_files(path))
+                    elif mask & (IN_CLOSE_WRITE | IN_MOVED_TO) and is_nexus_file(name):
+                        changed.append(path)
+        return list(dict.fromkeys(changed))
+
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+
+def open_watcher(directory: str, poll: bool = False) -> InotifyWatcher | PollingWatcher:
+    """
+    Return watcher for directory, using inotify where available
+    :param directory: folder to watch, including sub-folders
+    :param poll: if True, always poll the directory, e.g. for network file systems
+    :return: InotifyWatcher or PollingWatcher
+    """
+    if not poll:
+        try:
+            return InotifyWatcher(directory)
+        except OSError as ex:
+            logger.info(f"inotify not available ({ex}), polling '{directory}'")
+    return PollingWatcher(directory)
+
+
+def scan_finished(nxs: h5py.File) -> bool:
+    """Return True if /entry/diamond_scan/scan_finished is set, or the file doesn't have it"""
+    finished = nxs.get(SCAN_FINISHED)
+    return finished is None or bool(np.any(finished[()]))
+
+
+def is_scan_complete(file: str, settle: float = SETTLE_TIME, timeout: float = TIMEOUT) -> bool:
+    """
+    Return True if the file has been completely written
+    The file must not have been modified for settle seconds, must be readable and, if it has
+    /entry/diamond_scan/scan_finished, the scan must have finished.
+    Files still not complete timeout seconds after they were last modified are treated as complete.
+    :param file: NeXus filename
+    :param settle: seconds since last modification
+    :param timeout: seconds since last modification after which the file is always complete
+    :return: bool
+    """
+    try:
+        age = time.time() - os.stat(file).st_mtime
+    except OSError:
+        return False
+    if age < settle:
+        return False
+    if age >= timeout:
+        return True
+    try:
+        with h5py.File(file, 'r') as nxs:
+            return scan_finished(nxs)
+    except (OSError, KeyError):
+        return False  # locked by the writer, or not yet a valid HDF5 file
+
+
+def _init_worker(level: int):
+    """Worker initializer, leaving Ctrl+C to the watching process, which shuts the workers down"""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    set_logging_level(level)
+
+
+def iter_watch(directory: str, workers: int = 1, cache: ResultCache | None = None, interval: float = 1.0,
+               settle: float = SETTLE_TIME, timeout: float = TIMEOUT, poll: bool = False,
+               duration: float | None = None, link_policy: str = FOLLOW,
+               profiles: list[SpecProfile] | None = None) -> typing.Iterator[CheckResult]:
+    """
+    Watch directory, checking each NeXus file once it is complete and yielding results as they finish
+    Files already in the directory are checked first, unless they are in the cache.
+    :param directory: folder to watch, including sub-folders
+    :param workers: number of worker processes, at most this many files are checked at once
+    :param cache: ResultCache, files with a cached result are skipped and new results are stored
+    :param interval: seconds between checks for new files
+    :param settle: seconds since last modification before a file is checked
+    :param timeout: seconds since last modification after which unfinished files are checked anyway
+    :param poll: if True, poll the directory instead of using inotify
+    :param duration: stop after this many seconds, None to watch until interrupted
+    :param link_policy: how external files are checked, 'follow', 'verify' or 'none', see links.py
+    :param profiles: [SpecProfile, ] from profiles.load_profiles, one result is yielded per file and profile
+    :return: generator of CheckResult, in the order the checks finish
+    """
+    profiles = profiles or [DEFAULT_PROFILE]
+    specs = {p.name: p.spec_hash(link_policy) for p in profiles}
+    workers = max(1, workers)
+    end = None if duration is None else time.monotonic() + duration
+    watcher = open_watcher(directory, poll)
+    logger.info(f"Watching '{directory}' with {watcher}")
+    pending = set(find_nexus_files(directory))
+    running = {}  # {future: file}
+    level = logging.getLogger('check_nexus.check').level
+    executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(level,))
+    try:
+        while end is None or time.monotonic() < end:
+            for file in sorted(pending):
+                if len(running) >= workers:
+                    break
+                if cache is not None and all(cache.get(file, spec) is not None for spec in specs.values()):
+                    pending.discard(file)  # already processed
+                elif not os.path.isfile(file):
+                    pending.discard(file)
+                elif is_scan_complete(file, settle, timeout):
+                    pending.discard(file)
+                    running[executor.submit(_check_file, file, False, link_policy, profiles)] = file
+
+            if running:
+                done, _ = wait(running, timeout=interval, return_when=FIRST_COMPLETED)
+                pending.update(watcher.poll(0))
+            else:
+                done = ()
+                pending.update(watcher.poll(interval))
+
+            for future in done:
+                running.pop(future)
+                results = future.result()
+                if cache is not None:
+                    for result in results:
+                        cache.put(result, specs[result.spec])
+                    cache.commit()
+                yield from results
+    finally:
+        watcher.close()
+        executor.shutdown(wait=False, cancel_futures=True)
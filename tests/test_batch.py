@@ -0,0 +1,21 @@
+"""
+Tests of batch.iter_check_batch
+"""
+
+from check_nexus.batch import check_batch
+from check_nexus.cache import ResultCache
+from check_nexus.stream import StreamLimits
+from check_nexus.synthetic import write_synthetic_nexus
+
+
+def test_streaming_results_are_not_cached(tmp_path):
+    filename = str(tmp_path / 'scan.nxs')
+    write_synthetic_nexus(filename)
+    with ResultCache(str(tmp_path / 'cache.sqlite')) as cache:
+        streamed, = check_batch([filename], cache=cache, limits=StreamLimits(2, 100))
+        assert len(cache) == 0
+        full, = check_batch([filename], cache=cache)
+        cached, = check_batch([filename], cache=cache)
+    assert len(streamed.findings) < len(full.findings)
+    assert len(cached.findings) == len(full.findings)
+    assert cached.score == full.score
@@ -0,0 +1,35 @@
+"""
+Tests of cache.ResultCache
+"""
+
+import sqlite3
+
+from check_nexus.cache import ResultCache, SCHEMA
+from check_nexus.check import check_file
+from check_nexus.synthetic import write_synthetic_nexus
+
+
+def test_cached_result_has_every_finding(tmp_path):
+    filename = str(tmp_path / 'scan.nxs')
+    write_synthetic_nexus(filename)
+    result = check_file(filename)
+    with ResultCache(str(tmp_path / 'cache.sqlite')) as cache:
+        cache.put(result)
+        cached = cache.get(filename)
+    assert cached.score == result.score
+    assert [(f.path, f.attribute, f.kind, f.severity) for f in cached.findings] == [
+        (f.path, f.attribute, f.kind, f.severity) for f in result.findings
+    ]
+
+
+def test_results_of_earlier_versions_are_removed(tmp_path):
+    cache_file = str(tmp_path / 'cache.sqlite')
+    db = sqlite3.connect(cache_file)
+    db.execute(SCHEMA)
+    db.execute('INSERT INTO check_results VALUES (?, ?, ?, ?, ?, ?, ?, ?)', ('a.nxs', 'spec', 1, 1, 0, 0.1, b'', 1.0))
+    db.commit()
+    db.close()
+    with ResultCache(cache_file) as cache:
+        assert len(cache) == 0
+    with ResultCache(cache_file) as cache:
+        assert len(cache) == 0
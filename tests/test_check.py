@@ -0,0 +1,88 @@
+"""
+Tests of check.build_nxclass_index and layout reuse
+"""
+
+import os
+
+import h5py
+import numpy as np
+import pytest
+
+from check_nexus.check import NexusChecker, build_nxclass_index, _resolve_link, find_nxclass, check_file
+from check_nexus.synthetic import write_synthetic_nexus
+
+
+@pytest.fixture
+def nxs(tmp_path):
+    with h5py.File(tmp_path / 'links.nxs', 'w') as hdf:
+        entry = hdf.create_group('entry')
+        entry.attrs['NX_class'] = np.bytes_('NXentry')
+        data = entry.create_group('data')
+        data.attrs['NX_class'] = 'NXdata'  # variable-length string
+        data['x'] = np.arange(3)
+        entry['hard'] = data  # second hard link to the same group
+        entry['soft'] = h5py.SoftLink('/entry/data/x')
+        entry['chain'] = h5py.SoftLink('/entry/soft')
+        entry['soft_group'] = h5py.SoftLink('/entry/data')
+        entry['through_soft'] = h5py.SoftLink('/entry/soft_group/x')
+        entry['relative'] = h5py.SoftLink('entry/data')
+        entry['dotted'] = h5py.SoftLink('/entry/./data//x')
+        entry['dangling'] = h5py.SoftLink('/entry/missing')
+        entry['loop_a'] = h5py.SoftLink('/entry/loop_b')
+        entry['loop_b'] = h5py.SoftLink('/entry/loop_a')
+        entry['external'] = h5py.ExternalLink('missing.h5', '/data')
+        entry['soft_external'] = h5py.SoftLink('/entry/external')
+        entry['root'] = h5py.SoftLink('/')
+        hdf['datatype'] = np.dtype('f8')
+        yield hdf
+
+
+def test_index_matches_links(nxs):
+    index = build_nxclass_index(nxs)
+    expected = {}
+    nxs.visititems_links(lambda name, link: expected.__setitem__(name, _resolve_link(nxs, name)))
+    assert list(index.items()) == list(expected.items())
+    assert index['entry/hard'] == ('group', 'NXdata')
+    assert index['entry/chain'] == ('dataset', '')
+    assert index['entry/through_soft'] == ('dataset', '')
+    assert index['entry/dangling'] == ('dangling', '')
+    assert index['entry/loop_a'] == ('dangling', '')
+    assert index['entry/soft_external'] == ('external', '')
+    assert index['datatype'] == ('datatype', '')
+
+
+def test_find_nxclass(nxs):
+    assert find_nxclass(nxs, 'NXdata') == ['entry/data', 'entry/hard', 'entry/relative', 'entry/soft_group']
+
+
+def write_vds_file(folder, name: str, source_exists: bool) -> str:
+    """Write NeXus file with a virtual detector dataset, return filename"""
+    source = os.path.join(folder, f"{name}_source.h5")
+    if source_exists:
+        with h5py.File(source, 'w') as hdf:
+            hdf['data'] = np.ones((3, 2, 2))
+    filename = os.path.join(folder, f"{name}.nxs")
+    write_synthetic_nexus(filename, n_fields=2, scan_points=3, detector_shape=(2, 2))
+    with h5py.File(filename, 'a') as nxs:
+        detector = nxs['/entry/instrument/detector0']
+        del detector['data']
+        layout = h5py.VirtualLayout((3, 2, 2), 'f8')
+        layout[:] = h5py.VirtualSource(os.path.basename(source), 'data', shape=(3, 2, 2))
+        detector.create_virtual_dataset('data', layout, fillvalue=0)
+    return filename
+
+
+def link_findings(result) -> list[str]:
+    return sorted(finding.path for finding in result.findings if finding.kind == 'link')
+
+
+def test_reused_layout_checks_virtual_sources(tmp_path):
+    found = write_vds_file(str(tmp_path), 'found', True)
+    missing = write_vds_file(str(tmp_path), 'missing', False)
+    expected = link_findings(check_file(missing, reuse_layout=False))
+    assert 'entry/instrument/detector0/data' in expected
+    checker = NexusChecker()
+    assert link_findings(checker.check_file(found)) == []
+    assert link_findings(checker.check_file(missing)) == expected  # layout of found reused
+    assert link_findings(checker.check_file(missing)) == expected
+    assert len(checker.layouts) == 1
@@ -0,0 +1,25 @@
+"""
+Tests of command line option parsing
+"""
+
+import sys
+
+import pytest
+
+from check_nexus.cli import OptionError, cli_check_nexus, get_number
+
+
+def test_get_number():
+    args = ('check_nexus', '-j', '4', '--interval=0.5')
+    assert get_number(args, '-j', '--workers', default='1') == 4
+    assert get_number(args, '--interval', default='1', kind=float) == 0.5
+    assert get_number(args, '--prefetch', default='0') == 0
+    with pytest.raises(OptionError, match="-j/--workers must be an integer, not 'x'"):
+        get_number(('check_nexus', '-j', 'x'), '-j', '--workers', default='1')
+
+
+@pytest.mark.parametrize('option', [['-j', 'x'], ['--stream', '--max-objects', '1e6']])
+def test_bad_number_is_reported(monkeypatch, capsys, option):
+    monkeypatch.setattr(sys, 'argv', ['check_nexus', 'scan.nxs', *option])
+    cli_check_nexus()
+    assert 'must be an integer' in capsys.readouterr().out
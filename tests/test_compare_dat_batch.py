@@ -0,0 +1,63 @@
+"""
+Tests of converting and comparing many dat files in parallel
+"""
+
+import pytest
+
+pytest.importorskip('nexus2srs')
+
+from check_nexus.dat_file_comparison import (ComparisonSummary, compare_dat_batch, iter_compare_dat,
+                                             nexus2srs_string, pair_dat_files)
+from check_nexus.synthetic import write_corpus
+
+SIZE = dict(n_fields=3, scan_points=5, detector_shape=(2, 2), complete=False)
+
+
+def shift_last_value(dat_file: str, shift: float):
+    """Add shift to the last value of the data block of a dat file"""
+    with open(dat_file) as f:
+        lines = f.read().rstrip('\n').split('\n')
+    values = lines[-1].split()
+    values[-1] = str(float(values[-1]) + shift)
+    lines[-1] = ' '.join(values)
+    with open(dat_file, 'w') as f:
+        f.write('\n'.join(lines) + '\n')
+
+
+@pytest.fixture
+def pairs(tmp_path):
+    for shift, nexus_file in zip([0, 1, 2], write_corpus(str(tmp_path), SIZE, n_files=3)):
+        dat_file = nexus_file.replace('.nxs', '.dat')
+        with open(dat_file, 'w') as f:
+            f.write(nexus2srs_string(nexus_file))
+        if shift:
+            shift_last_value(dat_file, shift)
+    (tmp_path / '1003.nxs').write_text('not an HDF5 file')
+    (tmp_path / '1003.dat').write_text('not a dat file')
+    pairs, unpaired = pair_dat_files(str(tmp_path))
+    assert not unpaired
+    return sorted(pairs)
+
+
+def summary_items(summary: ComparisonSummary) -> tuple:
+    return (summary.n_files, summary.n_matching, summary.n_errors, summary.n_length_mismatch,
+            summary.different_scannables, summary.missing_scannables, summary.worst, summary.errors)
+
+
+def test_parallel_comparison_matches_serial(pairs):
+    serial = compare_dat_batch(pairs, workers=1)
+    parallel = compare_dat_batch(pairs, workers=2)
+    assert summary_items(parallel) == summary_items(serial)
+    assert (serial.n_files, serial.n_matching, serial.n_errors) == (4, 1, 1)
+    assert [deviation for deviation, name, file in serial.worst] == [2, 1]
+    assert [file for file, error in serial.errors] == [pairs[3][0]]
+
+
+def test_summary_keeps_largest_deviations(pairs):
+    summary = ComparisonSummary(top=1)
+    for comparison in iter_compare_dat(pairs, workers=2):
+        summary.add(comparison)
+    deviation, name, dat_file = summary.worst[0]
+    assert len(summary.worst) == 1
+    assert (deviation, dat_file) == (2, pairs[2][0])
+    assert 'Failed:' in summary.report()
@@ -0,0 +1,49 @@
+"""
+Tests of the checker daemon and its client
+"""
+
+import os
+import stat
+import threading
+
+import pytest
+
+from check_nexus.check import check_file
+from check_nexus.daemon import CheckDaemon, DaemonError, connect
+from check_nexus.synthetic import write_synthetic_nexus
+
+
+@pytest.fixture
+def daemon(tmp_path):
+    daemon = CheckDaemon(str(tmp_path / 'daemon.sock'), workers=1)
+    daemon.start()
+    thread = threading.Thread(target=daemon.server.serve_forever)
+    thread.start()
+    yield daemon
+    if daemon.server is not None:
+        daemon.server.shutdown()
+    thread.join()
+    daemon.close()
+
+
+def test_check_round_trip(daemon, tmp_path):
+    filename = str(tmp_path / 'scan.nxs')
+    write_synthetic_nexus(filename)
+    assert stat.S_IMODE(os.stat(daemon.address).st_mode) & 0o077 == 0  # only this user can connect
+    client = connect(daemon.address)
+    assert client is not None
+    assert client.ping()['workers'] == 1
+
+    result, = client.check([filename])
+    expected = check_file(filename)
+    assert result.file == filename
+    assert result.score == expected.score
+    assert len(result.findings) == len(expected.findings)
+
+    with pytest.raises(DaemonError):
+        list(client.request({'command': 'unknown'}))
+    client.stop()
+
+
+def test_no_daemon(tmp_path):
+    assert connect(str(tmp_path / 'daemon.sock')) is None
@@ -0,0 +1,70 @@
+"""
+Tests of reading and comparing dat files
+"""
+
+import numpy as np
+
+from check_nexus.dat_file_comparison import Dict2Obj, compare_dat_objects, parse_data_block
+
+
+def test_parse_data_block():
+    data = parse_data_block('1 2 3\n4 5 6\n', 3)
+    assert data.shape == (2, 3)
+    assert np.array_equal(data, [[1, 2, 3], [4, 5, 6]])
+    assert parse_data_block('', 3).shape == (0, 3)
+    assert np.array_equal(parse_data_block('1 true\n2 False', 2), [[1, 1], [2, 0]])
+
+
+def test_parse_ragged_rows():
+    # the same number of values as a regular block, but not in the right rows
+    data = parse_data_block('1 2\n3\n4 5 6', 2)
+    assert np.array_equal(data, [[1, 2], [3, np.nan], [4, 5]], equal_nan=True)
+    data = parse_data_block('1 2 x\n3 4 5', 3)
+    assert np.array_equal(data, [[1, 2, np.nan], [3, 4, 5]], equal_nan=True)
+
+
+def dat_object(data: dict, metadata: dict | None = None) -> Dict2Obj:
+    dat_obj = Dict2Obj(data)
+    dat_obj.metadata = Dict2Obj(metadata or {})
+    return dat_obj
+
+
+def test_compare_scannables_by_norm():
+    x = np.arange(100.)
+    old = dat_object({'x': x, 'y': x})
+    new = dat_object({'x': x + 0.05, 'y': x + 0.005})  # norms 0.5 and 0.05
+    comparison = compare_dat_objects(old, new, verbose=False)
+    assert list(comparison.different_scannables) == ['x']
+    assert np.isclose(comparison.different_scannables['x'], 0.5)
+    assert np.isclose(comparison.max_deviation['x'], 0.05)
+    assert not compare_dat_objects(old, new, rtol=0.01, verbose=False).different_scannables
+
+
+def test_compare_nan():
+    x = np.arange(5.)
+    x[1] = np.nan
+    y = x.copy()
+    assert not compare_dat_objects(dat_object({'x': x}), dat_object({'x': y}), verbose=False).different_scannables
+    y[2] = np.nan
+    assert 'x' in compare_dat_objects(dat_object({'x': x}), dat_object({'x': y}), verbose=False).different_scannables
+
+
+def test_compare_metadata():
+    old = dat_object({'x': np.arange(3.)}, {'energy': 8.0, 'sample': 'Si', 'temp': 300.0})
+    new = dat_object({'x': np.arange(3.)}, {'energy': 8.05, 'sample': 'Ge', 'temp': 301.0})
+    comparison = compare_dat_objects(old, new, verbose=False)
+    assert comparison.different_metadata == {'sample': ('Si', 'Ge'), 'temp': (300.0, 301.0)}
+
+
+def test_compare_scannables_with_nan():
+    x = np.arange(10.)
+    x[3] = np.nan
+    y = x.copy()
+    y[5] = np.nan
+    old = dat_object({'both': x, 'one_side': x, 'hidden': x})
+    new = dat_object({'both': x.copy(), 'one_side': y, 'hidden': x + 1})
+    comparison = compare_dat_objects(old, new, verbose=False)
+    assert sorted(comparison.different_scannables) == ['hidden', 'one_side']
+    assert comparison.different_scannables['one_side'] == 0  # the other values are equal
+    assert np.isclose(comparison.different_scannables['hidden'], 3)  # norm of the 9 values that aren't NaN
+    assert comparison.max_deviation['hidden'] == 1
@@ -0,0 +1,20 @@
+"""
+Tests of fingerprint.structure_fingerprint
+"""
+
+import h5py
+import pytest
+
+from check_nexus.fingerprint import structure_fingerprint
+
+
+@pytest.mark.parametrize('attr', ['NX_class', 'default', 'signal', 'axes'])
+def test_empty_structure_attributes(tmp_path, attr):
+    with h5py.File(tmp_path / 'empty.nxs', 'w') as hdf:
+        group = hdf.create_group('entry')
+        group.attrs[attr] = h5py.Empty('S1')
+        empty = structure_fingerprint(hdf)
+        group.attrs[attr] = 'x'
+        assert structure_fingerprint(hdf) != empty
+        del group.attrs[attr]
+        assert structure_fingerprint(hdf) != empty
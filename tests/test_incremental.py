@@ -0,0 +1,43 @@
+"""
+Tests of incremental.IncrementalCheck passes over a file that is still being written
+"""
+
+import h5py
+
+from check_nexus.incremental import IncrementalCheck, object_signatures
+from check_nexus.synthetic import write_synthetic_nexus
+
+
+def test_signatures_ignore_growing_datasets(tmp_path):
+    filename = tmp_path / 'scan.nxs'
+    with h5py.File(filename, 'w') as hdf:
+        hdf.create_dataset('entry/grow', shape=(2,), maxshape=(None,), dtype='f8')
+        hdf['entry/soft'] = h5py.SoftLink('/entry/grow')
+        hdf['entry/external'] = h5py.ExternalLink('det.h5', '/data')
+        before = object_signatures(hdf)
+        hdf['entry/grow'].resize((5,))
+        assert object_signatures(hdf) == before
+        hdf['entry/grow'].attrs['units'] = 'mm'
+        after = object_signatures(hdf)
+    assert set(after) == {'entry', 'entry/grow', 'entry/soft', 'entry/external'}
+    assert {path for path in after if after[path] != before[path]} == {'entry/grow', 'entry/soft'}
+
+
+def test_passes_recheck_changes_and_prune_removed_paths(tmp_path):
+    filename = tmp_path / 'scan.nxs'
+    write_synthetic_nexus(filename, n_fields=4)
+    with h5py.File(filename, 'a') as hdf:
+        hdf['entry/diamond_scan/scan_finished'][()] = 0
+    check = IncrementalCheck(filename)
+    check.update()
+    assert not check.complete
+    n_checked = len(check._checked)
+    assert any('field3' in path for _, path in check._checked)
+    check.update()
+    assert check.n_rechecked < n_checked
+
+    with h5py.File(filename, 'a') as hdf:
+        del hdf['entry/measurement/field3']
+    check.update()
+    assert len(check._checked) < n_checked
+    assert not any('field3' in path for _, path in check._checked)
@@ -0,0 +1,77 @@
+"""
+Tests of links.py, external files are looked for where HDF5 looks for them
+"""
+
+import os
+
+import h5py
+import numpy as np
+
+from check_nexus.links import FOLLOW, VERIFY, ExternalLinks, external_aliases, external_file_candidates, stat_files
+from check_nexus.check import build_nxclass_index
+
+
+def write_linked_file(folder, link_filename: str) -> str:
+    """Write main.nxs with an external link to link_filename:/data, return filename"""
+    filename = os.path.join(folder, 'main.nxs')
+    with h5py.File(filename, 'w') as nxs:
+        nxs['/entry/data'] = h5py.ExternalLink(link_filename, '/data')
+    return filename
+
+
+def write_data_file(filename: str):
+    with h5py.File(filename, 'w') as hdf:
+        hdf['data'] = np.arange(3)
+
+
+def check_links(filename: str, policy: str = FOLLOW) -> ExternalLinks:
+    with h5py.File(filename, 'r') as nxs:
+        aliases = external_aliases(nxs, build_nxclass_index(nxs))
+        with ExternalLinks(nxs, aliases, policy) as links:
+            data = links.open('entry/data') if policy == FOLLOW and not links.error('entry/data') else None
+            links.data = None if data is None else data[()]
+        return links
+
+
+def test_external_file_candidates(monkeypatch):
+    monkeypatch.setenv('HDF5_EXT_PREFIX', os.pathsep.join(['/prefix', '${ORIGIN}/sub']))
+    assert external_file_candidates('/old/dir/det.h5', '/visit') == [
+        '/old/dir/det.h5', '/prefix/det.h5', '/visit/sub/det.h5', '/visit/det.h5', os.path.abspath('det.h5')
+    ]
+    assert external_file_candidates('dets/det.h5', '/visit')[:3] == [
+        '/prefix/dets/det.h5', '/visit/sub/dets/det.h5', '/visit/dets/det.h5'
+    ]
+
+
+def test_absolute_link_found_in_parent_folder(tmp_path):
+    write_data_file(str(tmp_path / 'det.h5'))
+    filename = write_linked_file(tmp_path, '/nonexistent/dir/det.h5')
+    with h5py.File(filename, 'r') as nxs:
+        assert nxs['entry/data'].shape == (3,)  # found by HDF5
+    links = check_links(filename)
+    assert links.dangling == {}
+    assert list(links.data) == [0, 1, 2]
+
+
+def test_link_found_with_prefix(tmp_path, monkeypatch):
+    os.makedirs(tmp_path / 'detectors')
+    write_data_file(str(tmp_path / 'detectors' / 'det.h5'))
+    filename = write_linked_file(tmp_path, 'det.h5')
+    assert 'entry/data' in check_links(filename, VERIFY).dangling
+    monkeypatch.setenv('HDF5_EXT_PREFIX', str(tmp_path / 'detectors'))
+    assert check_links(filename, VERIFY).dangling == {}
+
+
+def test_missing_link_is_dangling(tmp_path):
+    filename = write_linked_file(tmp_path, '/nonexistent/dir/det.h5')
+    links = check_links(filename)
+    target, error = links.dangling['entry/data']
+    assert target == '/nonexistent/dir/det.h5:/data'
+    assert error
+
+
+def test_stat_files(tmp_path):
+    write_data_file(str(tmp_path / 'det.h5'))
+    status = stat_files([str(tmp_path / 'det.h5'), str(tmp_path / 'missing.h5')])
+    assert status[str(tmp_path / 'det.h5')] == ''
+    assert status[str(tmp_path / 'missing.h5')]
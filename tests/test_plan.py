@@ -0,0 +1,65 @@
+"""
+Tests of plan.read_attributes, which reads attributes with the low-level h5py API
+"""
+
+import h5py
+import numpy as np
+import pytest
+
+from check_nexus.check import check_file
+from check_nexus.plan import read_attributes, read_nx_class
+from check_nexus.synthetic import write_synthetic_nexus
+
+
+@pytest.fixture
+def group(tmp_path):
+    with h5py.File(tmp_path / 'attrs.h5', 'w') as hdf:
+        group = hdf.create_group('group')
+        group.attrs['ascii'] = np.bytes_('NXentry')
+        group.attrs.create('utf8', 'NXentré'.encode(), dtype=h5py.string_dtype('utf-8', 9))
+        group.attrs.create('utf8_array', ['ab', 'c'], dtype=h5py.string_dtype('utf-8', 2))
+        group.attrs['vlen'] = 'NXdata'
+        group.attrs['empty'] = h5py.Empty('f')
+        group.attrs['empty_string'] = h5py.Empty(h5py.string_dtype('utf-8', 3))
+        group.attrs['number'] = 1.5
+        group.attrs['big_endian'] = np.array([1, 2], dtype='>i4')
+        yield group
+
+
+def test_read_attributes_match_h5py(group):
+    values = read_attributes(group, list(group.attrs) + ['not_an_attribute'])
+    assert set(values) == set(group.attrs)
+    for name, value in values.items():
+        expected = group.attrs[name]
+        assert type(value) is type(expected), name
+        if isinstance(expected, h5py.Empty):
+            assert value.dtype == expected.dtype
+        else:
+            assert np.array_equal(value, expected), name
+
+
+@pytest.mark.parametrize('dtype', [h5py.string_dtype('ascii', 12), h5py.string_dtype('utf-8', 12),
+                                   h5py.string_dtype('utf-8')])
+def test_read_nx_class(tmp_path, dtype):
+    with h5py.File(tmp_path / 'nx_class.h5', 'w') as hdf:
+        hdf.create_group('entry').attrs.create('NX_class', 'NXentry', dtype=dtype)
+        hdf.create_group('empty').attrs['NX_class'] = h5py.Empty(dtype)
+        hdf.create_group('none')
+        assert read_nx_class(hdf['entry']) == 'NXentry'
+        assert read_nx_class(hdf['none'], 'default') == 'default'
+        assert read_nx_class(hdf['empty']) != 'NXentry'
+
+
+def test_check_file_utf8_nx_class(tmp_path):
+    filename = str(tmp_path / 'utf8.nxs')
+    write_synthetic_nexus(filename, n_fields=5, scan_points=3, detector_shape=(2, 2))
+    score = check_file(filename, reuse_layout=False).score
+    with h5py.File(filename, 'a') as nxs:
+        def visit(name, obj):
+            if isinstance(obj, h5py.Group) and 'NX_class' in obj.attrs:
+                nx_class = obj.attrs['NX_class']
+                nx_class = nx_class.decode() if isinstance(nx_class, bytes) else str(nx_class)
+                del obj.attrs['NX_class']
+                obj.attrs.create('NX_class', nx_class, dtype=h5py.string_dtype('utf-8', len(nx_class) + 2))
+        nxs.visititems(visit)
+    assert check_file(filename, reuse_layout=False).score == score
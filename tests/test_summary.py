@@ -0,0 +1,76 @@
+"""
+Tests of the summary store of batch results
+"""
+
+import itertools
+
+import h5py
+import pytest
+
+from check_nexus import summary
+from check_nexus.results import CheckResult, Finding, MISSING, OK, WRONG
+from check_nexus.summary import SummaryStore
+
+UB = '/entry/sample/ub_matrix'
+
+
+def result(file: str, missing: tuple[str, ...] = (), wrong: tuple[str, ...] = (), spec: str = 'diamond'):
+    findings = [Finding('/entry', '', 'group', 'NXentry', 'NXentry', OK)]
+    findings += [Finding(path, '', '', 'nd array', None, MISSING) for path in missing]
+    findings += [Finding(path, 'units', 'attribute', 'mm', 'deg', WRONG) for path in wrong]
+    return CheckResult(file, findings, spec=spec)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Each result is checked one second after the previous one"""
+    ticks = itertools.count(1000)
+    monkeypatch.setattr(summary.time, 'time', lambda: float(next(ticks)))
+
+
+def test_store_round_trip(tmp_path, clock):
+    filename = str(tmp_path / 'summary.h5')
+    file1, file2, file3, file4 = (str(tmp_path / name) for name in ('visit2/1.nxs', 'visit1/2.nxs',
+                                                                    'visit1/3.nxs', 'visit2/4.nxs'))
+    with SummaryStore(filename) as store:
+        store.add(result(file1, missing=(UB,)))
+        store.add(result(file2, missing=(UB, '/entry/sample/name')))
+        store.add(result(file3, wrong=('/entry/x',)))
+        store.add(result(file4, missing=(UB,), spec='draft'))
+
+    store = SummaryStore(filename)
+    assert store.n_files == 4
+    assert store.files_with(UB, spec='diamond') == [file1, file2]
+    assert store.files_with(UB) == [file1, file2, file4]
+    assert store.files_with('/entry/x@units', WRONG) == [file3]
+    assert store.files_with('/entry/unknown') == []
+    assert store.counts(spec='diamond') == [(UB, 2), ('/entry/sample/name', 1)]
+    assert store.counts(visit='visit1') == [(UB, 1), ('/entry/sample/name', 1)]
+    # visits in the order they were first checked, visit2 first
+    assert store.trend(UB, spec='diamond') == [('visit2', 1, 1), ('visit1', 1, 2)]
+
+
+def test_result_replaces_earlier_result(tmp_path, clock):
+    filename = str(tmp_path / 'summary.h5')
+    file1, file2 = str(tmp_path / 'visit1' / '1.nxs'), str(tmp_path / 'visit1' / '2.nxs')
+    with SummaryStore(filename) as store:
+        store.add(result(file1, missing=(UB,)))
+        store.add(result(file2, missing=(UB,)))
+    with SummaryStore(filename) as store:
+        store.add(result(file1))  # fixed and checked again
+        store.add(result(file2, spec='draft'))  # results of another spec are kept separately
+    store = SummaryStore(filename)
+    assert store.n_files == 3
+    assert store.files_with(UB) == [file2]
+    assert store.files_with(UB, spec='draft') == []
+    assert store.trend(UB, spec='diamond') == [('visit1', 1, 2)]
+
+
+def test_format_version(tmp_path):
+    filename = str(tmp_path / 'summary.h5')
+    with SummaryStore(filename) as store:
+        store.add(result('visit1/1.nxs'))
+    with h5py.File(filename, 'a') as hdf:
+        hdf.attrs['format_version'] = -1
+    with pytest.raises(ValueError):
+        SummaryStore(filename)
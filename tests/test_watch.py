@@ -0,0 +1,55 @@
+"""
+Tests of watching a directory for new scans
+"""
+
+import os
+
+import h5py
+
+from check_nexus.cache import ResultCache
+from check_nexus.synthetic import write_synthetic_nexus
+from check_nexus.watch import PollingWatcher, is_scan_complete, iter_watch
+
+
+def test_polling_watcher(tmp_path):
+    old = str(tmp_path / '1.nxs')
+    write_synthetic_nexus(old)
+    watcher = PollingWatcher(str(tmp_path))
+    assert watcher.poll(0) == []
+
+    os.makedirs(tmp_path / 'sub')
+    new = str(tmp_path / 'sub' / '2.nxs')
+    write_synthetic_nexus(new)
+    (tmp_path / 'notes.txt').write_text('not a NeXus file')
+    assert watcher.poll(0) == [new]
+    assert watcher.poll(0) == []
+
+    with h5py.File(old, 'a') as nxs:
+        nxs.create_dataset('entry/extra', data=list(range(1000)))
+    assert watcher.poll(0) == [old]
+    watcher.close()
+
+
+def test_scan_complete(tmp_path):
+    filename = str(tmp_path / '1.nxs')
+    write_synthetic_nexus(filename)
+    assert is_scan_complete(filename, settle=0)
+    assert not is_scan_complete(filename, settle=60)
+    with h5py.File(filename, 'a') as nxs:
+        nxs['entry/diamond_scan/scan_finished'][()] = 0
+    assert not is_scan_complete(filename, settle=0)
+    assert is_scan_complete(filename, settle=0, timeout=0)
+    assert not is_scan_complete(str(tmp_path / 'missing.nxs'), settle=0)
+
+
+def test_iter_watch_checks_each_file_once(tmp_path):
+    folder = tmp_path / 'visit'
+    os.makedirs(folder)
+    filename = str(folder / '1.nxs')
+    write_synthetic_nexus(filename)
+    with ResultCache(str(tmp_path / 'cache.sqlite')) as cache:
+        results = list(iter_watch(str(folder), cache=cache, interval=0.1, settle=0, poll=True, duration=2))
+        assert [result.file for result in results] == [filename]
+        assert not results[0].error
+        # a restarted watcher doesn't check the file again
+        assert list(iter_watch(str(folder), cache=cache, interval=0.1, settle=0, poll=True, duration=0.5)) == []